@@ -0,0 +1,80 @@
+# Per-request cost of SSO auth: the previous validate_token (a new
+# PyJWKClient and JWKS parse on every call) against the kid-indexed JWKS cache and the
+# verified-token cache. The JWKS endpoint is served locally, so the legacy numbers leave
+# out the network fetch it also paid on every request.
+# Run from the repo root: python benchmarks/bench_auth_middleware.py
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt import PyJWKClient
+from jwt.algorithms import RSAAlgorithm
+from starlette.requests import Request
+
+from utils import azure_sso
+
+# Tenant settings normally come from Secrets Manager during app startup
+azure_sso.get_secret = lambda name: {
+    "TENANT_ID": "bench-tenant", "AZURE_CLIENT_ID": "bench-client", "AZURE_CLIENT_SECRET": "unused"}
+azure_sso.load_azure_config()
+
+private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+jwk.update({"kid": "bench-kid", "use": "sig", "alg": "RS256"})
+JWKS = {"keys": [jwk]}
+PyJWKClient.fetch_data = lambda self: JWKS
+
+TOKEN = jwt.encode(
+    {"aud": azure_sso.CLIENT_ID, "iss": f"https://login.microsoftonline.com/{azure_sso.TENANT_ID}/v2.0",
+     "exp": int(time.time()) + 3600, "oid": "user"},
+    private_key, algorithm="RS256", headers={"kid": "bench-kid"})
+
+
+def legacy_validate_token(token):
+    """The pre-cache implementation of validate_token."""
+    jwks_client = PyJWKClient(azure_sso.JWKS_URL)
+    signing_key = jwks_client.get_signing_key_from_jwt(token)
+    jwt.decode(token, signing_key.key, algorithms=["RS256"], audience=azure_sso.CLIENT_ID,
+               issuer=f"https://login.microsoftonline.com/{azure_sso.TENANT_ID}/v2.0")
+    return True
+
+
+def uncached_validate_token(token):
+    azure_sso.verified_tokens._entries.clear()
+    return azure_sso.validate_token(token)
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        assert func(TOKEN)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def authenticate_overhead(repeat):
+    scope = {"type": "http", "method": "GET", "path": "/analyze-private", "query_string": b"",
+             "headers": [(b"authorization", f"Bearer {TOKEN}".encode())]}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        # The event-loop path of route_policy: answered from memory, no worker thread
+        assert azure_sso.authenticate_request(Request(scope), fetch=False) == TOKEN
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    repeat = 300
+    print(f"legacy validate_token (new JWKS client per call): {timed(legacy_validate_token, repeat):8.1f} us")
+    print(f"cached JWKS, signature verified every call:       {timed(uncached_validate_token, repeat):8.1f} us")
+    print(f"verified-token cache hit:                          {timed(azure_sso.validate_token, repeat):8.1f} us")
+    print(f"authenticate_request per request (cache hit):      {authenticate_overhead(repeat):8.1f} us")
+    print(f"JWKS fetches: {azure_sso.jwks_cache.fetches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Benchmark of the single-pass DynamoDB serializer against the previous save/read path.
+# Run from the repo root: python benchmarks/bench_dynamo_serializer.py
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from models import AnalysisResult, HighlightedSection
+from utils.dynamo_serializer import deserialize_item, serialize_item
+
+
+def getRealDecimal(obj):
+    """The pre-serializer conversion from controllers/db_service.py."""
+    if isinstance(obj, float):
+        return Decimal(str(obj))
+    elif isinstance(obj, dict):
+        return {k: getRealDecimal(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [getRealDecimal(i) for i in obj]
+    return obj
+
+
+def legacy_to_attributes(result):
+    # save_result: model_dump, isoformat, getRealDecimal, then the Table resource's TypeSerializer
+    result_dict = result.model_dump()
+    result_dict['created_at'] = result.created_at.isoformat()
+    item = getRealDecimal(result_dict)
+    serializer = TypeSerializer()
+    return {key: serializer.serialize(value) for key, value in item.items()}
+
+
+def legacy_from_attributes(item):
+    # Table resource's TypeDeserializer, then AnalysisResult(**item) coercing Decimals
+    deserializer = TypeDeserializer()
+    return AnalysisResult(**{key: deserializer.deserialize(value) for key, value in item.items()})
+
+
+def make_result(sections):
+    return AnalysisResult(
+        request_id="bench", source_id="ACC/300", content_type="course", original_text="x" * 2000,
+        keywords_searched=["Diversity", "Equity", "Inclusion"], keywords_matched=["Diversity"],
+        has_flags="true", metadata={"run": 1, "score": 0.5},
+        highlighted_sections=[
+            HighlightedSection(start_index=i * 40, end_index=i * 40 + 9, matched_text="diversity",
+                               reason="Exact match for 'Diversity'", confidence=0.85 + (i % 10) / 100)
+            for i in range(sections)
+        ],
+    )
+
+
+def timed(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        output = func(arg)
+    return (time.perf_counter() - start) / repeat, output
+
+
+def main():
+    print("sections  legacy write  new write  speedup  legacy read  new read  speedup")
+    for sections in (10, 100, 1000, 5000):
+        result = make_result(sections)
+        repeat = max(3, 2000 // sections)
+        legacy_write, legacy_item = timed(legacy_to_attributes, result, repeat)
+        new_write, new_item = timed(lambda r: serialize_item(r, ('columnar_matches', 'keyword_counts')), result, repeat)
+        legacy_read, legacy_model = timed(legacy_from_attributes, legacy_item, repeat)
+        new_read, new_model = timed(lambda item: AnalysisResult(**deserialize_item(item)), new_item, repeat)
+        assert new_model == legacy_model == result
+        print(f"{sections:8d}  {legacy_write * 1000:10.2f}ms  {new_write * 1000:7.2f}ms  {legacy_write / new_write:6.1f}x"
+              f"  {legacy_read * 1000:9.2f}ms  {new_read * 1000:6.2f}ms  {legacy_read / new_read:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
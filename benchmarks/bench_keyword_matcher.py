@@ -0,0 +1,125 @@
+# Benchmark of the keyword matcher behind /keywordsearch against the old per-keyword loop.
+# Run from the repo root: python benchmarks/bench_keyword_matcher.py
+import functools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import re
+
+from utils.keyword_matcher import (AUTOMATON_MIN_KEYWORDS, _WORD_END, _WORD_START, KeywordMatcher,
+                                   compile_keyword_pattern)
+from utils.token_index import TokenIndex
+
+KEYWORDS = [
+    "Anti-Racism", "Racism", "Race", "Allyship", "Bias", "DEI",
+    "Diversity", "Diverse", "Confirmation Bias", "Equity", "Equitableness",
+    "Feminism", "Gender", "Gender Identity",
+    "Inclusion", "Inclusive", "All-Inclusive", "Inclusivity", "Injustice", "Intersectionality", "Prejudice", "Privilege",
+    "Racial Identity", "Sexuality", "Stereotypes", "Pronouns", "Transgender", "Equality Allyship",
+    '"underrepresented"', "marginalized", "equality",
+]
+
+WORDS = (
+    "students will learn accounting principles and apply research tools in business contexts "
+    "financial statements audit ledger analysis ethics leadership communication management "
+    "diverse teams equity inclusion race gender bias"
+).split()
+
+
+def legacy_find_loop(text, keywords):
+    """The pre-automaton implementation of TextAnalyzer.analyze_text_lexical."""
+    matches = []
+    for keyword in keywords:
+        start = 0
+        keyword_lower = keyword.lower()
+        text_lower = text.lower()
+        while True:
+            idx = text_lower.find(keyword_lower, start)
+            if idx == -1:
+                break
+            end_idx = idx + len(keyword)
+            matches.append((idx, end_idx, keyword))
+            start = end_idx
+    return matches
+
+
+def legacy_pattern_loop(text, patterns):
+    """One regex search per pattern keyword, which the combined regex must reproduce."""
+    matches = []
+    for pattern in patterns:
+        regex = re.compile(f"{_WORD_START}(?:{compile_keyword_pattern(pattern)}){_WORD_END}", re.IGNORECASE)
+        matches.extend((*match.span(), pattern) for match in regex.finditer(text))
+    return matches
+
+
+@functools.lru_cache(maxsize=None)
+def build_matcher(keywords):
+    return KeywordMatcher(list(keywords))
+
+
+def automaton(text, keywords):
+    # Matchers are built once and cached per keyword list, as keyword_profile_service does
+    spans = build_matcher(tuple(keywords)).find_all(text)
+    return [(start, end, keyword) for keyword, kw_spans in zip(keywords, spans) for start, end in kw_spans]
+
+
+def best_of(fn, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    random.seed(42)
+    text = " ".join(random.choice(WORDS) for _ in range(200_000))[:1_000_000]
+
+    for keyword_count in (len(KEYWORDS), 100, 150, 200, 300):
+        keywords = [KEYWORDS[i % len(KEYWORDS)] + ("" if i < len(KEYWORDS) else f" {i}")
+                    for i in range(keyword_count)]
+        assert automaton(text, keywords) == legacy_find_loop(text, keywords)
+        legacy = best_of(legacy_find_loop, text, keywords)
+        new = best_of(automaton, text, keywords)
+        path = "automaton" if keyword_count >= AUTOMATON_MIN_KEYWORDS else "find loop"
+        print(f"{keyword_count:4d} keywords over {len(text) / 1e6:.1f} MB: "
+              f"old find loop {legacy * 1000:8.1f} ms, KeywordMatcher ({path}) {new * 1000:8.1f} ms "
+              f"({legacy / new:.2f}x)")
+
+    # The same terms as whole-word patterns, and folded into a handful of wildcards
+    for label, patterns in (("quoted", [f'"{keyword}"' for keyword in KEYWORDS]),
+                            ("wildcard", ['"anti racism"', "racis*", '"race"', "ally*", '"bias"', '"dei"',
+                                          "divers*", "equit*", "equality*", "feminis*", "gender*", "inclusi*",
+                                          '"injustice"', "intersectional*", '"prejudice"', '"privilege"',
+                                          '"sexuality"', "stereotyp*", "pronoun*", '"transgender"',
+                                          '"underrepresented"', "marginali*"])):
+        assert automaton(text, patterns) == legacy_pattern_loop(text, patterns)
+        legacy = best_of(legacy_pattern_loop, text, patterns)
+        new = best_of(automaton, text, patterns)
+        print(f"{len(patterns):4d} {label} patterns over {len(text) / 1e6:.1f} MB: "
+              f"regex per pattern {legacy * 1000:8.1f} ms, combined regex {new * 1000:8.1f} ms ({legacy / new:.2f}x)")
+
+    # Repeated queries against a cached token index of the same text
+    start = time.perf_counter()
+    index = TokenIndex(text)
+    build = time.perf_counter() - start
+    matcher = KeywordMatcher(KEYWORDS)
+    assert matcher.find_all(text, index) == matcher.find_all(text)
+
+    def new_keyword_set():
+        index.clear_memo()
+        return matcher.find_all(text, index)
+
+    fresh = best_of(new_keyword_set)
+    repeated = best_of(matcher.find_all, text, index)
+    print(f"token index build {build * 1000:8.1f} ms; {len(KEYWORDS)} keywords on the index: "
+          f"new keyword set {fresh * 1000:8.1f} ms, repeated keyword set {repeated * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
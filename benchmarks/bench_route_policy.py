@@ -0,0 +1,113 @@
+# Per-request cost of the route auth policy: the previous sso_middleware (linear scan of
+# OPEN_PATHS with two log lines, then the old auth_middleware's list check) against the compiled
+# route_policy dependency (set lookups on the matched endpoint).
+# Run from the repo root: python benchmarks/bench_route_policy.py
+import asyncio
+import io
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+import main as api
+from utils import azure_sso
+
+# Log lines are formatted as in production but written nowhere
+logging.basicConfig(level=logging.INFO, stream=io.StringIO(), force=True)
+
+LEGACY_OPEN_PATHS = ["/", "/debug"] + api.OPEN_PATHS
+
+# Tenant settings normally come from Secrets Manager during app startup
+azure_sso.get_secret = lambda name: {
+    "TENANT_ID": "bench-tenant", "AZURE_CLIENT_ID": "bench-client", "AZURE_CLIENT_SECRET": "unused"}
+azure_sso.load_azure_config()
+
+
+async def legacy_sso_middleware(request, call_next):
+    """The pre-compiled policy from main.py."""
+    path = request.url.path
+    logging.info(f"Request path: {path}")
+
+    for open_path in LEGACY_OPEN_PATHS:
+        if "{" in open_path:
+            pattern = open_path.replace("{course_code:path}", ".*")
+            import re
+            if re.match(f"^{pattern}$", path):
+                logging.info(f"Path {path} matches open path pattern {open_path}")
+                break
+        elif path == open_path or path.startswith(open_path + "/"):
+            logging.info(f"Path {path} matches open path {open_path}")
+            break
+    else:
+        logging.warning(f"Path {path} does not match any open path")
+
+    return await legacy_auth_middleware(request, call_next, LEGACY_OPEN_PATHS)
+
+
+async def legacy_auth_middleware(request, call_next, open_paths):
+    """The removed utils.azure_sso.auth_middleware."""
+    if request.method == "OPTIONS":
+        return await call_next(request)
+
+    if request.url.path in open_paths:
+        return await call_next(request)
+
+    try:
+        azure_sso.authenticate_request(request)
+    except azure_sso.AuthError as e:
+        return JSONResponse(content={"message": str(e)}, status_code=e.status_code)
+
+    return await call_next(request)
+
+
+def make_scope(path):
+    route = next(route for route in api.app.routes if getattr(route, "path", None) == path)
+    return {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [],
+            "endpoint": route.endpoint}
+
+
+async def per_request(func, path, repeat):
+    scope = make_scope(path)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func(Request(scope))
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+async def run(repeat):
+    async def call_next(request):
+        return Response()
+
+    async def legacy(request):
+        return await legacy_sso_middleware(request, call_next)
+
+    # Authenticated routes are timed on the 401 path and service-backed routes on the 503
+    # path (no services are built here), so only the policy itself is measured
+    async def compiled(request):
+        try:
+            await api.route_policy(request)
+        except (azure_sso.AuthError, HTTPException):
+            pass
+
+    print("route                     legacy middleware  compiled dependency")
+    for path in ("/health", "/analyze", "/full-sentence-suggestion", "/cache-stats", "/result/{request_id}"):
+        before = await per_request(legacy, path, repeat)
+        after = await per_request(compiled, path, repeat)
+        print(f"{path:24s}  {before:14.2f} us  {after:16.2f} us")
+
+
+def main():
+    api.compile_route_policy()
+    api.services_ready.set()
+    asyncio.run(run(20000))
+
+
+if __name__ == "__main__":
+    main()
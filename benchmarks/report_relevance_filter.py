@@ -0,0 +1,44 @@
+# Recall/cost report of the local relevance prefilter on a labeled sample corpus.
+# Run from the repo root: python benchmarks/report_relevance_filter.py
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.relevance_filter import RelevanceFilter
+from utils.text_chunker import CHARS_PER_TOKEN
+
+DEFAULT_KEYWORDS = ["diversity", "equity", "inclusion", "DEI", "underrepresented", "marginalized", "equality"]
+THRESHOLDS = [0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
+
+
+def main():
+    with open(os.path.join(ROOT, "benchmarks", "relevance_corpus.json")) as f:
+        corpus = json.load(f)
+
+    relevance_filter = RelevanceFilter(DEFAULT_KEYWORDS)
+    scored = [(relevance_filter.score(sample["text"]), sample) for sample in corpus]
+    relevant_total = sum(1 for sample in corpus if sample["relevant"])
+    tokens_total = sum(len(sample["text"]) // CHARS_PER_TOKEN for sample in corpus)
+
+    print(f"{len(corpus)} samples, {relevant_total} labeled relevant")
+    print("threshold  recall  LLM calls avoided  prompt tokens avoided")
+    for threshold in THRESHOLDS:
+        kept = [sample for score, sample in scored if score >= threshold]
+        recall = sum(1 for sample in kept if sample["relevant"]) / relevant_total
+        skipped = len(corpus) - len(kept)
+        tokens_skipped = tokens_total - sum(len(sample["text"]) // CHARS_PER_TOKEN for sample in kept)
+        print(f"{threshold:9.2f}  {recall:6.2f}  {skipped:3d}/{len(corpus)} ({skipped / len(corpus):5.1%})"
+              f"    {tokens_skipped / tokens_total:5.1%}")
+
+    # The server's prefilter is off unless RELEVANCE_PREFILTER_THRESHOLD is set; 0.5 is the suggested setting
+    threshold = float(os.getenv("RELEVANCE_PREFILTER_THRESHOLD") or "0.5")
+    missed = [sample["text"] for score, sample in scored if sample["relevant"] and score < threshold]
+    for text in missed:
+        print(f"missed at {threshold}: {text[:80]}...")
+
+
+if __name__ == "__main__":
+    main()
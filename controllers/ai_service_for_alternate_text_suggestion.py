@@ -1,5 +1,8 @@
-from models import SuggestionPayload, AlternateTextSuggestionResult, AlternativeSuggestion, analyze_full_text_suggestions
-from langchain_aws import ChatBedrock
+from models import SuggestionPayload, AlternateTextSuggestionResult, AlternativeSuggestion, analyze_full_text_suggestions, stream_full_text_suggestions
+from controllers.keyword_profile_service import keyword_profile_service, DEFAULT_SUGGESTION_PROFILE
+from utils.json_stream import JsonArrayStreamer, salvage_json, continue_truncated_json
+from utils.bedrock_clients import bedrock_clients
+from utils.metrics import LLM_PARSE_FAILURES
 from uuid import uuid4
 import json
 import os
@@ -16,38 +19,84 @@ logger = logging.getLogger('ai_service_for_alternat_test_suggestion')
 load_dotenv()
 
 class StatementSuggester:
+    # Arrays whose complete elements are kept when a response is cut off
+    SALVAGE_KEYS = ("alternative_suggestions", "highlighted_sections", "keywords_matched")
 
     def __init__(self, request_id):
         
         self.request_id = request_id
 
-        self.default_keywords = [
-            "Anti-Racism", "Racism", "Race", "Allyship", "Bias", "DEI",
-            "Diversity", "Diverse", "Confirmation Bias", "Equity", "Equitableness",
-            "Feminism", "Gender", "Gender Identity",
-            "Inclusion", "Inclusive", "All-Inclusive", "Inclusivity", "Injustice", "Intersectionality", "Prejudice", "Privilege",
-            "Racial Identity", "Sexuality", "Stereotypes", "Pronouns", "Transgender", "Equality Allyship",
-        ]
+        self.default_keywords = keyword_profile_service.get_profile(DEFAULT_SUGGESTION_PROFILE).keywords
 
         self.default_condition = f"Please rewrite the following sentence for a course that is teaching and assessing the following skills without using the following list of words  {', '.join(self.default_keywords)}"
 
-        # Initialize ChatBedrock for Claude v3
+        # Claude v3 through the shared Bedrock client pool
         logger.info("Setting up ChatBedrock with Claude v3")
-        self.llm = ChatBedrock(
-            model_id="anthropic.claude-3-sonnet-20240229-v1:0",
-            model_kwargs={"max_tokens": 4000},
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-        )
+        self.llm = bedrock_clients.get_llm(max_tokens=4000)
         logger.info("StatementSuggester initialization complete")
 
-    def analyze_suggestions(self, payload, request_id: str) -> AlternateTextSuggestionResult:
+    async def analyze_suggestions(self, payload, request_id: str) -> AlternateTextSuggestionResult:
         logger.info(f"Starting analysis for request_id: {request_id}")
+        keywords, avoid_matcher, text_content, prompt = self._prepare_suggestion(payload)
+
+        # Call the LLM
+        logger.info("Calling LLM API")
+        try:
+            response = await self.llm.ainvoke(prompt)
+            logger.info("Received response from LLM API")
+            # Log first 10 chars of response
+            logger.debug(f"LLM response: {response.content[:1000]}...")
+            response_text = await continue_truncated_json(self.llm, prompt, response, self.SALVAGE_KEYS)
+        except Exception as e:
+            logger.error(f"Error calling LLM API: {str(e)}", exc_info=True)
+            raise
+
+        # Parse the response
+        logger.info("Parsing LLM response")
+        result_data = self._parse_response(response_text, avoid_matcher)
+        logger.info(
+            f"Found {len(result_data.get('highlighted_sections', []))} highlighted sections")
+
+        result = self._build_result(payload, request_id, text_content, keywords, result_data)
+        logger.info(f"Analysis complete for request_id: {request_id}")
+        return result
+
+    async def stream_suggestions(self, payload, request_id: str):
+        """Stream suggestions: yields ("suggestion", AlternativeSuggestion) as soon as each element of
+        alternative_suggestions is complete, then ("result", AlternateTextSuggestionResult)."""
+        logger.info(f"Starting streamed analysis for request_id: {request_id}")
+        keywords, avoid_matcher, text_content, prompt = self._prepare_suggestion(payload)
 
-        # Use keywords from payload or fall back to defaults if empty
-        keywords = payload.keywords if payload.keywords else self.default_keywords
+        streamer = JsonArrayStreamer(key="alternative_suggestions")
+        chunks = []
+        logger.info("Streaming from LLM API")
+        try:
+            async for chunk in self.llm.astream(prompt):
+                text = chunk.content if isinstance(chunk.content, str) else ""
+                chunks.append(text)
+                for suggestion in streamer.feed(text):
+                    if not isinstance(suggestion, dict):
+                        continue
+                    try:
+                        yield "suggestion", AlternativeSuggestion(**self._clean_suggestion(suggestion, avoid_matcher))
+                    except Exception as e:
+                        logger.warning(f"Skipping malformed streamed suggestion: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error streaming from LLM API: {str(e)}", exc_info=True)
+            raise
+
+        result_data = self._parse_response("".join(chunks), avoid_matcher)
+        yield "result", self._build_result(payload, request_id, text_content, keywords, result_data)
+
+    def _prepare_suggestion(self, payload):
+        # Use the requested profile, keywords from payload, or fall back to defaults if empty
+        profile_id = getattr(payload, 'profile_id', None)
+        keywords = keyword_profile_service.resolve_keywords(profile_id, payload.keywords, DEFAULT_SUGGESTION_PROFILE)
         logger.info(f"Using keywords: {keywords}")
 
+        # Terms the alternatives must avoid: the requested profile, otherwise the default profile
+        avoid_matcher = keyword_profile_service.get_matcher(profile_id, [], DEFAULT_SUGGESTION_PROFILE)
+
         # Handle both text or sentence in payload
         text_content = ""
         if hasattr(payload, 'text'):
@@ -66,30 +115,15 @@ class StatementSuggester:
             req_prompt_content = payload.metadata['req_prompt']
 
         # Construct the prompt
-        prompt = self._build_prompt(text_content, req_prompt_content)
+        prompt = self._build_prompt(text_content, req_prompt_content, avoid_matcher.keywords)
         # Log first 100 chars of prompt
         logger.debug(f"Generated prompt: {prompt[:100]}...")
+        return keywords, avoid_matcher, text_content, prompt
 
-        # Call the LLM
-        logger.info("Calling LLM API")
-        try:
-            response = self.llm.invoke(prompt)
-            logger.info("Received response from LLM API")
-            # Log first 10 chars of response
-            logger.debug(f"LLM response: {response.content[:1000]}...")
-        except Exception as e:
-            logger.error(f"Error calling LLM API: {str(e)}", exc_info=True)
-            raise
-
-        # Parse the response
-        logger.info("Parsing LLM response")
-        result_data = self._parse_response(response.content)
-        logger.info(
-            f"Found {len(result_data.get('highlighted_sections', []))} highlighted sections")
-
+    def _build_result(self, payload, request_id: str, text_content: str, keywords, result_data) -> AlternateTextSuggestionResult:
         # Create analysis result
         logger.info("Creating analysis result")
-        result = AlternateTextSuggestionResult(
+        return AlternateTextSuggestionResult(
             id=str(uuid4()),
             request_id=request_id,
             source_id=payload.source_id,
@@ -101,14 +135,14 @@ class StatementSuggester:
             metadata=payload.metadata,
             message=result_data.get("message", "")
         )
-        logger.info(f"Analysis complete for request_id: {request_id}")
-        return result
 
-    def _build_prompt(self, text_content, req_prompt):
+    def _build_prompt(self, text_content, req_prompt, avoid_keywords=None):
         if not text_content or len(text_content.strip()) < 5:
             text_content = "Students failed the assessment."
 
-        keywords_to_avoid = ", ".join(self.default_keywords[:15]) if hasattr(self, 'default_keywords') else ""
+        if avoid_keywords is None:
+            avoid_keywords = self.default_keywords if hasattr(self, 'default_keywords') else []
+        keywords_to_avoid = ", ".join(avoid_keywords[:15])
 
         if not req_prompt:
             req_prompt = f"""Analyze this educational text and identify any phrases that could be improved to be more inclusive,
@@ -171,61 +205,27 @@ class StatementSuggester:
 
         return prompt
 
-    def _parse_response(self, response_text):
+    def _parse_response(self, response_text, avoid_matcher=None):
         # Extract JSON from response
         logger.info("Parsing LLM response")
         try:
-            # For chat models, extract the JSON part from the response
-            json_str = response_text.strip()
-
-            logger.info(f"Raw response text: {json_str[:500]}...")
-
-            if "```json" in json_str:
-                logger.info("Found JSON code block with ```json marker")
-                json_str = json_str.split("```json")[1].split("```")[0].strip()
-            elif "```" in json_str:
-                logger.info("Found JSON code block with ``` marker")
-                parts = json_str.split("```")
-                if len(parts) >= 3:
-                    json_str = parts[1].strip()
-
-            try:
-                result = json.loads(json_str)
-
-            except json.JSONDecodeError:
-                if json_str.find('{') != -1 and json_str.rfind('}') != -1:
-                    start_idx = json_str.find('{')
-                    end_idx = json_str.rfind('}') + 1
-                    json_str = json_str[start_idx:end_idx]
-                    result = json.loads(json_str)
-                else:
-                    raise
+            logger.info(f"Raw response text: {response_text.strip()[:500]}...")
+
+            salvaged = salvage_json(response_text, self.SALVAGE_KEYS)
+            if salvaged.data is None:
+                raise json.JSONDecodeError("No JSON object or complete suggestion found", response_text, 0)
+            result = salvaged.data
+            if not salvaged.complete:
+                logger.warning(f"Response JSON was incomplete, recovered {len(result.get('alternative_suggestions', []))} "
+                               f"complete suggestions")
+                result.setdefault("message", "Response was cut off; showing the suggestions that were complete")
 
             # Process alternatives to ensure they match the expected format and don't contain problematic keywords
+            if avoid_matcher is None:
+                avoid_matcher = keyword_profile_service.get_matcher(None, [], DEFAULT_SUGGESTION_PROFILE)
             if "alternative_suggestions" in result:
                 for suggestion in result["alternative_suggestions"]:
-                    if "alternatives" in suggestion and isinstance(suggestion["alternatives"], list):
-                        cleaned_alternatives = []
-
-                        for alt in suggestion["alternatives"]:
-                            alt_text = alt if isinstance(alt, str) else alt.get("text", "")
-
-                            contains_problematic = False
-                            if hasattr(self, 'default_keywords'):
-                                for keyword in self.default_keywords:
-                                    if keyword.lower() in alt_text.lower():
-                                        logger.warning(f"Alternative '{alt_text}' contains problematic keyword '{keyword}'")
-                                        contains_problematic = True
-                                        break
-
-                            if not contains_problematic:
-                                cleaned_alternatives.append({"text": alt_text} if isinstance(alt, str) else alt)
-
-                        if not cleaned_alternatives:
-                            logger.warning(f"All alternatives for '{suggestion.get('problematicPhrase', '')}' contained problematic keywords")
-                            cleaned_alternatives = [{"text": "alternative wording needed - previous suggestions contained problematic terms"}]
-
-                        suggestion["alternatives"] = cleaned_alternatives
+                    self._clean_suggestion(suggestion, avoid_matcher)
 
             if "highlighted_sections" not in result:
                 result["highlighted_sections"] = []
@@ -237,40 +237,78 @@ class StatementSuggester:
             return result
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON: {str(e)}", exc_info=True)
+            LLM_PARSE_FAILURES.inc(self.llm.model_id, "suggestion")
             # Fallback for parsing errors
             logger.warning("Using fallback empty result")
             return {"highlighted_sections": [], "keywords_matched": [], "alternative_suggestions": []}
         except Exception as e:
             logger.error(f"Unexpected error in _parse_response: {str(e)}", exc_info=True)
+            LLM_PARSE_FAILURES.inc(self.llm.model_id, "suggestion")
             return {"highlighted_sections": [], "keywords_matched": [], "alternative_suggestions": []}
 
-    def process_full_text_suggestion(self, request_data: dict, request_id: str = None):
+    def _clean_suggestion(self, suggestion, avoid_matcher):
+        """Normalize a suggestion's alternatives to {"text": ...} and drop those using avoided keywords"""
+        if "alternatives" in suggestion and isinstance(suggestion["alternatives"], list):
+            cleaned_alternatives = []
+
+            for alt in suggestion["alternatives"]:
+                alt_text = alt if isinstance(alt, str) else alt.get("text", "")
+
+                contains_problematic = False
+                keyword = avoid_matcher.search(alt_text)
+                if keyword is not None:
+                    logger.warning(f"Alternative '{alt_text}' contains problematic keyword '{keyword}'")
+                    contains_problematic = True
+
+                if not contains_problematic:
+                    cleaned_alternatives.append({"text": alt_text} if isinstance(alt, str) else alt)
+
+            if not cleaned_alternatives:
+                logger.warning(f"All alternatives for '{suggestion.get('problematicPhrase', '')}' contained problematic keywords")
+                cleaned_alternatives = [{"text": "alternative wording needed - previous suggestions contained problematic terms"}]
+
+            suggestion["alternatives"] = cleaned_alternatives
+        return suggestion
+
+    async def process_full_text_suggestion(self, request_data: dict, request_id: str = None):
         """
         Process a full text suggestion request
         """
-        import os
-        import logging
-        from langchain_aws import ChatBedrock
-        from models import analyze_full_text_suggestions
+        try:
+            result = await analyze_full_text_suggestions(**self._prepare_full_text_request(request_data, request_id))
+
+            return result
+        except Exception as e:
+            logging.exception(f"Error in full text suggestion processing: {str(e)}")
+            raise e
+
+    async def stream_full_text_suggestion(self, request_data: dict, request_id: str = None):
+        """
+        Stream a full text suggestion request, see models.stream_full_text_suggestions
+        """
+        async for event in stream_full_text_suggestions(**self._prepare_full_text_request(request_data, request_id)):
+            yield event
 
+    def _prepare_full_text_request(self, request_data: dict, request_id: str = None) -> dict:
+        """
+        Build the arguments of a full text suggestion call from the request body
+        """
         if not request_id:
             from uuid import uuid4
             request_id = str(uuid4())
 
         original_text = request_data.get("original_text", "")
         keywords = request_data.get("keywords", [])
+        if request_data.get("profile_id"):
+            keywords = keyword_profile_service.get_profile(request_data["profile_id"]).keywords
         custom_prompt = request_data.get("prompt", "")
         source_id = request_data.get("source_id", "highlighted-text")
         content_type = request_data.get("content_type", "text")
         metadata = request_data.get("metadata", {})
         mode = request_data.get("mode", "full_text")
 
-        llm = ChatBedrock(
-            model_id="anthropic.claude-3-sonnet-20240229-v1:0",
-            model_kwargs={"max_tokens": 4000, "temperature": 0.7},
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-        )
+        # Shared per (model, params) rather than built per request
+        llm = bedrock_clients.get_llm(max_tokens=4000, temperature=0.7)
 
         max_length = 10000
         text_to_process = original_text
@@ -287,18 +325,12 @@ class StatementSuggester:
             "metadata": metadata
         }
 
-        try:
-            result = analyze_full_text_suggestions(
-                payload=payload,
-                request_id=request_id,
-                llm=llm,
-                text_to_process=text_to_process,
-                keywords=keywords,
-                custom_prompt=custom_prompt,
-                mode=mode
-            )
-
-            return result
-        except Exception as e:
-            logging.exception(f"Error in full text suggestion processing: {str(e)}")
-            raise e
\ No newline at end of file
+        return {
+            "payload": payload,
+            "request_id": request_id,
+            "llm": llm,
+            "text_to_process": text_to_process,
+            "keywords": keywords,
+            "custom_prompt": custom_prompt,
+            "mode": mode
+        }
@@ -1,6 +1,15 @@
-from models import TextPayload, AnalysisResult, HighlightedSection
-from langchain_aws import ChatBedrock
+from models import TextPayload, AnalysisResult, HighlightedSection, ColumnarMatches, KeywordMatchCount, SkippedRange
+from controllers.keyword_profile_service import keyword_profile_service, DEFAULT_ANALYSIS_PROFILE
+from utils.token_index import token_index_cache
+from utils.result_cache import result_cache, make_cache_key
+from utils.text_chunker import split_text
+from utils.relevance_filter import RelevanceFilter
+from utils.json_stream import salvage_json, continue_truncated_json
+from utils.singleflight import SingleFlight
+from utils.bedrock_clients import bedrock_clients
+from utils.metrics import LLM_PARSE_FAILURES
 from uuid import uuid4
+import asyncio
 import json
 import os
 import logging
@@ -16,49 +25,42 @@ logger = logging.getLogger('ai_service_for_text_analysis')
 load_dotenv()
 
 class TextAnalyzer:
+    # Bump whenever _build_prompt changes so cached results from the old prompt are not reused
+    PROMPT_VERSION = "1"
+    # Arrays whose complete elements are kept when a response is cut off
+    SALVAGE_KEYS = ("highlighted_sections", "concepts_found", "keywords_matched")
+
     def __init__(self):
         logger.info("Initializing TextAnalyzer")
         # Default keywords if none provided
-        self.default_keywords = [
-            "diversity",
-            "equity",
-            "inclusion",
-            "DEI",
-            "underrepresented",
-            "marginalized",
-            "equality"
-        ]
-
-        # Initialize ChatBedrock for Claude v3
+        self.default_keywords = keyword_profile_service.get_profile(DEFAULT_ANALYSIS_PROFILE).keywords
+
+        # Claude v3 through the shared Bedrock client pool
         logger.info("Setting up ChatBedrock with Claude v3")
-        self.llm = ChatBedrock(
-            model_id="anthropic.claude-3-sonnet-20240229-v1:0",
-            model_kwargs={"max_tokens": 4000},
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-        )
+        self.llm = bedrock_clients.get_llm(max_tokens=4000)
+        # Long documents are analyzed as concurrent chunks of this many (estimated) tokens
+        self.chunk_max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", "1500"))
+        self.chunk_concurrency = int(os.getenv("CHUNK_CONCURRENCY", "8"))
+        # Local relevance score a chunk of a multi-chunk /conceptsearch document needs before it is sent
+        # to the LLM; off by default (0), 0.5 kept every relevant sample of benchmarks/relevance_corpus.json
+        self.prefilter_threshold = float(os.getenv("RELEVANCE_PREFILTER_THRESHOLD", "0"))
+        self.prefilter_stats = {"chunks_scored": 0, "chunks_skipped": 0}
+        # Identical analyses (same cache key) requested concurrently share one LLM call
+        self.inflight = SingleFlight("llm-analysis")
         logger.info("TextAnalyzer initialization complete")
 
     #Method for conceptual analysis        
-    def analyze_text_semantic(self, payload: TextPayload, request_id: str) -> AnalysisResult:
+    async def analyze_text_semantic(self, payload: TextPayload, request_id: str) -> AnalysisResult:
         logger.info(f"Starting semantic analysis for request_id: {request_id}")
-        keywords = payload.keywords if payload.keywords else self.default_keywords
+        keywords = self._resolve_keywords(payload)
         logger.info(f"Using keywords: {keywords}")
-        prompt = self._build_prompt(payload.text, keywords)
-        logger.debug(f"Generated prompt: {prompt[:100]}...")
-        try:
-            response = self.llm.invoke(prompt)
-            logger.info("Received response from LLM API")
-            logger.debug(f"LLM response: {response.content[:1000]}...")
-        except Exception as e:
-            logger.error(f"Error calling LLM API: {str(e)}", exc_info=True)
-            raise
-        logger.info("Parsing LLM response")
-        result_data = self._parse_response(response.content)
-
-        self._fix_section_indexes(payload.text, result_data.get("highlighted_sections", []))
+        prefilter_threshold = payload.prefilter_threshold
+        if prefilter_threshold is None:
+            prefilter_threshold = self.prefilter_threshold
+        result_data = await self._analyze_chunks(payload.text, keywords, payload.bypass_cache, prefilter_threshold)
 
         logger.info(f"Found {len(result_data.get('highlighted_sections', []))} highlighted sections")
+        skipped_ranges = result_data.get("skipped_ranges")
         result = AnalysisResult(
             id=str(uuid4()),
             request_id=request_id,
@@ -71,7 +73,8 @@ class TextAnalyzer:
             ],
             has_flags='true' if len(result_data.get("highlighted_sections", [])) > 0 else 'false',
             metadata=payload.metadata,
-            keywords_matched=result_data.get("keywords_matched", [])
+            keywords_matched=result_data.get("keywords_matched", []),
+            skipped_ranges=[SkippedRange(**skipped) for skipped in skipped_ranges] if skipped_ranges else None
         )
         logger.info(f"Semantic analysis complete for request_id: {request_id}, has_flags: {result.has_flags}")
         return result
@@ -79,30 +82,49 @@ class TextAnalyzer:
     # Method for analyzing exact keyword references
     def analyze_text_lexical(self, payload: TextPayload, request_id: str) -> AnalysisResult:
         logger.info(f"Starting lexical analysis for request_id: {request_id}")
-        keywords = payload.keywords if payload.keywords else self.default_keywords
+        # Compiled matcher is cached per profile version / keyword list
+        matcher = keyword_profile_service.get_matcher(payload.profile_id, payload.keywords, DEFAULT_ANALYSIS_PROFILE)
+        keywords = matcher.keywords
         text = payload.text
         highlighted_sections = []
         keywords_matched = []
-        for keyword in keywords:
-            start = 0
-            keyword_lower = keyword.lower()
-            text_lower = text.lower()
-            while True:
-                idx = text_lower.find(keyword_lower, start)
-                if idx == -1:
-                    break
-                end_idx = idx + len(keyword)
-                highlighted_sections.append({
-                    "start_index": idx,
-                    "end_index": end_idx,
-                    "matched_text": text[idx:end_idx],
-                    "reason": f"Exact match for '{keyword}'",
-                    "concept_matched": keyword,
-                    "confidence": 1.0
-                })
-                if keyword not in keywords_matched:
-                    keywords_matched.append(keyword)
-                start = end_idx
+        columnar_matches = None
+        keyword_counts = None
+        match_count = 0
+        # Reviewers re-query the same text while tuning lists; the index is cached by content hash
+        index = token_index_cache.get_or_build(text) if payload.use_index else None
+        # Single pass over the text for all keywords
+        spans_by_keyword = matcher.find_all(text, index)
+
+        if payload.output_mode == "columnar":
+            # Parallel arrays instead of one section object per match
+            columnar_matches = ColumnarMatches()
+            for keyword_id, spans in enumerate(spans_by_keyword):
+                columnar_matches.start_indexes.extend(start for start, _ in spans)
+                columnar_matches.end_indexes.extend(end for _, end in spans)
+                columnar_matches.keyword_ids.extend([keyword_id] * len(spans))
+        elif payload.output_mode == "aggregate":
+            keyword_counts = [
+                KeywordMatchCount(keyword=keyword, count=len(spans), first_index=spans[0][0])
+                for keyword, spans in zip(keywords, spans_by_keyword) if spans
+            ]
+        else:
+            for keyword, is_pattern, spans in zip(keywords, matcher.is_pattern, spans_by_keyword):
+                reason = f"Pattern match for '{keyword}'" if is_pattern else f"Exact match for '{keyword}'"
+                for idx, end_idx in spans:
+                    highlighted_sections.append({
+                        "start_index": idx,
+                        "end_index": end_idx,
+                        "matched_text": text[idx:end_idx],
+                        "reason": reason,
+                        "concept_matched": keyword,
+                        "confidence": 1.0
+                    })
+
+        for keyword, spans in zip(keywords, spans_by_keyword):
+            match_count += len(spans)
+            if spans and keyword not in keywords_matched:
+                keywords_matched.append(keyword)
         result = AnalysisResult(
             id=str(uuid4()),
             request_id=request_id,
@@ -111,40 +133,25 @@ class TextAnalyzer:
             original_text=text,
             keywords_searched=keywords,
             highlighted_sections=[HighlightedSection(**section) for section in highlighted_sections],
-            has_flags='true' if highlighted_sections else 'false',
+            has_flags='true' if match_count else 'false',
             metadata=payload.metadata,
-            keywords_matched=keywords_matched
+            keywords_matched=keywords_matched,
+            output_mode=payload.output_mode,
+            columnar_matches=columnar_matches,
+            keyword_counts=keyword_counts
         )
-        logger.info(f"Lexical analysis complete for request_id: {request_id}, found {len(highlighted_sections)} matches")
+        logger.info(f"Lexical analysis complete for request_id: {request_id}, found {match_count} matches")
         return result
     
     # Hybrid search
-    def analyze_text(self, payload: TextPayload, request_id: str) -> AnalysisResult:
+    async def analyze_text(self, payload: TextPayload, request_id: str) -> AnalysisResult:
         logger.info(f"Starting analysis for request_id: {request_id}")
-        # Use keywords from payload or fall back to defaults if empty
-        keywords = payload.keywords if payload.keywords else self.default_keywords
+        # Use the requested profile, keywords from payload, or fall back to defaults if empty
+        keywords = self._resolve_keywords(payload)
         logger.info(f"Using keywords: {keywords}")
 
-        # Construct the prompt
-        prompt = self._build_prompt(payload.text, keywords)
-        # Log first 100 chars of prompt
-        logger.debug(f"Generated prompt: {prompt[:100]}...")
-
-        # Call the LLM
-        logger.info("Calling LLM API")
-        try:
-            response = self.llm.invoke(prompt)
-            logger.info("Received response from LLM API")
-            # Log first 10 chars of response
-            logger.debug(f"LLM response: {response.content[:1000]}...")
-        except Exception as e:
-            logger.error(f"Error calling LLM API: {str(e)}", exc_info=True)
-            raise
-
-        # Parse the response
-        logger.info("Parsing LLM response")
-        result_data = self._parse_response(response.content)
-        self._fix_section_indexes(payload.text, result_data.get("highlighted_sections", []))
+        # The hybrid analysis always sends the whole text to the LLM
+        result_data = await self._analyze_chunks(payload.text, keywords, payload.bypass_cache)
 
         logger.info(f"Found {len(result_data.get('highlighted_sections', []))} highlighted sections")
         result = AnalysisResult(
@@ -163,6 +170,109 @@ class TextAnalyzer:
             f"Analysis complete for request_id: {request_id}, has_flags: {result.has_flags}")
         return result
 
+    async def _analyze_chunks(self, text: str, keywords, bypass_cache: bool = False, prefilter_threshold: float = 0):
+        """Map-reduce analysis: run the prompt on token-budgeted chunks concurrently and merge
+        the sections, rebased to document offsets, so latency follows chunk size.
+
+        With a prefilter_threshold, chunks of a multi-chunk document that score below it against
+        the expanded concept vocabulary never reach the LLM and are returned as `skipped_ranges`.
+        """
+        chunks = split_text(text, self.chunk_max_tokens)
+
+        skipped_ranges = []
+        if prefilter_threshold > 0 and len(chunks) > 1:
+            relevance_filter = RelevanceFilter(keywords)
+            relevant_chunks = []
+            for offset, chunk_text in chunks:
+                score = relevance_filter.score(chunk_text)
+                if score >= prefilter_threshold:
+                    relevant_chunks.append((offset, chunk_text))
+                else:
+                    skipped_ranges.append({"start_index": offset, "end_index": offset + len(chunk_text),
+                                           "score": round(score, 3)})
+            self.prefilter_stats["chunks_scored"] += len(chunks)
+            self.prefilter_stats["chunks_skipped"] += len(skipped_ranges)
+            if skipped_ranges:
+                logger.info(f"Relevance prefilter skipped {len(skipped_ranges)} of {len(chunks)} chunks")
+            if not relevant_chunks:
+                return {"highlighted_sections": [], "keywords_matched": [], "skipped_ranges": skipped_ranges}
+            chunks = relevant_chunks
+
+        if len(chunks) == 1 and len(chunks[0][1]) == len(text):
+            return await self._get_result_data(text, keywords, bypass_cache)
+
+        logger.info(f"Analyzing {len(chunks)} chunks of up to {self.chunk_max_tokens} tokens")
+        semaphore = asyncio.Semaphore(self.chunk_concurrency)
+
+        async def analyze_chunk(chunk_text):
+            async with semaphore:
+                return await self._get_result_data(chunk_text, keywords, bypass_cache)
+
+        chunk_results = await asyncio.gather(*(analyze_chunk(chunk_text) for _, chunk_text in chunks))
+
+        sections = []
+        seen = set()
+        keywords_matched = []
+        for (offset, _), chunk_data in zip(chunks, chunk_results):
+            for section in chunk_data.get("highlighted_sections", []):
+                # Chunk results may be shared with the cache, so rebase copies
+                section = dict(section)
+                if isinstance(section.get("start_index"), int) and isinstance(section.get("end_index"), int):
+                    section["start_index"] += offset
+                    section["end_index"] += offset
+                key = (section.get("start_index"), section.get("end_index"), section.get("matched_text"))
+                if key in seen:
+                    continue
+                seen.add(key)
+                sections.append(section)
+            for keyword in chunk_data.get("keywords_matched", []):
+                if keyword not in keywords_matched:
+                    keywords_matched.append(keyword)
+
+        sections.sort(key=lambda section: section.get("start_index") if isinstance(section.get("start_index"), int) else -1)
+        return {"highlighted_sections": sections, "keywords_matched": keywords_matched, "skipped_ranges": skipped_ranges}
+
+    async def _get_result_data(self, text: str, keywords, bypass_cache: bool = False):
+        """Run the concept prompt for `text`, serving unchanged resubmissions from the result cache."""
+        cache_key = make_cache_key(text, keywords, self.PROMPT_VERSION, self.llm.model_id)
+        if not bypass_cache:
+            cached = await result_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Serving analysis from result cache")
+                return cached
+
+        return await self.inflight.do(cache_key, lambda: self._run_analysis(text, keywords, cache_key))
+
+    async def _run_analysis(self, text: str, keywords, cache_key: str):
+        # Construct the prompt
+        prompt = self._build_prompt(text, keywords)
+        # Log first 100 chars of prompt
+        logger.debug(f"Generated prompt: {prompt[:100]}...")
+
+        # Call the LLM
+        logger.info("Calling LLM API")
+        try:
+            response = await self.llm.ainvoke(prompt)
+            logger.info("Received response from LLM API")
+            # Log first 10 chars of response
+            logger.debug(f"LLM response: {response.content[:1000]}...")
+            response_text = await continue_truncated_json(self.llm, prompt, response, self.SALVAGE_KEYS)
+        except Exception as e:
+            logger.error(f"Error calling LLM API: {str(e)}", exc_info=True)
+            raise
+
+        # Parse the response
+        logger.info("Parsing LLM response")
+        result_data = self._parse_response(response_text)
+        self._fix_section_indexes(text, result_data.get("highlighted_sections", []))
+
+        if not result_data.get("parse_failed") and not result_data.get("truncated"):
+            await result_cache.set(cache_key, result_data)
+        return result_data
+
+    def _resolve_keywords(self, payload: TextPayload):
+        return keyword_profile_service.resolve_keywords(payload.profile_id, payload.keywords, DEFAULT_ANALYSIS_PROFILE)
+
     def _build_prompt(self, text, keywords):
         logger.info("Building prompt")
         # Building a concept-oriented prompt
@@ -209,47 +319,29 @@ class TextAnalyzer:
     def _parse_response(self, response_text):
         # Extract JSON from response
         logger.info("Parsing LLM response")
-        try:
-            # For chat models, extract the JSON part from the response
-            json_str = response_text.strip()
-
-            if "```json" in json_str:
-                logger.info("Found JSON code block with ```json marker")
-                json_str = json_str.split("```json")[1].split("```")[0].strip()
-            elif "```" in json_str:
-                logger.info("Found JSON code block with ``` marker")
-                parts = json_str.split("```")
-                if len(parts) >= 3:
-                    json_str = parts[1].strip()
-
-            try:
-                result = json.loads(json_str)
-
-            except json.JSONDecodeError:
+        salvaged = salvage_json(response_text, self.SALVAGE_KEYS)
+        if salvaged.data is None:
+            logger.error(f"Failed to parse JSON from response: {response_text[:200]}...")
+            LLM_PARSE_FAILURES.inc(self.llm.model_id, "text_analysis")
+            # Fallback for parsing errors
+            logger.warning("Using fallback empty result")
+            return {"highlighted_sections": [], "keywords_matched": [], "parse_failed": True}
 
-                if json_str.find('{') != -1 and json_str.rfind('}') != -1:
-                    start_idx = json_str.find('{')
-                    end_idx = json_str.rfind('}') + 1
-                    json_str = json_str[start_idx:end_idx]
-                    result = json.loads(json_str)
+        result = salvaged.data
+        if not salvaged.complete:
+            logger.warning(f"Response JSON was incomplete, recovered {len(result.get('highlighted_sections', []))} "
+                           f"complete highlighted sections")
+            result["truncated"] = True
 
-                else:
-                    raise
+        if "highlighted_sections" not in result:
+            result["highlighted_sections"] = []
+        if "keywords_matched" not in result and "concepts_found" in result:
 
-            if "highlighted_sections" not in result:
-                result["highlighted_sections"] = []
-            if "keywords_matched" not in result and "concepts_found" in result:
+            result["keywords_matched"] = result["concepts_found"]
+        elif "keywords_matched" not in result:
+            result["keywords_matched"] = []
 
-                result["keywords_matched"] = result["concepts_found"]
-            elif "keywords_matched" not in result:
-                result["keywords_matched"] = []
-
-            return result
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON: {str(e)}", exc_info=True)
-            # Fallback for parsing errors
-            logger.warning("Using fallback empty result")
-            return {"highlighted_sections": [], "keywords_matched": []}
+        return result
 
     def _fix_section_indexes(self, text: str, sections: list):
         """Recalculate start_index and end_index for each highlighted section if they
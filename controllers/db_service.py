@@ -2,70 +2,171 @@
 import pymongo
 import os
 from models import AnalysisResult
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import base64
+import json
 import boto3
-from boto3.dynamodb.conditions import Key
-from decimal import Decimal
+from botocore.exceptions import ClientError
+from controllers.text_store import TextStore
+from utils.dynamo_serializer import serialize_item, deserialize_item
+from utils.metrics import DYNAMODB_OPERATION_DURATION
 
 
-def getRealDecimal(obj):
+# Optional result fields omitted from items when unset; compact lexical modes store only the requested representation,
+# and skipped_ranges is only set when the relevance prefilter skipped part of the text
+OMITTED_WHEN_NONE = ('columnar_matches', 'keyword_counts', 'skipped_ranges')
 
-    if isinstance(obj, float):
-        return Decimal(str(obj))
-    elif isinstance(obj, dict):
-        return {k: getRealDecimal(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [getRealDecimal(i) for i in obj]
-    return obj
+# Result fields that may be moved to the text store, replaced by a `<field>_ref` hash
+TEXT_FIELDS = ('original_text', 'original_sentence')
+TEXT_REF_FIELDS = tuple(f"{field}_ref" for field in TEXT_FIELDS)
+
+# Attributes returned by the flagged-results summary view; leaves out original_text and the sections
+FLAGGED_SUMMARY_FIELDS = ['id', 'request_id', 'source_id', 'content_type', 'has_flags', 'created_at',
+                          'keywords_matched', 'metadata']
+
+
+def encode_cursor(last_evaluated_key: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode()).decode()
+
+
+# Table plus index key attributes; a LastEvaluatedKey never holds more
+MAX_CURSOR_ATTRIBUTES = 4
+
+
+def _is_key_value(value) -> bool:
+    # Key attributes are strings, numbers or binary, e.g. {"S": "..."}
+    return (isinstance(value, dict) and len(value) == 1
+            and next(iter(value)) in ('S', 'N', 'B') and isinstance(next(iter(value.values())), str))
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if (not isinstance(key, dict) or not key or len(key) > MAX_CURSOR_ATTRIBUTES
+            or not all(isinstance(name, str) and _is_key_value(value) for name, value in key.items())):
+        raise ValueError("Invalid cursor")
+    return key
 
 
 class DynamoDBService:
     def __init__(self):
-        self.dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        # DYNAMODB_ENDPOINT_URL points the service at a local stand-in such as DynamoDB Local
+        endpoint_url = os.getenv("DYNAMODB_ENDPOINT_URL") or None
+        self.dynamodb = boto3.resource('dynamodb', region_name='us-east-1', endpoint_url=endpoint_url)
         self.table = self.dynamodb.Table('super-search-analysis_results')
+        # Plain client: items are converted by utils.dynamo_serializer rather than boto3's TypeSerializer
+        self.client = boto3.client('dynamodb', region_name='us-east-1', endpoint_url=endpoint_url)
+        # With TEXT_STORE_TABLE set, long source texts are stored once by hash instead of in every result
+        text_store_table = os.getenv("TEXT_STORE_TABLE")
+        self.text_store = TextStore(text_store_table) if text_store_table else None
 
-    def save_result(self, result: AnalysisResult) -> str:
-        """Save analysis result to DynamoDB and return its ID"""
-        result_dict = result.model_dump()
-        result_dict['created_at'] = result.created_at.isoformat()
+    def to_item(self, result: AnalysisResult) -> dict:
+        """DynamoDB attribute map of a result, built in a single pass"""
+        skip_none = OMITTED_WHEN_NONE + TEXT_REF_FIELDS
+        if self.text_store is None:
+            return serialize_item(result, skip_none)
 
+        fields = dict(result.__dict__)
+        for field in TEXT_FIELDS:
+            text = fields.get(field)
+            if text and len(text) >= self.text_store.min_chars:
+                fields[f"{field}_ref"] = self.text_store.put(text)
+                del fields[field]
+        return serialize_item(fields, skip_none)
 
-        result_dict = getRealDecimal(result_dict)
+    def _rehydrate(self, items: List[dict]) -> List[dict]:
+        """Fill in texts that were moved to the text store, with one bulk read"""
+        refs = [item[f"{field}_ref"] for item in items for field in TEXT_FIELDS if f"{field}_ref" in item]
+        if not refs or self.text_store is None:
+            return items
+        texts = self.text_store.get_many(refs)
+        for item in items:
+            for field in TEXT_FIELDS:
+                ref = item.get(f"{field}_ref")
+                if ref in texts:
+                    item[field] = texts[ref]
+        return items
 
-        # Insert document
-        insert_result = self.table.put_item(
-            Item=result_dict
+    def _query(self, index_name: str, key: str, value: str, **kwargs) -> Tuple[List[dict], Optional[dict]]:
+        response = self.client.query(
+            TableName=self.table.name,
+            IndexName=index_name,
+            KeyConditionExpression='#key = :value',
+            ExpressionAttributeNames={'#key': key, **kwargs.pop('ExpressionAttributeNames', {})},
+            ExpressionAttributeValues={':value': {'S': value}},
+            **kwargs
         )
-        return result_dict['id']
+        items = [deserialize_item(item) for item in response.get('Items', [])]
+        return items, response.get('LastEvaluatedKey')
 
-    def get_results_by_source_id(self, source_id: str) -> List[AnalysisResult]:
-        """Retrieve analysis results by source ID"""
-        response = self.table.query(
-            IndexName='source_id-index',  
-            KeyConditionExpression=Key('source_id').eq(source_id)
-        )
-        items = response.get('Items', [])
-        results = [AnalysisResult(**item) for item in items]
-        return results
+    @DYNAMODB_OPERATION_DURATION.time("save_result")
+    def save_result(self, result: AnalysisResult) -> str:
+        """Save analysis result to DynamoDB and return its ID"""
+        item = self.to_item(result)
+
+        # Insert document
+        self.client.put_item(TableName=self.table.name, Item=item)
+        return result.id
 
-    def get_flagged_results(self, limit: int = 100) -> List[AnalysisResult]:
-        """Retrieve results that have flags"""
-        response = self.table.query(
-            IndexName='has_flags-index',
-            KeyConditionExpression=Key('has_flags').eq("true")
+    @DYNAMODB_OPERATION_DURATION.time("batch_put_items")
+    def batch_put_items(self, items: List[dict]) -> List[dict]:
+        """Write up to 25 items in one BatchWriteItem call and return the items DynamoDB left unprocessed"""
+        response = self.client.batch_write_item(
+            RequestItems={self.table.name: [{'PutRequest': {'Item': item}} for item in items]}
         )
-        items = response.get('Items', [])
+        unprocessed = response.get('UnprocessedItems', {}).get(self.table.name, [])
+        return [request['PutRequest']['Item'] for request in unprocessed]
+
+    @DYNAMODB_OPERATION_DURATION.time("get_results_by_source_id")
+    def get_results_by_source_id(self, source_id: str, include_text: bool = False) -> List[AnalysisResult]:
+        """Retrieve analysis results by source ID; stored texts are only fetched with include_text"""
+        items, _ = self._query('source_id-index', 'source_id', source_id)
+        if include_text:
+            self._rehydrate(items)
         results = [AnalysisResult(**item) for item in items]
         return results
 
-    def get_result_by_request_id(self, request_id: str) -> Optional[AnalysisResult]:
-        """Retrieve analysis result by request ID"""
-        response = self.table.query(
-            IndexName='request_id-index',
-            KeyConditionExpression=Key('request_id').eq(request_id)
-        )
-        items = response.get('Items', [])
+    @DYNAMODB_OPERATION_DURATION.time("get_flagged_results")
+    def get_flagged_results(self, limit: int = 100, cursor: Optional[str] = None, descending: bool = True,
+                            summary: bool = True, include_text: bool = False) -> Tuple[List[dict], Optional[str]]:
+        """Retrieve one page of flagged results ordered by created_at, and the cursor of the next page.
+
+        Ordering comes from the sort key of the flagged index (FLAGGED_INDEX_NAME), which
+        should be `created_at`. With summary=True only FLAGGED_SUMMARY_FIELDS are read;
+        otherwise stored texts are fetched only with include_text.
+        """
+        query_args = {
+            'Limit': limit,
+            'ScanIndexForward': not descending,
+        }
+        if cursor:
+            query_args['ExclusiveStartKey'] = decode_cursor(cursor)
+        if summary:
+            # Aliases for every field, as several (e.g. "metadata") could collide with reserved words
+            query_args['ProjectionExpression'] = ", ".join(f"#f{i}" for i in range(len(FLAGGED_SUMMARY_FIELDS)))
+            query_args['ExpressionAttributeNames'] = {f"#f{i}": field for i, field in enumerate(FLAGGED_SUMMARY_FIELDS)}
+
+        try:
+            items, last_key = self._query(os.getenv("FLAGGED_INDEX_NAME", "has_flags-index"), 'has_flags', "true",
+                                          **query_args)
+        except ClientError as e:
+            # A well-formed cursor that is not a key of this index
+            if cursor and e.response.get('Error', {}).get('Code') == 'ValidationException':
+                raise ValueError("Invalid cursor")
+            raise
+        if include_text and not summary:
+            self._rehydrate(items)
+        return items, encode_cursor(last_key) if last_key else None
+
+    @DYNAMODB_OPERATION_DURATION.time("get_result_by_request_id")
+    def get_result_by_request_id(self, request_id: str, include_text: bool = False) -> Optional[AnalysisResult]:
+        """Retrieve analysis result by request ID; the stored text is only fetched with include_text"""
+        items, _ = self._query('request_id-index', 'request_id', request_id)
+        if items and include_text:
+            self._rehydrate(items[:1])
         if items:
             item = AnalysisResult(**items[0])
             return item
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,138 @@
+# keyword_profile_service.py
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+from pydantic import ValidationError
+
+from models import KeywordProfile
+from utils.keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger('keyword_profile_service')
+
+DEFAULT_ANALYSIS_PROFILE = "analysis-default"
+DEFAULT_SUGGESTION_PROFILE = "suggestion-default"
+
+# Built-in profiles; KEYWORD_PROFILES_FILE may add new ones or override these
+DEFAULT_PROFILES = [
+    KeywordProfile(
+        profile_id=DEFAULT_ANALYSIS_PROFILE,
+        version=1,
+        description="Default concepts for /analyze, /keywordsearch and /conceptsearch",
+        keywords=[
+            "diversity",
+            "equity",
+            "inclusion",
+            "DEI",
+            "underrepresented",
+            "marginalized",
+            "equality"
+        ],
+    ),
+    KeywordProfile(
+        profile_id=DEFAULT_SUGGESTION_PROFILE,
+        version=1,
+        description="Terms alternate text suggestions must avoid",
+        keywords=[
+            "Anti-Racism", "Racism", "Race", "Allyship", "Bias", "DEI",
+            "Diversity", "Diverse", "Confirmation Bias", "Equity", "Equitableness",
+            "Feminism", "Gender", "Gender Identity",
+            "Inclusion", "Inclusive", "All-Inclusive", "Inclusivity", "Injustice", "Intersectionality", "Prejudice", "Privilege",
+            "Racial Identity", "Sexuality", "Stereotypes", "Pronouns", "Transgender", "Equality Allyship",
+        ],
+    ),
+]
+
+
+class UnknownProfileError(KeyError):
+    """Raised when a request references a keyword profile that does not exist."""
+
+    def __init__(self, profile_id: str):
+        super().__init__(profile_id)
+        self.profile_id = profile_id
+
+    def __str__(self):
+        return f"Unknown keyword profile: {self.profile_id}"
+
+
+class KeywordProfileService:
+    def __init__(self, profiles_file: Optional[str] = None, cache_size: Optional[int] = None):
+        self.profiles: Dict[str, KeywordProfile] = {p.profile_id: p for p in DEFAULT_PROFILES}
+
+        profiles_file = profiles_file or os.getenv("KEYWORD_PROFILES_FILE")
+        if profiles_file:
+            self._load_file(profiles_file)
+
+        # Compiled matchers, keyed by (profile_id, version) or by the ad-hoc keyword tuple
+        self.cache_size = cache_size or int(os.getenv("KEYWORD_MATCHER_CACHE_SIZE", "64"))
+        self._matchers: "OrderedDict[Hashable, KeywordMatcher]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_file(self, path: str):
+        """Load profiles from a JSON list of {profile_id, version, description, keywords}"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Failed to load keyword profiles from {path}: {str(e)}")
+            return
+        loaded = 0
+        for index, item in enumerate(data):
+            # The service is built at import, so one bad entry must not stop the app from starting
+            try:
+                profile = KeywordProfile(**item)
+            except (ValidationError, TypeError) as e:
+                logger.error(f"Skipping invalid keyword profile #{index} in {path}: {str(e)}")
+                continue
+            self.profiles[profile.profile_id] = profile
+            loaded += 1
+        logger.info(f"Loaded {loaded} keyword profiles from {path}")
+
+    def list_profiles(self) -> List[KeywordProfile]:
+        return list(self.profiles.values())
+
+    def get_profile(self, profile_id: str) -> KeywordProfile:
+        profile = self.profiles.get(profile_id)
+        if profile is None:
+            raise UnknownProfileError(profile_id)
+        return profile
+
+    def resolve_keywords(self, profile_id: Optional[str], keywords: List[str], default_profile_id: str) -> List[str]:
+        """Pick the keyword list for a request: named profile, then explicit keywords, then the default profile."""
+        if profile_id:
+            return self.get_profile(profile_id).keywords
+        if keywords:
+            return keywords
+        return self.get_profile(default_profile_id).keywords
+
+    def get_matcher(self, profile_id: Optional[str], keywords: List[str], default_profile_id: str) -> KeywordMatcher:
+        """Return the compiled matcher for a request, building it only on a cache miss."""
+        if not profile_id and not keywords:
+            profile_id = default_profile_id
+        if profile_id:
+            profile = self.get_profile(profile_id)
+            key = (profile.profile_id, profile.version)
+            keywords = profile.keywords
+        else:
+            key = ("", tuple(keywords))
+
+        with self._lock:
+            matcher = self._matchers.get(key)
+            if matcher is not None:
+                self._matchers.move_to_end(key)
+                return matcher
+
+        matcher = KeywordMatcher(keywords)
+        with self._lock:
+            self._matchers[key] = matcher
+            self._matchers.move_to_end(key)
+            while len(self._matchers) > self.cache_size:
+                self._matchers.popitem(last=False)
+        return matcher
+
+
+# Shared by the analysis and suggestion services
+keyword_profile_service = KeywordProfileService()
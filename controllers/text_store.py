@@ -0,0 +1,77 @@
+"""Content-addressed store of the texts that results were computed from.
+
+Each distinct text is written once to its own table (partition key `text_hash`),
+gzip-compressed into a binary attribute, and result items carry only its hash.
+Texts are read back in bulk and only when a caller asks for them.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+import boto3
+
+logger = logging.getLogger('text_store')
+
+# BatchGetItem limit
+MAX_BATCH_GET = 100
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TextStore:
+    def __init__(self, table_name: str, min_chars: int = None, known_hashes: int = 10000):
+        self.dynamodb = boto3.resource('dynamodb', region_name='us-east-1',
+                                       endpoint_url=os.getenv("DYNAMODB_ENDPOINT_URL") or None)
+        self.table = self.dynamodb.Table(table_name)
+        # Shorter texts stay inline in the result item; the extra read would cost more than it saves
+        self.min_chars = min_chars if min_chars is not None else int(os.getenv("TEXT_STORE_MIN_CHARS", "512"))
+        self.max_known_hashes = known_hashes
+        # Hashes this process already wrote, so re-runs on the same text skip the write
+        self._known: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, text: str) -> str:
+        """Store text if it is not known to be stored yet and return its hash"""
+        key = text_hash(text)
+        with self._lock:
+            if key in self._known:
+                self._known.move_to_end(key)
+                return key
+        data = gzip.compress(text.encode("utf-8"))
+        self.table.put_item(Item={
+            'text_hash': key,
+            'text_data': data,
+            'encoding': 'gzip',
+            'size': len(text),
+        })
+        logger.debug(f"Stored text {key[:12]} ({len(text)} chars, {len(data)} bytes compressed)")
+        with self._lock:
+            self._known[key] = None
+            if len(self._known) > self.max_known_hashes:
+                self._known.popitem(last=False)
+        return key
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, str]:
+        """Fetch and decompress texts by hash; missing hashes are left out"""
+        pending = list(dict.fromkeys(hashes))
+        texts = {}
+        client = self.dynamodb.meta.client
+        while pending:
+            keys = [{'text_hash': key} for key in pending[:MAX_BATCH_GET]]
+            pending = pending[MAX_BATCH_GET:]
+            request = {self.table.name: {'Keys': keys, 'ProjectionExpression': 'text_hash, text_data'}}
+            while request:
+                response = client.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table.name, []):
+                    texts[item['text_hash']] = gzip.decompress(item['text_data'].value).decode("utf-8")
+                request = response.get('UnprocessedKeys') or None
+                if request:
+                    time.sleep(0.05)
+        return texts
@@ -0,0 +1,185 @@
+"""Write-behind persistence of analysis and suggestion results.
+
+Endpoints enqueue results and respond without waiting for DynamoDB. A single
+worker drains the queue into BatchWriteItem calls of up to 25 items, retrying
+unprocessed items and transient errors (throttling, connection errors, a failed
+text store write while serializing) with exponential backoff. A batch DynamoDB
+rejects outright (e.g. a ValidationException caused by one item) is split in
+halves until the offending item is alone, so only that item is dropped. When the queue is full, enqueue
+waits for room, which slows producers down instead of growing memory without
+bound. On shutdown the queue is drained before the worker stops.
+"""
+import asyncio
+import logging
+import os
+import random
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from controllers.db_service import DynamoDBService
+
+logger = logging.getLogger('write_behind_queue')
+
+# BatchWriteItem limit
+MAX_BATCH_SIZE = 25
+
+# Errors that retrying the same request cannot fix
+NON_RETRYABLE_ERROR_CODES = {
+    "ValidationException",
+    "SerializationException",
+    "ResourceNotFoundException",
+    "AccessDeniedException",
+    "UnrecognizedClientException",
+    "ItemCollectionSizeLimitExceededException",
+}
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") not in NON_RETRYABLE_ERROR_CODES
+    # Connection and endpoint errors; anything else (TypeError, ValueError, ...) is a bad item
+    return isinstance(error, BotoCoreError)
+
+
+class WriteBehindQueue:
+    def __init__(self, db_service: DynamoDBService, max_size: int = None, flush_interval: float = None,
+                 max_retries: int = None, base_backoff: float = 0.05):
+        self.db_service = db_service
+        self.max_size = max_size or int(os.getenv("WRITE_QUEUE_MAX_SIZE", "1000"))
+        # How long a partial batch waits for more results before it is written
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            int(os.getenv("WRITE_QUEUE_FLUSH_INTERVAL_MS", "50")) / 1000
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("WRITE_QUEUE_MAX_RETRIES", "5"))
+        self.base_backoff = base_backoff
+        self._queue: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+        self.enqueued = 0
+        self.written = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"Write-behind queue started (max size {self.max_size})")
+
+    async def enqueue(self, result) -> str:
+        """Queue a result model for saving and return its ID; waits while the queue is full."""
+        if self._worker is None:
+            # Not running (e.g. outside the app lifespan): write through
+            return await asyncio.to_thread(self.db_service.save_result, result)
+        await self._queue.put(result)
+        self.enqueued += 1
+        return result.id
+
+    async def drain(self):
+        """Write everything still queued, then stop the worker."""
+        if self._worker is None:
+            return
+        logger.info(f"Draining write-behind queue ({self._queue.qsize()} results pending)")
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        logger.info(f"Write-behind queue stopped: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < MAX_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                try:
+                    if remaining <= 0:
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+            try:
+                await self._write_batch(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.exception(f"Dropping {len(batch)} results after an unexpected error: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _backoff(self, attempt: int):
+        # Exponential backoff with full jitter
+        await asyncio.sleep(random.uniform(0, self.base_backoff * 2 ** (attempt - 1)))
+
+    async def _write_batch(self, results: List[Any]):
+        items = []
+        for result in results:
+            item = await self._serialize(result)
+            if item is not None:
+                items.append(item)
+        if items:
+            self.batches += 1
+            await self._put_items(items)
+
+    async def _serialize(self, result) -> Optional[dict]:
+        """Attribute map of one result; to_item may write to the text store, so transient errors are retried"""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await self._backoff(attempt)
+            try:
+                return await asyncio.to_thread(self.db_service.to_item, result)
+            except Exception as e:
+                error = e
+                if not _is_retryable(e):
+                    break
+                logger.warning(f"Serializing result {result.id} failed ({str(e)}), retrying")
+        self.failed += 1
+        logger.error(f"Dropping result {result.id} that could not be serialized: {str(error)}")
+        return None
+
+    async def _put_items(self, items: List[dict]):
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await self._backoff(attempt)
+                self.retried += len(items)
+            try:
+                unprocessed = await asyncio.to_thread(self.db_service.batch_put_items, items)
+            except Exception as e:
+                if not _is_retryable(e):
+                    await self._isolate(items, e)
+                    return
+                logger.warning(f"BatchWriteItem failed ({str(e)}), {len(items)} items to retry")
+                continue
+            self.written += len(items) - len(unprocessed)
+            if not unprocessed:
+                return
+            items = unprocessed
+        self.failed += len(items)
+        logger.error(f"Giving up on {len(items)} items after {self.max_retries} retries: "
+                     f"{[item.get('id', {}).get('S') for item in items]}")
+
+    async def _isolate(self, items: List[dict], error: Exception):
+        """Write halves of a rejected batch separately until each bad item is alone, then drop it"""
+        if len(items) == 1:
+            self.failed += 1
+            logger.error(f"Dropping item {items[0].get('id', {}).get('S')} rejected by DynamoDB: {str(error)}")
+            return
+        middle = len(items) // 2
+        await self._put_items(items[:middle])
+        await self._put_items(items[middle:])
@@ -1,23 +1,37 @@
 # main.py
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Request, Query, Depends
+from fastapi.routing import APIRoute
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from models import TextPayload, AnalysisResult, AlternateTextSuggestionResult
+from models import TextPayload, AnalysisResult, AlternateTextSuggestionResult, KeywordProfile, BatchAnalysisPayload, FlaggedResultsPage, FlaggedSummaryPage, FlaggedFullPage
 from controllers.ai_service_for_text_analysis import TextAnalyzer
 from controllers.ai_service_for_alternate_text_suggestion import StatementSuggester
 from controllers.db_service import DynamoDBService
-from typing import List, Dict, Any, Optional
+from controllers.write_behind_queue import WriteBehindQueue
+from controllers.keyword_profile_service import keyword_profile_service, UnknownProfileError
+from utils.result_cache import result_cache
+from utils.upstream_client import upstream_client
+from utils.response_cache import response_cache
+from utils.bedrock_clients import bedrock_clients
+from utils import metrics
+from typing import List, Dict, Any, Optional, Literal
 from uuid import uuid4
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 import os
 import httpx
 import time
 import json
 
-from utils.get_api_token import (get_cognito_token,refresh_token,token_cache)
+from utils.get_api_token import (cognito_token_manager,load_api_credentials)
 from utils.azure_sso import (
-    auth_middleware,
+    AuthError,
+    AuthFetchRequired,
+    authenticate_request,
+    load_azure_config,
     init_auth,
     login,
     get_user_info_from_token,
@@ -28,43 +42,21 @@ from utils.azure_sso import (
 
 load_dotenv()
 
-token = get_cognito_token()
-print(f"Cognito Token: {token[:5]}")
-
-# Automatically refresh the token if needed
-if not token or token_cache['expiration'] <= time.time():
-    print("Refreshing token...")
-    token = refresh_token()
-    print(f"Refreshed Cognito Token: {token[:5]}*****")
-
 #get API URLs
 COURSES_API_URL = os.getenv("COURSES_API_URL")
 PROGRAMS_MS_URL = os.getenv("PROGRAMS_MS_URL")
 
-app = FastAPI(title="Educational Text Analysis API")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-text_analyzer = TextAnalyzer()
-statement_suggester = StatementSuggester(request_id=None)
-db_service = DynamoDBService()
-
-# Configure logging based on environment setting
-log_level = os.getenv("LOG_LEVEL", "INFO")
-logging.basicConfig(
-    level=getattr(logging, log_level),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Upper bound on items analyzed at once per /analyze/batch request
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
 
+# Upper bound on how long a request waits for startup initialization before a 503
+INIT_WAIT_TIMEOUT_SECONDS = float(os.getenv("INIT_WAIT_TIMEOUT_SECONDS", "30"))
 
+# Routes served without an Azure token; every other route requires one
 OPEN_PATHS = [
-    "/",
     "/health",
-    "/debug",
+    "/ready",
+    "/metrics",
     "/docs",
     "/openapi.json",
     "/auth/login",
@@ -75,36 +67,230 @@ OPEN_PATHS = [
     "/programs",
     "/program-details",
     "/analyze",
+    "/analyze/batch",
     "/keywordsearch",
     "/conceptsearch",
     "/alternate-text-suggestion",
     "/full-sentence-suggestion",
 ]
 
+# Paths that never wait for initialization
+STARTUP_EXEMPT_PATHS = {"/health", "/ready", "/metrics", "/docs", "/openapi.json", "/redoc"}
+
+# Created by initialize_services() once the app starts, never at import time,
+# so importing main makes no Secrets Manager, Cognito, Bedrock or DynamoDB calls.
+text_analyzer: Optional[TextAnalyzer] = None
+statement_suggester: Optional[StatementSuggester] = None
+db_service: Optional[DynamoDBService] = None
+write_queue: Optional[WriteBehindQueue] = None
+
+services_ready = asyncio.Event()
+init_errors: Dict[str, str] = {}
+init_seconds: Optional[float] = None
+
+# Backoff between background retries of failed startup steps, doubling up to the maximum
+INIT_RETRY_SECONDS = float(os.getenv("INIT_RETRY_SECONDS", "10"))
+INIT_RETRY_MAX_SECONDS = float(os.getenv("INIT_RETRY_MAX_SECONDS", "300"))
+
+# Startup steps; the ones named after a module global above assign it.
+# Secrets, Bedrock clients and the DynamoDB clients have no dependencies on each other.
+INIT_STEPS = {
+    "api_credentials": load_api_credentials,
+    "azure_config": load_azure_config,
+    "text_analyzer": TextAnalyzer,
+    "statement_suggester": lambda: StatementSuggester(request_id=None),
+    "db_service": DynamoDBService,
+}
+
+# Services each route uses; compiled per endpoint so a route whose service failed to start answers 503
+ROUTE_SERVICES = {
+    "/analyze": ("text_analyzer", "write_queue"),
+    "/analyze/batch": ("text_analyzer", "write_queue"),
+    "/keywordsearch": ("text_analyzer", "write_queue"),
+    "/conceptsearch": ("text_analyzer", "write_queue"),
+    "/alternate-text-suggestion": ("statement_suggester", "write_queue"),
+    "/full-sentence-suggestion": ("statement_suggester", "write_queue"),
+    "/results/{source_id}": ("db_service",),
+    "/flagged": ("db_service",),
+    "/result/{request_id}": ("db_service",),
+    "/cache-stats": ("text_analyzer",),
+    "/write-queue-stats": ("write_queue",),
+}
+
+
+async def _init_step(name: str):
+    try:
+        result = await asyncio.to_thread(INIT_STEPS[name])
+    except Exception as e:
+        logging.error(f"Startup step {name} failed: {str(e)}")
+        init_errors[name] = str(e)
+        return
+    # The secret loaders return False when Secrets Manager had nothing for them
+    if result is False:
+        init_errors[name] = "secret not available"
+        return
+    init_errors.pop(name, None)
+    if name in ("text_analyzer", "statement_suggester", "db_service"):
+        globals()[name] = result
+
+
+async def _run_init_steps(names):
+    global write_queue
+    await asyncio.gather(*(_init_step(name) for name in names))
+    if db_service is not None and write_queue is None:
+        write_queue = WriteBehindQueue(db_service)
+        await write_queue.start()
+
+
+async def initialize_services():
+    """Load secrets and build the AWS-backed services in parallel, open the gate, then retry failed steps"""
+    global init_seconds
+    start = time.perf_counter()
+    try:
+        await _run_init_steps(INIT_STEPS)
+        # Fetches the first Cognito token in the background and refreshes it ahead of expiry
+        await cognito_token_manager.start()
+    finally:
+        init_seconds = time.perf_counter() - start
+        logging.info(f"Services initialized in {init_seconds:.2f}s"
+                     + (f" with failures: {', '.join(init_errors)}" if init_errors else ""))
+        services_ready.set()
+
+    # A transient outage at boot heals without a restart; /ready answers 503 until it does
+    delay = INIT_RETRY_SECONDS
+    while init_errors:
+        await asyncio.sleep(delay)
+        logging.info(f"Retrying startup steps: {', '.join(init_errors)}")
+        await _run_init_steps(list(init_errors))
+        delay = min(delay * 2, INIT_RETRY_MAX_SECONDS)
+
+
+# Endpoints compiled from OPEN_PATHS / STARTUP_EXEMPT_PATHS by compile_route_policy() at startup,
+# so the per-request check is a set lookup on the matched route instead of a scan of the path list
+public_endpoints: frozenset = frozenset()
+startup_exempt_endpoints: frozenset = frozenset()
+endpoint_services: Dict[Any, tuple] = {}
+
+
+def compile_route_policy():
+    global public_endpoints, startup_exempt_endpoints, endpoint_services
+    # /docs, /openapi.json and /redoc are plain routes without app dependencies, so always open
+    unknown = (set(OPEN_PATHS) | set(ROUTE_SERVICES)) - {route.path for route in app.routes}
+    if unknown:
+        logging.warning(f"OPEN_PATHS / ROUTE_SERVICES entries without a route: {sorted(unknown)}")
+    api_routes = [route for route in app.routes if isinstance(route, APIRoute)]
+    public_endpoints = frozenset(route.endpoint for route in api_routes if route.path in OPEN_PATHS)
+    startup_exempt_endpoints = frozenset(route.endpoint for route in api_routes if route.path in STARTUP_EXEMPT_PATHS)
+    endpoint_services = {route.endpoint: ROUTE_SERVICES[route.path] for route in api_routes if route.path in ROUTE_SERVICES}
+    logging.info(f"Route policy: {len(public_endpoints)} open, {len(api_routes) - len(public_endpoints)} authenticated")
+
+
+async def route_policy(request: Request):
+    """App-wide dependency: waits for startup initialization, requires a token on non-open routes,
+    and answers 503 when a service the route needs failed to initialize"""
+    endpoint = request.scope.get("endpoint")
+    if endpoint not in startup_exempt_endpoints and not services_ready.is_set():
+        try:
+            await asyncio.wait_for(services_ready.wait(), INIT_WAIT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Service is starting up", headers={"Retry-After": "5"})
+    if endpoint not in public_endpoints:
+        try:
+            authenticate_request(request, fetch=False)
+        except AuthFetchRequired:
+            # Secrets Manager and JWKS fetches block, so cache misses are checked off the event loop
+            await asyncio.to_thread(authenticate_request, request)
+    missing = [name for name in endpoint_services.get(endpoint, ()) if globals()[name] is None]
+    if missing:
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {', '.join(missing)}",
+                            headers={"Retry-After": str(max(1, int(INIT_RETRY_SECONDS)))})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    compile_route_policy()
+    # ChatBedrock.ainvoke runs the boto3 call in the loop's default executor;
+    # size it so one worker can keep dozens of LLM calls in flight.
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=int(os.getenv("LLM_THREAD_POOL_SIZE", "64"))))
+    # Not awaited: the app starts serving /health while the services come up
+    init_task = asyncio.create_task(initialize_services())
+    try:
+        yield
+    finally:
+        if not init_task.done():
+            init_task.cancel()
+            try:
+                await init_task
+            except asyncio.CancelledError:
+                pass
+        if write_queue is not None:
+            await write_queue.drain()
+        await cognito_token_manager.stop()
+        await upstream_client.close()
+
+
+app = FastAPI(title="Educational Text Analysis API", lifespan=lifespan, dependencies=[Depends(route_policy)])
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+# Outermost, so request latency includes auth, CORS and error handling
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Scrape-time gauges for backlogs the services already count
+metrics.Gauge("write_queue_pending", "Results waiting in the write-behind queue",
+              collect=lambda: {(): write_queue.stats()["pending"] if write_queue is not None else 0})
+metrics.Gauge("coalesced_calls_in_flight", "Shared in-flight calls that concurrent requests are joining", ("name",),
+              collect=lambda: {
+                  ("upstream",): response_cache.inflight.stats()["in_flight"],
+                  ("llm-analysis",): text_analyzer.inflight.stats()["in_flight"] if text_analyzer is not None else 0,
+              })
+
+# Configure logging based on environment setting
+log_level = os.getenv("LOG_LEVEL", "INFO")
+logging.basicConfig(
+    level=getattr(logging, log_level),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
 
-@app.middleware("http")
-async def sso_middleware(request: Request, call_next):
-    path = request.url.path
-    logging.info(f"Request path: {path}")
+@app.exception_handler(AuthError)
+async def auth_error_handler(request: Request, exc: AuthError):
+    headers = {"Retry-After": "30"} if exc.status_code == 503 else None
+    return JSONResponse(status_code=exc.status_code, content={"message": str(exc)}, headers=headers)
 
-    for open_path in OPEN_PATHS:
-        if "{" in open_path:
-            pattern = open_path.replace("{course_code:path}", ".*")
-            import re
-            if re.match(f"^{pattern}$", path):
-                logging.info(f"Path {path} matches open path pattern {open_path}")
-                break
-        elif path == open_path or path.startswith(open_path + "/"):
-            logging.info(f"Path {path} matches open path {open_path}")
-            break
-    else:
-        logging.warning(f"Path {path} does not match any open path")
+@app.exception_handler(UnknownProfileError)
+async def unknown_profile_handler(request: Request, exc: UnknownProfileError):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+def _init_status() -> dict:
+    return {
+        "ready": services_ready.is_set() and not init_errors,
+        "initializing": not services_ready.is_set(),
+        "init_errors": init_errors,
+        "init_seconds": round(init_seconds, 3) if init_seconds is not None else None,
+    }
 
-    return await auth_middleware(request, call_next, OPEN_PATHS)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "We up"}
+    # Liveness: answers 200 as soon as the process is up. Failed startup steps are retried in the
+    # background and heal without a restart, so they show up as "Degraded" here and on /ready only.
+    return {"status": "We up" if not init_errors else "Degraded", **_init_status()}
+
+
+@app.get("/ready")
+async def readiness_check():
+    # Readiness: 503 while services are initializing or a failed step is still being retried
+    status = _init_status()
+    if status["ready"]:
+        return status
+    return JSONResponse(status_code=503, content=status,
+                        headers={"Retry-After": str(max(1, int(INIT_RETRY_SECONDS)))})
 
 @app.post("/analyze", response_model=AnalysisResult)
 async def analyze_text(payload: TextPayload):
@@ -115,17 +301,68 @@ async def analyze_text(payload: TextPayload):
     request_id = str(uuid4())
 
     # Perform analysis
-    result = text_analyzer.analyze_text(payload, request_id)
+    result = await text_analyzer.analyze_text(payload, request_id)
 
     # Save to database
-    db_service.save_result(result)
+    await write_queue.enqueue(result)
 
     return result
 
+@app.post("/analyze/batch")
+async def analyze_batch(payload: BatchAnalysisPayload):
+    """
+    Analyze many texts with bounded concurrency, streaming each result as an NDJSON line as soon
+    as it is ready (completion order, tagged with the item's index) and saving results in bulk
+    """
+    concurrency = min(payload.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze_item(index: int, item: TextPayload):
+        async with semaphore:
+            request_id = str(uuid4())
+            try:
+                if payload.mode == "lexical":
+                    result = await asyncio.to_thread(text_analyzer.analyze_text_lexical, item, request_id)
+                elif payload.mode == "semantic":
+                    result = await text_analyzer.analyze_text_semantic(item, request_id)
+                else:
+                    result = await text_analyzer.analyze_text(item, request_id)
+                return index, result, None
+            except Exception as e:
+                logging.exception(f"Error analyzing batch item {index}: {str(e)}")
+                return index, None, str(e)
+
+    async def stream_results():
+        tasks = [asyncio.create_task(analyze_item(index, item)) for index, item in enumerate(payload.items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result, error = await next_done
+                if error is not None:
+                    yield json.dumps({"index": index, "source_id": payload.items[index].source_id, "error": error}) + "\n"
+                    continue
+                await write_queue.enqueue(result)
+                yield json.dumps({"index": index, "result": result.model_dump(mode="json")}) + "\n"
+        finally:
+            # Client went away: stop the analyses that have not finished
+            for task in tasks:
+                task.cancel()
+
+    logging.info(f"Batch analysis of {len(payload.items)} items, mode {payload.mode}, concurrency {concurrency}")
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _wants_stream(request: Request, body: dict) -> bool:
+    value = request.query_params.get("stream", body.get("stream", False))
+    return value in (True, "true", "1", "yes")
+
 @app.post("/alternate-text-suggestion", response_model=AlternateTextSuggestionResult)
 async def alt_text_suggestions(request: Request):
     """
-    Suggest alternate text for a given sentence based on keywords/phrases
+    Suggest alternate text for a given sentence based on keywords/phrases.
+    With ?stream=true (or "stream": true) the response is a text/event-stream: one "suggestion"
+    event per suggestion as soon as the model has finished it, then "done" with the full result.
     """
     try:
         body_bytes = await request.body()
@@ -135,10 +372,32 @@ async def alt_text_suggestions(request: Request):
         from models import SuggestionPayload
         payload = SuggestionPayload(**body)
         request_id = str(uuid4())
-        result = statement_suggester.analyze_suggestions(payload, request_id)
-        db_service.save_result(result)
+
+        if _wants_stream(request, body):
+            async def stream_events():
+                events = statement_suggester.stream_suggestions(payload, request_id)
+                try:
+                    async for event, data in events:
+                        if event == "suggestion":
+                            yield _sse("suggestion", data.model_dump(mode="json"))
+                        else:
+                            await write_queue.enqueue(data)
+                            yield _sse("done", data.model_dump(mode="json"))
+                except Exception as e:
+                    logging.exception(f"Error in streamed alternate text suggestion: {str(e)}")
+                    yield _sse("error", {"detail": f"Processing error: {str(e)}"})
+                finally:
+                    # Client went away before "done": stop the model stream; nothing is saved
+                    await events.aclose()
+
+            return StreamingResponse(stream_events(), media_type="text/event-stream")
+
+        result = await statement_suggester.analyze_suggestions(payload, request_id)
+        await write_queue.enqueue(result)
 
         return result
+    except UnknownProfileError:
+        raise
     except Exception as e:
         logging.exception(f"Error in alternate text suggestion: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
@@ -146,7 +405,9 @@ async def alt_text_suggestions(request: Request):
 @app.post("/full-sentence-suggestion")
 async def full_sentence_suggestion(request: Request):
     """
-    Generate complete alternative sentences or texts that replace problematic terms
+    Generate complete alternative sentences or texts that replace problematic terms.
+    With ?stream=true (or "stream": true) the response is a text/event-stream: one "alternative"
+    event per alternative text as soon as it is complete, then "done" with the usual response.
     """
     try:
         body_bytes = await request.body()
@@ -156,17 +417,36 @@ async def full_sentence_suggestion(request: Request):
 
         logging.info(f"Full text suggestion request: {request_id}")
 
-        result = statement_suggester.process_full_text_suggestion(body, request_id)
+        if _wants_stream(request, body):
+            async def stream_events():
+                events = statement_suggester.stream_full_text_suggestion(body, request_id)
+                try:
+                    async for event, data in events:
+                        if event == "alternative":
+                            yield _sse("alternative", data)
+                        else:
+                            await write_queue.enqueue(data["db_result"])
+                            yield _sse("done", data["api_response"])
+                except Exception as e:
+                    logging.exception(f"Error in streamed full sentence suggestion: {str(e)}")
+                    yield _sse("error", {"detail": f"Processing error: {str(e)}"})
+                finally:
+                    # Client went away before "done": stop the model stream; nothing is saved
+                    await events.aclose()
+
+            return StreamingResponse(stream_events(), media_type="text/event-stream")
+
+        result = await statement_suggester.process_full_text_suggestion(body, request_id)
 
         if result and "db_result" in result:
-            db_service.save_result(result["db_result"])
+            await write_queue.enqueue(result["db_result"])
 
         if result and "api_response" in result:
             return result["api_response"]
         else:
             return result
 
-    except HTTPException:
+    except (HTTPException, UnknownProfileError):
         raise
     except Exception as e:
         logging.exception(f"Error in full sentence suggestion: {str(e)}")
@@ -180,11 +460,11 @@ async def analyze_text_by_keywords(payload: TextPayload):
     # Generate unique request ID
     request_id = str(uuid4())
 
-    # Perform analysis
-    result = text_analyzer.analyze_text_lexical(payload, request_id)
+    # Perform analysis; matching is CPU-bound, so it runs off the event loop
+    result = await asyncio.to_thread(text_analyzer.analyze_text_lexical, payload, request_id)
 
     # Save to database
-    db_service.save_result(result)
+    await write_queue.enqueue(result)
 
     return result
 
@@ -197,44 +477,90 @@ async def analyze_text_by_concept(payload: TextPayload):
     request_id = str(uuid4())
 
     # Perform analysis
-    result = text_analyzer.analyze_text_semantic(payload, request_id)
+    result = await text_analyzer.analyze_text_semantic(payload, request_id)
 
     # Save to database
-    db_service.save_result(result)
+    await write_queue.enqueue(result)
 
     return result
 
 
 @app.get("/results/{source_id}", response_model=List[AnalysisResult])
-async def get_results(source_id: str):
+async def get_results(source_id: str, include_text: bool = False):
     """
-    Get analysis results for a specific source ID
+    Get analysis results for a specific source ID; include_text also loads original
+    texts kept in the text store (otherwise only their original_text_ref hash is set)
     """
-    results = db_service.get_results_by_source_id(source_id)
+    results = db_service.get_results_by_source_id(source_id, include_text)
     if not results:
         raise HTTPException(status_code=404, detail=f"No results found for source_id: {source_id}")
     return results
 
 
-@app.get("/flagged", response_model=List[AnalysisResult])
-async def get_flagged_results(limit: int = 100):
+@app.get("/flagged", response_model=FlaggedResultsPage)
+async def get_flagged_results(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+                              order: Literal["desc", "asc"] = "desc", view: Literal["summary", "full"] = "summary",
+                              include_text: bool = False):
     """
-    Get results that contain flagged content
+    Get one page of results that contain flagged content, newest first by default.
+    The summary view leaves out original_text and the highlighted sections; pass
+    next_cursor back as cursor to fetch the following page. include_text loads the
+    original texts of the full view from the text store.
     """
-    return db_service.get_flagged_results(limit)
+    try:
+        items, next_cursor = await asyncio.to_thread(
+            db_service.get_flagged_results, limit, cursor, order == "desc", view == "summary", include_text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page = FlaggedSummaryPage if view == "summary" else FlaggedFullPage
+    return page(items=items, next_cursor=next_cursor)
 
 
 @app.get("/result/{request_id}", response_model=AnalysisResult)
-async def get_result_by_request_id(request_id: str):
+async def get_result_by_request_id(request_id: str, include_text: bool = False):
     """
-    Get analysis result by unique request ID
+    Get analysis result by unique request ID; include_text also loads an original text
+    kept in the text store
     """
-    result = db_service.get_result_by_request_id(request_id)
+    result = db_service.get_result_by_request_id(request_id, include_text)
     if not result:
         raise HTTPException(status_code=404, detail=f"No result found for request_id: {request_id}")
     return result
 
 
+@app.get("/keyword-profiles", response_model=List[KeywordProfile])
+async def get_keyword_profiles():
+    """
+    List the server-side keyword profiles usable via profile_id
+    """
+    return keyword_profile_service.list_profiles()
+
+
+@app.get("/keyword-profiles/{profile_id}", response_model=KeywordProfile)
+async def get_keyword_profile(profile_id: str):
+    """
+    Get a single keyword profile by ID
+    """
+    return keyword_profile_service.get_profile(profile_id)
+
+
+@app.get("/cache-stats")
+async def get_cache_stats():
+    """
+    Hit/miss counters of the semantic analysis result cache, LLM calls shared by identical concurrent analyses,
+    and chunks the /conceptsearch relevance prefilter kept from the LLM
+    """
+    return {**result_cache.stats(), "inflight": text_analyzer.inflight.stats(),
+            "prefilter": {"default_threshold": text_analyzer.prefilter_threshold, **text_analyzer.prefilter_stats}}
+
+@app.get("/write-queue-stats")
+async def get_write_queue_stats():
+    """
+    Backlog and counters of the write-behind result queue
+    """
+    return write_queue.stats()
+
+
 @app.get("/auth/init")
 async def auth_init():
     return await init_auth()
@@ -266,160 +592,108 @@ async def get_current_user(request: Request):
     return user_info
 
 
-@app.get("/templates")
-async def get_templates():
+async def _fetch_upstream(name: str, url: str, api_label: str, fetch_label: str, extra_headers: Dict[str, str] = None):
+    """
+    GET a Courses API / Programs MS URL with the Cognito token through the shared client pool;
+    answers other than 200 (or 304 to a conditional request) and connection errors become HTTPExceptions
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            token = get_cognito_token()
-            print(f"At getTemplates(), Cognito Token: {token[:5]}")
-            # if not token:
-            #     raise HTTPException(status_code=500, detail="API token not configured")
-            if not token or token_cache['expiration'] <= time.time():
-                print("Refreshing token...")
-                token = refresh_token()
-                print(f"Refreshed Cognito Token: {token[:5]}*****")
-                
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            }
-            url = f"{COURSES_API_URL}/templates"
-
-            response = await client.get(
-                url,
-                headers=headers
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Error from external API: {response.text}"
-                )
-                
-            return response.json()
-    except httpx.RequestError as e:
-        logging.error(f"Error making request to external API: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error fetching templates: {str(e)}")
+        token = await cognito_token_manager.get_token()
+        if not token:
+            raise HTTPException(status_code=503, detail="Upstream API token unavailable")
 
-
-@app.get("/course-details")
-async def get_course_details_query(courseCode: str):
-    try:
-        token = get_cognito_token()
-        print(f"At get_course_details_query(), Cognito Token: {token[:5]}")
-
-        # if not token:
-        #     raise HTTPException(status_code=500, detail="API token not configured")
-        if not token or token_cache['expiration'] <= time.time():
-            print("Refreshing token...")
-            token = refresh_token()
-            print(f"Refreshed Cognito Token: {token[:5]}*****")
-            
         headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
-            "Accept": "application/json"
+            "Accept": "application/json",
+            **(extra_headers or {})
         }
-        
-        url = f"{COURSES_API_URL}/templates/curriculum?courseCode={courseCode}"
-        print(f"URL: {url}")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Error from external API: {response.text}"
-                )
-                
-            return response.json()
+
+        logging.info(f"Making request to {api_label} for {name}: {url}")
+        response = await upstream_client.get(name, url, headers=headers)
+
+        logging.info(f"{api_label} response status: {response.status_code}")
+        if response.status_code == 304 and extra_headers:
+            return response
+        if response.status_code != 200:
+            logging.error(f"{api_label} error response: {response.text}")
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Error from {api_label}: {response.text}"
+            )
+
+        return response
     except httpx.RequestError as e:
-        logging.error(f"Error making request to external API: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error fetching course details: {str(e)}")
+        logging.error(f"Error making request to {api_label}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching {fetch_label}: {str(e)}")
+
+
+async def _upstream_get(request: Request, name: str, url: str, api_label: str, fetch_label: str) -> Response:
+    """
+    Serve an upstream JSON response from the proxy response cache, fetching or revalidating it
+    as needed; clients can revalidate with If-None-Match against the returned ETag
+    """
+    entry = await response_cache.get_or_fetch(
+        name, url, lambda headers: _fetch_upstream(name, url, api_label, fetch_label, headers))
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(content=entry.content, media_type="application/json", headers={"ETag": entry.etag})
+
+
+@app.get("/templates")
+async def get_templates(request: Request):
+    return await _upstream_get(request, "templates", f"{COURSES_API_URL}/templates", "external API", "templates")
+
+
+@app.get("/course-details")
+async def get_course_details_query(request: Request, courseCode: str):
+    return await _upstream_get(request, "course-details",
+                               f"{COURSES_API_URL}/templates/curriculum?courseCode={courseCode}",
+                               "external API", "course details")
 
 
 @app.get("/programs")
-async def get_programs():
-    try:
-        token = get_cognito_token()
-        print(f"At get_programs(), Cognito Token: {token[:5]}")
-        # if not token:
-        #     raise HTTPException(status_code=500, detail="API token not configured")
-        
-        if not token or token_cache['expiration'] <= time.time():
-            print("Refreshing token...")
-            token = refresh_token()
-            print(f"Refreshed Cognito Token: {token[:5]}*****")
-            
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        
-        logging.info(f"Making request to Programs MS with token: {token[:5]}...")
-        
-        async with httpx.AsyncClient() as client:
-            url=f"{PROGRAMS_MS_URL}/programs/getAll"
-            response = await client.get(url,
-                headers=headers
-            )
-            
-            logging.info(f"Programs MS response status: {response.status_code}")
-            if response.status_code != 200:
-                logging.error(f"PPrograms MS error response: {response.text}")
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Error from Programs MS: {response.text}"
-                )
-                
-            return response.json()
-    except httpx.RequestError as e:
-        logging.error(f"Error making request to Programs MS: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error fetching programs: {str(e)}")
+async def get_programs(request: Request):
+    return await _upstream_get(request, "programs", f"{PROGRAMS_MS_URL}/programs/getAll", "Programs MS", "programs")
 
 @app.get("/program-details")
-async def get_programs_by_programId(programId: str):
-    try:
-        token = get_cognito_token()
-        print(f"At get_programs_by_programId(), Cognito Token: {token[:5]}")
-        # if not token:
-        #     raise HTTPException(status_code=500, detail="API token not configured")
-        
-        # if not token.startswith("Bearer "):
-        #     token = f"Bearer {token}"
-        if not token or token_cache['expiration'] <= time.time():
-            print("Refreshing token...")
-            token = refresh_token()
-            print(f"Refreshed Cognito Token: {token[:5]}*****")
-            
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        
-        logging.info(f"Making request to Programs MS with token: {token[:5]}...")
-        
-        async with httpx.AsyncClient() as client:
-            url = f"{PROGRAMS_MS_URL}/templates?$filter=programId eq {programId}"
-            response = await client.get(url,
-                headers=headers
-            )
-            
-            logging.info(f"Programs MS response status: {response.status_code}")
-            if response.status_code != 200:
-                logging.error(f"Programs MS error response: {response.text}")
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Error from Programs MS: {response.text}"
-                )
-                
-            return response.json()
-    except httpx.RequestError as e:
-        logging.error(f"Error making request to Programs MS: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error fetching programs: {str(e)}")
+async def get_programs_by_programId(request: Request, programId: str):
+    return await _upstream_get(request, "program-details",
+                               f"{PROGRAMS_MS_URL}/templates?$filter=programId eq {programId}",
+                               "Programs MS", "programs")
+
+
+@app.get("/proxy-cache-stats")
+async def get_proxy_cache_stats():
+    """
+    Hit rate, size and revalidation counters of the proxy route response cache
+    """
+    return response_cache.stats()
+
+
+@app.get("/upstream-stats")
+async def get_upstream_stats():
+    """
+    Call counts, errors and latency of the Courses API / Programs MS proxy routes
+    """
+    return upstream_client.stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Route, Bedrock, DynamoDB and upstream latency histograms, counters and in-flight gauges
+    in the Prometheus text format (per worker process)
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/bedrock-stats")
+async def get_bedrock_stats():
+    """
+    Pool settings and per-model in-flight calls, peak concurrency and latency of the Bedrock clients
+    """
+    return bedrock_clients.stats()
 
 
 if __name__ == "__main__":
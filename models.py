@@ -1,17 +1,43 @@
-from typing import Dict, List, Optional, Any, Union
+from typing import Annotated, Dict, List, Optional, Any, Union, Literal
 from pydantic import BaseModel, Field
 from datetime import datetime
 from uuid import uuid4
+from utils.json_stream import JsonArrayStreamer, salvage_json, continue_truncated_json
+from utils.metrics import LLM_PARSE_FAILURES
+import logging
+import json
 
 
 class TextPayload(BaseModel):
     source_id: str
     content_type: str = Field(..., description="Type of content (e.g., course, program, assignment)")
     text: str
-    keywords: List[str] = Field(default_factory=list, description="Keywords or phrases to search for")
+    keywords: List[str] = Field(default_factory=list, description="Keywords or phrases to search for; /keywordsearch also accepts \"whole word\" and prefix* patterns")
+    profile_id: Optional[str] = Field(None, description="Server-side keyword profile to use instead of keywords")
+    use_index: bool = Field(False, description="Reuse a cached token index of this text for repeated /keywordsearch queries")
+    output_mode: Literal["sections", "columnar", "aggregate"] = Field(
+        "sections", description="/keywordsearch match format: highlighted sections, parallel arrays, or per-keyword counts only")
+    bypass_cache: bool = Field(False, description="Skip the semantic result cache lookup and re-run the LLM analysis")
+    prefilter_threshold: Optional[float] = Field(
+        None, description="/conceptsearch on documents of several chunks: minimum local relevance score for a chunk "
+                          "to reach the LLM; 0 disables, unset uses the server default (off unless configured)")
     metadata: Optional[Dict[str, Any]] = {}
 
 
+class BatchAnalysisPayload(BaseModel):
+    items: List[TextPayload]
+    mode: Literal["hybrid", "lexical", "semantic"] = Field(
+        "hybrid", description="Analysis to run per item: /analyze, /keywordsearch or /conceptsearch")
+    max_concurrency: Optional[int] = Field(None, ge=1, description="Items analyzed at once; capped by the server limit")
+
+
+class KeywordProfile(BaseModel):
+    profile_id: str
+    version: int = 1
+    description: str = ""
+    keywords: List[str]
+
+
 class HighlightedSection(BaseModel):
     start_index: int
     end_index: int
@@ -20,18 +46,69 @@ class HighlightedSection(BaseModel):
     confidence: float
 
 
+class ColumnarMatches(BaseModel):
+    # Parallel arrays; keyword_ids index into AnalysisResult.keywords_searched
+    start_indexes: List[int] = []
+    end_indexes: List[int] = []
+    keyword_ids: List[int] = []
+
+
+class KeywordMatchCount(BaseModel):
+    keyword: str
+    count: int
+    first_index: int
+
+
+class SkippedRange(BaseModel):
+    # Part of the text the relevance prefilter kept from the LLM, with its local score
+    start_index: int
+    end_index: int
+    score: float
+
+
 class AnalysisResult(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid4()))
     request_id: str
     source_id: str
     content_type: str
-    original_text: str
+    # None when read back without include_text and the text lives in the text store
+    original_text: Optional[str] = None
+    original_text_ref: Optional[str] = None
     keywords_searched: List[str] = []
     highlighted_sections: List[HighlightedSection] = []
     has_flags: str = "false"
     metadata: Dict[str, Any] = {}
     created_at: datetime = Field(default_factory=datetime.utcnow)
     keywords_matched: List[str] = []
+    output_mode: str = "sections"
+    columnar_matches: Optional[ColumnarMatches] = None
+    keyword_counts: Optional[List[KeywordMatchCount]] = None
+    # Set when the relevance prefilter skipped chunks: no sections there means "not analyzed", not "no matches"
+    skipped_ranges: Optional[List[SkippedRange]] = None
+
+class FlaggedResultSummary(BaseModel):
+    id: str
+    request_id: str
+    source_id: str
+    content_type: str
+    has_flags: str = "true"
+    created_at: datetime
+    keywords_matched: List[str] = []
+    metadata: Dict[str, Any] = {}
+
+class FlaggedSummaryPage(BaseModel):
+    view: Literal["summary"] = "summary"
+    items: List[FlaggedResultSummary] = []
+    # Opaque; pass back as `cursor` to get the next page, null on the last page
+    next_cursor: Optional[str] = None
+
+class FlaggedFullPage(BaseModel):
+    view: Literal["full"] = "full"
+    items: List[AnalysisResult] = []
+    next_cursor: Optional[str] = None
+
+# /flagged response; `view` says which item model the page holds
+FlaggedResultsPage = Annotated[Union[FlaggedSummaryPage, FlaggedFullPage], Field(discriminator="view")]
 
 class AlternativeSuggestion(BaseModel):
     problematicPhrase: str
@@ -45,6 +122,7 @@ class SuggestionPayload(BaseModel):
     content_type: str = Field(..., description="Type of content (e.g., course, program, assignment)")
     sentence: str
     keywords: List[str] = Field(default_factory=list, description="Keywords or phrases to search for")
+    profile_id: Optional[str] = Field(None, description="Server-side keyword profile to use instead of keywords")
     metadata: Optional[Dict[str, Any]] = {}
 
 class AlternateTextSuggestionResult(BaseModel):
@@ -52,7 +130,8 @@ class AlternateTextSuggestionResult(BaseModel):
     request_id: str
     source_id: str
     content_type: str
-    original_sentence: str
+    original_sentence: Optional[str] = None
+    original_sentence_ref: Optional[str] = None
     keywords_searched: List[str] = []
     alternative_suggestions: List[AlternativeSuggestion] = []
     metadata: Dict[str, Any] = {}
@@ -74,17 +153,10 @@ def analyze_suggestions(payload: SuggestionPayload, request_id: str, text_conten
         )
         return result
 
-def analyze_full_text_suggestions(payload: Dict[str, Any], request_id: str, llm, text_to_process: str, keywords: List[str], custom_prompt: str = "", mode: str = "full_text") -> dict:
+def build_full_text_prompt(text_to_process: str, keywords: List[str], custom_prompt: str = "", mode: str = "full_text") -> str:
         """
-        Process a full text suggestion request and return formatted results
+        Build the LLM prompt for a full text suggestion request
         """
-        import logging
-        import json
-        from datetime import datetime
-        from uuid import uuid4
-
-        logging.info(f"Processing full text suggestion request: {request_id}")
-
         keywords_str = ", ".join(keywords)
 
         if not custom_prompt:
@@ -130,17 +202,15 @@ def analyze_full_text_suggestions(payload: Dict[str, Any], request_id: str, llm,
                 """
 
         logging.info(f"Final prompt to be sent to LLM: {custom_prompt[:200]}...")
+        return custom_prompt
 
-        logging.info(f"Calling LLM for full text suggestions")
-        try:
-            response = llm.invoke(custom_prompt)
-            response_text = response.content
-            logging.info("Received response from LLM")
-            logging.debug(f"Raw response (first 200 chars): {response_text[:200]}")
-        except Exception as e:
-            logging.error(f"Error calling LLM: {str(e)}", exc_info=True)
-            raise e
+# A bare JSON array of alternatives, or {"alternatives": [...]}
+FULL_TEXT_SALVAGE_KEYS = (None, "alternatives")
 
+def parse_full_text_alternatives(response_text: str, model_id: str = "unknown") -> List[Any]:
+        """
+        Extract the list of alternative texts from the LLM response
+        """
         alternatives = []
         try:
             json_str = response_text.strip()
@@ -169,7 +239,13 @@ def analyze_full_text_suggestions(payload: Dict[str, Any], request_id: str, llm,
                     logging.warning(f"Unexpected response structure from AI")
                     alternatives = [json_str]
             except json.JSONDecodeError:
+                salvaged = salvage_json(response_text, FULL_TEXT_SALVAGE_KEYS)
+                if salvaged.data:
+                    logging.warning("Response JSON was incomplete, keeping the complete alternatives")
+                    return salvaged.data.get(None) or salvaged.data.get("alternatives")
+
                 logging.warning("Failed to parse response as JSON, looking for text alternatives")
+                LLM_PARSE_FAILURES.inc(model_id, "full_text")
                 text_parts = response_text.split("\n\n")
                 for part in text_parts:
                     if (part.strip().startswith("1.") or
@@ -182,11 +258,18 @@ def analyze_full_text_suggestions(payload: Dict[str, Any], request_id: str, llm,
                     alternatives = [response_text]
         except Exception as e:
             logging.error(f"Error parsing AI response: {str(e)}", exc_info=True)
+            LLM_PARSE_FAILURES.inc(model_id, "full_text")
             alternatives = [response_text]
 
         if not alternatives:
             alternatives = ["The AI was unable to generate a suitable alternative. Please try with different keywords or a more specific prompt."]
 
+        return alternatives
+
+def build_full_text_result(payload: Dict[str, Any], request_id: str, text_to_process: str, keywords: List[str], alternatives: List[Any]) -> dict:
+        """
+        Build the database record and API response for generated full text alternatives
+        """
         result_data = {
             "alternative_suggestions": [{
                 "problematicPhrase": "full text",
@@ -226,4 +309,49 @@ def analyze_full_text_suggestions(payload: Dict[str, Any], request_id: str, llm,
         return {
             "db_result": result,
             "api_response": api_response
-        }
\ No newline at end of file
+        }
+
+async def analyze_full_text_suggestions(payload: Dict[str, Any], request_id: str, llm, text_to_process: str, keywords: List[str], custom_prompt: str = "", mode: str = "full_text") -> dict:
+        """
+        Process a full text suggestion request and return formatted results
+        """
+        logging.info(f"Processing full text suggestion request: {request_id}")
+
+        custom_prompt = build_full_text_prompt(text_to_process, keywords, custom_prompt, mode)
+
+        logging.info(f"Calling LLM for full text suggestions")
+        try:
+            response = await llm.ainvoke(custom_prompt)
+            response_text = await continue_truncated_json(llm, custom_prompt, response, FULL_TEXT_SALVAGE_KEYS)
+            logging.info("Received response from LLM")
+            logging.debug(f"Raw response (first 200 chars): {response_text[:200]}")
+        except Exception as e:
+            logging.error(f"Error calling LLM: {str(e)}", exc_info=True)
+            raise e
+
+        alternatives = parse_full_text_alternatives(response_text, getattr(llm, "model_id", "unknown"))
+        return build_full_text_result(payload, request_id, text_to_process, keywords, alternatives)
+
+async def stream_full_text_suggestions(payload: Dict[str, Any], request_id: str, llm, text_to_process: str, keywords: List[str], custom_prompt: str = "", mode: str = "full_text"):
+        """
+        Stream a full text suggestion request: yields ("alternative", text) as soon as each
+        alternative is complete, then ("result", {...}) parsed from the whole response
+        """
+        logging.info(f"Streaming full text suggestion request: {request_id}")
+
+        custom_prompt = build_full_text_prompt(text_to_process, keywords, custom_prompt, mode)
+
+        streamer = JsonArrayStreamer()
+        chunks = []
+        try:
+            async for chunk in llm.astream(custom_prompt):
+                text = chunk.content if isinstance(chunk.content, str) else ""
+                chunks.append(text)
+                for alternative in streamer.feed(text):
+                    yield "alternative", alternative
+        except Exception as e:
+            logging.error(f"Error streaming from LLM: {str(e)}", exc_info=True)
+            raise e
+
+        alternatives = parse_full_text_alternatives("".join(chunks), getattr(llm, "model_id", "unknown"))
+        yield "result", build_full_text_result(payload, request_id, text_to_process, keywords, alternatives)
@@ -0,0 +1,112 @@
+"""/analyze/batch: NDJSON lines in completion order, bounded concurrency, per-item errors."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+from models import AnalysisResult
+
+pytestmark = pytest.mark.anyio
+
+
+class StubAnalyzer:
+    """Each item sleeps for metadata["seconds"]; items whose text is "fail" raise"""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.calls = {"hybrid": 0, "lexical": 0, "semantic": 0}
+
+    async def _analyze(self, item, request_id):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(item.metadata.get("seconds", 0))
+            if item.text == "fail":
+                raise RuntimeError("model unavailable")
+            return AnalysisResult(request_id=request_id, source_id=item.source_id, content_type=item.content_type)
+        finally:
+            self.running -= 1
+
+    async def analyze_text(self, item, request_id):
+        self.calls["hybrid"] += 1
+        return await self._analyze(item, request_id)
+
+    async def analyze_text_semantic(self, item, request_id):
+        self.calls["semantic"] += 1
+        return await self._analyze(item, request_id)
+
+    def analyze_text_lexical(self, item, request_id):
+        self.calls["lexical"] += 1
+        return AnalysisResult(request_id=request_id, source_id=item.source_id, content_type=item.content_type)
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.results = []
+
+    async def enqueue(self, result):
+        self.results.append(result)
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    monkeypatch.setattr(main, "text_analyzer", StubAnalyzer())
+    monkeypatch.setattr(main, "write_queue", RecordingQueue())
+    main.compile_route_policy()
+    main.services_ready.set()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+    main.services_ready.clear()
+
+
+def item(source_id, seconds=0.0, text="Some text on equity."):
+    return {"source_id": source_id, "content_type": "course", "text": text, "metadata": {"seconds": seconds}}
+
+
+async def post_batch(client, **body):
+    response = await client.post("/analyze/batch", json=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_lines_arrive_in_completion_order(client):
+    lines = await post_batch(client, items=[item("slow", 0.3), item("fast", 0.0), item("medium", 0.15)])
+
+    assert [line["index"] for line in lines] == [1, 2, 0]
+    assert [line["result"]["source_id"] for line in lines] == ["fast", "medium", "slow"]
+    assert [result.source_id for result in main.write_queue.results] == ["fast", "medium", "slow"]
+
+
+async def test_concurrency_is_capped(client, monkeypatch):
+    monkeypatch.setattr(main, "BATCH_MAX_CONCURRENCY", 3)
+    lines = await post_batch(client, items=[item(f"source-{n}", 0.05) for n in range(10)])
+    assert len(lines) == 10
+    assert main.text_analyzer.max_running == 3
+
+    # A smaller max_concurrency lowers the cap; a larger one cannot raise it
+    main.text_analyzer.max_running = 0
+    await post_batch(client, items=[item(f"source-{n}", 0.05) for n in range(6)], max_concurrency=2)
+    assert main.text_analyzer.max_running == 2
+    main.text_analyzer.max_running = 0
+    await post_batch(client, items=[item(f"source-{n}", 0.05) for n in range(6)], max_concurrency=50)
+    assert main.text_analyzer.max_running == 3
+
+
+async def test_failing_item_becomes_an_error_line(client):
+    lines = await post_batch(client, items=[item("ok-1", 0.05), item("broken", text="fail"), item("ok-2", 0.1)])
+
+    assert lines[0] == {"index": 1, "source_id": "broken", "error": "model unavailable"}
+    assert [line["index"] for line in lines[1:]] == [0, 2]
+    assert all("result" in line for line in lines[1:])
+    assert [result.source_id for result in main.write_queue.results] == ["ok-1", "ok-2"]
+
+
+async def test_mode_selects_the_analysis(client):
+    await post_batch(client, items=[item("a")], mode="lexical")
+    await post_batch(client, items=[item("b")], mode="semantic")
+    await post_batch(client, items=[item("c")])
+    assert main.text_analyzer.calls == {"hybrid": 1, "lexical": 1, "semantic": 1}
@@ -0,0 +1,94 @@
+"""CognitoTokenManager refresh scheduling against a fake Cognito endpoint."""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from utils import get_api_token
+from utils.get_api_token import CognitoTokenManager
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeCognito:
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.calls = 0
+        self.fail = False
+        self.delay = 0
+
+    async def handler(self, request):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            return httpx.Response(500, text="unavailable")
+        return httpx.Response(200, json={"access_token": f"token-{self.calls}", "expires_in": self.expires_in})
+
+
+@pytest.fixture
+def cognito(monkeypatch):
+    cognito = FakeCognito()
+    client_class = httpx.AsyncClient
+    monkeypatch.setattr(get_api_token.httpx, "AsyncClient",
+                        lambda **kwargs: client_class(transport=httpx.MockTransport(cognito.handler), **kwargs))
+    monkeypatch.setattr(get_api_token, "_token_request", lambda: ({}, {"grant_type": "client_credentials"}))
+    monkeypatch.setattr(get_api_token, "cognito_url", "https://cognito.invalid/oauth2/token")
+    monkeypatch.setattr(get_api_token, "token_cache", {"token": None, "expiration": 0, "expires_in": 0})
+    return cognito
+
+
+async def test_short_lived_token_is_not_refreshed_immediately(cognito):
+    # Lifetime shorter than the refresh margin
+    cognito.expires_in = 60
+    manager = CognitoTokenManager(refresh_margin=300, retry_interval=30)
+
+    assert await manager.refresh() == "token-1"
+    assert await manager.refresh() == "token-1"
+    assert await manager.get_token() == "token-1"
+
+    assert cognito.calls == 1
+    # Refreshed halfway through its lifetime rather than every few seconds
+    assert 25 < manager._next_refresh_delay() <= 30
+
+
+async def test_long_lived_token_uses_the_full_margin(cognito):
+    manager = CognitoTokenManager(refresh_margin=300, retry_interval=30)
+    await manager.refresh()
+
+    assert 3290 < manager._next_refresh_delay() <= 3300
+
+
+async def test_failed_refresh_waits_retry_interval_while_cached_token_lasts(cognito):
+    cognito.expires_in = 60
+    manager = CognitoTokenManager(refresh_margin=300, retry_interval=30)
+    await manager.refresh()
+    cognito.fail = True
+
+    # Forced refresh fails, the still-valid token is served
+    assert await manager.refresh(force=True) == "token-1"
+    assert manager.failures == 1
+    assert manager._next_refresh_delay() == 30
+
+    cognito.fail = False
+    assert await manager.refresh(force=True) == "token-3"
+    assert not manager.last_refresh_failed
+
+
+async def test_failed_refresh_without_token_retries_after_interval(cognito):
+    cognito.fail = True
+    manager = CognitoTokenManager(refresh_margin=300, retry_interval=30)
+
+    assert await manager.refresh() is None
+    assert manager._next_refresh_delay() == 30
+
+
+async def test_concurrent_callers_with_expired_token_share_one_request(cognito):
+    get_api_token.token_cache.update(token="expired", expiration=time.time() - 10, expires_in=3600)
+    cognito.delay = 0.05
+    manager = CognitoTokenManager(refresh_margin=300, retry_interval=30)
+
+    tokens = await asyncio.gather(*[manager.get_token() for _ in range(20)])
+
+    assert tokens == ["token-1"] * 20
+    assert cognito.calls == 1
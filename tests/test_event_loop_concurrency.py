@@ -0,0 +1,119 @@
+"""Slow LLM calls must not stall the event loop: /health stays fast while /analyze calls are in flight.
+
+The fake model behaves like ChatBedrock: ainvoke runs a blocking call in the loop's default
+executor, and invoke blocks the caller, so a route that called the sync API would hold up /health.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage
+
+import main
+from controllers.ai_service_for_text_analysis import TextAnalyzer
+
+pytestmark = pytest.mark.anyio
+
+CONCURRENT_REQUESTS = 16
+LLM_SECONDS = 0.5
+HEALTH_LATENCY_BUDGET_SECONDS = float(os.getenv("HEALTH_LATENCY_BUDGET_SECONDS", "0.1"))
+
+EMPTY_ANALYSIS = '{"highlighted_sections": [], "keywords_matched": []}'
+
+
+class SlowLLM:
+    model_id = "fake-model"
+
+    def invoke(self, prompt, *args, **kwargs):
+        time.sleep(LLM_SECONDS)
+        return AIMessage(content=EMPTY_ANALYSIS)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, self.invoke, prompt)
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.results = []
+
+    async def enqueue(self, result):
+        self.results.append(result)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    analyzer = TextAnalyzer()
+    analyzer.llm = SlowLLM()
+    monkeypatch.setattr(main, "text_analyzer", analyzer)
+    monkeypatch.setattr(main, "write_queue", RecordingQueue())
+    # What the lifespan does, without the AWS calls of initialize_services
+    main.compile_route_policy()
+    main.services_ready.set()
+    yield main.app
+    main.services_ready.clear()
+
+
+async def test_health_stays_fast_during_concurrent_analyses(app):
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=int(os.getenv("LLM_THREAD_POOL_SIZE", "64"))))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        start = time.perf_counter()
+        analyses = [
+            asyncio.create_task(client.post("/analyze", json={
+                "source_id": f"source-{number}", "content_type": "course", "bypass_cache": True,
+                "text": f"Document {number} on inclusive teaching practices."}))
+            for number in range(CONCURRENT_REQUESTS)
+        ]
+        # Let every request reach the LLM call
+        await asyncio.sleep(LLM_SECONDS / 5)
+
+        latencies = []
+        while not all(task.done() for task in analyses):
+            health_start = time.perf_counter()
+            response = await client.get("/health")
+            latencies.append(time.perf_counter() - health_start)
+            assert response.status_code == 200
+            await asyncio.sleep(0.02)
+
+        responses = await asyncio.gather(*analyses)
+        elapsed = time.perf_counter() - start
+
+    assert [response.status_code for response in responses] == [200] * CONCURRENT_REQUESTS
+    assert len(main.write_queue.results) == CONCURRENT_REQUESTS
+    assert latencies, "the analyses finished before /health was probed"
+    assert max(latencies) < HEALTH_LATENCY_BUDGET_SECONDS, f"/health took {max(latencies) * 1000:.0f} ms"
+    # The LLM calls overlapped instead of running one after another
+    assert elapsed < LLM_SECONDS * CONCURRENT_REQUESTS / 4
+
+
+async def test_health_stays_fast_during_keyword_search(app, monkeypatch):
+    analyzer = main.text_analyzer
+    analyze_text_lexical = analyzer.analyze_text_lexical
+
+    def slow_lexical(payload, request_id):
+        # Stands in for matching a very long document: CPU-bound, holds its thread
+        time.sleep(LLM_SECONDS)
+        return analyze_text_lexical(payload, request_id)
+
+    monkeypatch.setattr(analyzer, "analyze_text_lexical", slow_lexical)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        search = asyncio.create_task(client.post("/keywordsearch", json={
+            "source_id": "source-1", "content_type": "course", "keywords": ["equity"],
+            "text": "A document on equity in teaching."}))
+        await asyncio.sleep(LLM_SECONDS / 5)
+
+        latencies = []
+        while not search.done():
+            health_start = time.perf_counter()
+            assert (await client.get("/health")).status_code == 200
+            latencies.append(time.perf_counter() - health_start)
+            await asyncio.sleep(0.02)
+        response = await search
+
+    assert response.status_code == 200
+    assert response.json()["keywords_matched"] == ["equity"]
+    assert latencies, "the search finished before /health was probed"
+    assert max(latencies) < HEALTH_LATENCY_BUDGET_SECONDS, f"/health took {max(latencies) * 1000:.0f} ms"
@@ -0,0 +1,123 @@
+"""/flagged pages: the response model follows `view`, and bad cursors are client errors."""
+import base64
+import json
+
+import httpx
+import pytest
+from botocore.stub import ANY, Stubber
+
+import main
+from controllers.db_service import FLAGGED_SUMMARY_FIELDS, DynamoDBService, encode_cursor
+from models import AnalysisResult, HighlightedSection
+
+pytestmark = pytest.mark.anyio
+
+LAST_KEY = {"id": {"S": "result-1"}, "has_flags": {"S": "true"}, "created_at": {"S": "2024-05-01T12:00:00"}}
+
+
+@pytest.fixture
+def db_service(monkeypatch):
+    monkeypatch.delenv("TEXT_STORE_TABLE", raising=False)
+    db_service = DynamoDBService()
+    monkeypatch.setattr(main, "db_service", db_service)
+    # Authentication is covered elsewhere; these tests call the route directly
+    monkeypatch.setattr(main, "authenticate_request", lambda request, fetch=True: None)
+    main.compile_route_policy()
+    main.services_ready.set()
+    yield db_service
+    main.services_ready.clear()
+
+
+@pytest.fixture
+def dynamodb(db_service):
+    with Stubber(db_service.client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+async def client(db_service):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+
+
+def query_params(summary=True, **pinned):
+    """Expected Query parameters; only the ones a test pins are compared"""
+    params = {"TableName": ANY, "IndexName": ANY, "KeyConditionExpression": ANY, "ExpressionAttributeNames": ANY,
+              "ExpressionAttributeValues": ANY, "Limit": ANY, "ScanIndexForward": ANY}
+    if summary:
+        params["ProjectionExpression"] = ANY
+    params.update(pinned)
+    return params
+
+
+def flagged_item(db_service, fields=None):
+    result = AnalysisResult(
+        id="result-1", request_id="request-1", source_id="source-1", content_type="course",
+        original_text="An inclusive classroom.", keywords_searched=["inclusive"], has_flags="true",
+        keywords_matched=["inclusive"],
+        highlighted_sections=[HighlightedSection(start_index=3, end_index=12, matched_text="inclusive",
+                                                 reason="Exact match for 'inclusive'", confidence=1.0)])
+    item = db_service.to_item(result)
+    return {name: value for name, value in item.items() if fields is None or name in fields}
+
+
+async def test_summary_view(db_service, dynamodb, client):
+    dynamodb.add_response("query", {"Items": [flagged_item(db_service, FLAGGED_SUMMARY_FIELDS)],
+                                    "LastEvaluatedKey": LAST_KEY}, query_params())
+
+    response = await client.get("/flagged", params={"limit": 1})
+
+    assert response.status_code == 200
+    page = response.json()
+    assert page["view"] == "summary"
+    assert set(page["items"][0]) == {"id", "request_id", "source_id", "content_type", "has_flags", "created_at",
+                                     "keywords_matched", "metadata"}
+    assert json.loads(base64.urlsafe_b64decode(page["next_cursor"])) == LAST_KEY
+
+
+async def test_full_view(db_service, dynamodb, client):
+    dynamodb.add_response("query", {"Items": [flagged_item(db_service)]}, query_params(summary=False))
+
+    response = await client.get("/flagged", params={"view": "full"})
+
+    assert response.status_code == 200
+    page = response.json()
+    assert page["view"] == "full"
+    assert page["items"][0]["highlighted_sections"][0]["matched_text"] == "inclusive"
+    assert page["next_cursor"] is None
+
+
+async def test_cursor_is_passed_back_as_the_start_key(db_service, dynamodb, client):
+    dynamodb.add_response("query", {"Items": []}, query_params(ExclusiveStartKey=LAST_KEY))
+
+    response = await client.get("/flagged", params={"cursor": encode_cursor(LAST_KEY)})
+
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"\xff\xfe garbage").decode(),
+    encode_cursor(["id"]),
+    encode_cursor({}),
+    encode_cursor({"id": "result-1"}),
+    encode_cursor({"id": {"S": 1}}),
+    encode_cursor({"id": {"BOOL": True}}),
+    encode_cursor({"id": {"S": "a", "N": "1"}}),
+    encode_cursor({f"k{number}": {"S": "x"} for number in range(5)}),
+])
+async def test_garbled_cursor_is_rejected(dynamodb, client, cursor):
+    response = await client.get("/flagged", params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+async def test_forged_cursor_rejected_by_dynamodb_is_a_client_error(dynamodb, client):
+    dynamodb.add_client_error("query", "ValidationException", "The provided starting key is invalid",
+                              http_status_code=400)
+
+    response = await client.get("/flagged", params={"cursor": encode_cursor({"id": {"S": "forged"}})})
+
+    assert response.status_code == 400
@@ -0,0 +1,54 @@
+"""/health is liveness and stays 200; /ready reports whether the services are initialized."""
+import httpx
+import pytest
+
+import main
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    monkeypatch.setattr(main, "init_errors", {})
+    main.compile_route_policy()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+    main.services_ready.clear()
+
+
+async def test_initializing_is_live_but_not_ready(client):
+    health = await client.get("/health")
+    assert health.status_code == 200
+    assert health.json()["initializing"] is True
+
+    ready = await client.get("/ready")
+    assert ready.status_code == 503
+    assert ready.json()["initializing"] is True
+    assert "Retry-After" in ready.headers
+
+
+async def test_failed_init_step_is_degraded_but_live(client, monkeypatch):
+    monkeypatch.setitem(main.init_errors, "db_service", "AccessDenied")
+    main.services_ready.set()
+
+    health = await client.get("/health")
+    assert health.status_code == 200
+    assert health.json()["status"] == "Degraded"
+    assert health.json()["ready"] is False
+
+    ready = await client.get("/ready")
+    assert ready.status_code == 503
+    assert ready.json()["init_errors"] == {"db_service": "AccessDenied"}
+
+
+async def test_ready_once_retried_step_succeeds(client, monkeypatch):
+    monkeypatch.setitem(main.init_errors, "db_service", "AccessDenied")
+    main.services_ready.set()
+    assert (await client.get("/ready")).status_code == 503
+
+    # What the background retry does when the step finally succeeds
+    main.init_errors.pop("db_service")
+    ready = await client.get("/ready")
+    assert ready.status_code == 200
+    assert ready.json()["ready"] is True
+    assert (await client.get("/health")).json()["status"] == "We up"
@@ -0,0 +1,55 @@
+"""Importing main must be quick and must not touch the network.
+
+Secrets, the Cognito token, Bedrock and DynamoDB are set up by the app lifespan,
+so `import main` runs in a fresh interpreter with socket connects and DNS lookups
+blocked, and any attempt fails the test.
+"""
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous for a cold interpreter on a CI runner; a regression to network calls at import costs far more
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", "10"))
+
+PROBE = """
+import json, socket, time
+attempts = []
+
+def blocked(kind):
+    def refuse(*args, **kwargs):
+        attempts.append(f"{kind} {args[1:] if kind == 'connect' else args[:2]}")
+        raise OSError("network disabled during import")
+    return refuse
+
+socket.socket.connect = blocked("connect")
+socket.socket.connect_ex = blocked("connect")
+socket.getaddrinfo = blocked("getaddrinfo")
+
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "network": attempts, "ready": main.services_ready.is_set(),
+                  "services": [main.text_analyzer, main.statement_suggester, main.db_service, main.write_queue]}))
+"""
+
+
+def import_main_in_subprocess():
+    completed = subprocess.run([sys.executable, "-c", PROBE], cwd=REPO_ROOT, env=dict(os.environ),
+                               capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_import_main_makes_no_network_calls():
+    result = import_main_in_subprocess()
+    assert result["network"] == []
+    assert not result["ready"]
+    assert result["services"] == [None, None, None, None]
+
+
+def test_import_main_within_time_budget():
+    result = import_main_in_subprocess()
+    assert result["seconds"] < IMPORT_TIME_BUDGET_SECONDS, f"import main took {result['seconds']:.2f}s"
@@ -0,0 +1,95 @@
+"""Truncated-response JSON salvage (utils/json_stream.py) on model responses.
+
+Each response in fixtures/bedrock_responses is cut at every offset and streamed in
+several chunkings; the recovered elements must always be a prefix of the elements of
+the complete response, and streaming must agree with salvaging the same text. The
+index lists each response with the array keys its caller salvages.
+"""
+import json
+import os
+import random
+
+import pytest
+
+from utils.json_stream import JsonArrayStreamer, salvage_json
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "bedrock_responses")
+
+
+def load_responses():
+    with open(os.path.join(FIXTURES_DIR, "index.json")) as f:
+        index = json.load(f)
+    params = []
+    for entry in index:
+        with open(os.path.join(FIXTURES_DIR, entry["file"]), encoding="utf-8") as f:
+            params.append(pytest.param(f.read(), entry["keys"], id=entry["file"].rsplit(".", 1)[0]))
+    return params
+
+
+RESPONSES = load_responses()
+# Stream chunk sizes; "random" mixes sizes from 1 to 12 characters
+CHUNKINGS = [1, 2, 7, 64, "random"]
+# Where a response is cut off, as a share of its length
+TRUNCATIONS = [0.05, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def complete_elements(response, key):
+    data = salvage_json(response, [key]).data or {}
+    if key in data:
+        return data[key]
+    # A bare-array key on an object response streams its first array
+    return JsonArrayStreamer(key).feed(response)
+
+
+def stream(text, key, chunking, seed=0):
+    rng = random.Random(seed)
+    streamer = JsonArrayStreamer(key)
+    position = 0
+    while position < len(text):
+        step = rng.randint(1, 12) if chunking == "random" else chunking
+        yield streamer.feed(text[position:position + step])
+        position += step
+
+
+@pytest.mark.parametrize("response, keys", RESPONSES)
+def test_complete_response_parses_whole(response, keys):
+    assert salvage_json(response, keys).complete
+
+
+@pytest.mark.parametrize("response, keys", RESPONSES)
+def test_salvage_recovers_a_prefix_at_every_truncation(response, keys):
+    full = {key: complete_elements(response, key) for key in keys}
+    for cut in range(len(response) + 1):
+        truncated = response[:cut]
+        for key in keys:
+            salvaged = salvage_json(truncated, [key])
+            recovered = (salvaged.data or {}).get(key, [])
+            assert recovered == full[key][:len(recovered)], (cut, key)
+            if not salvaged.complete and salvaged.resume_offset > 0:
+                # Resuming from the offset must keep exactly the recovered elements
+                assert salvage_json(truncated[:salvaged.resume_offset], [key]).data[key] == recovered, (cut, key)
+
+
+@pytest.mark.parametrize("chunking", CHUNKINGS)
+@pytest.mark.parametrize("response, keys", RESPONSES)
+def test_streaming_yields_every_element_in_order(response, keys, chunking):
+    for key in keys:
+        full = complete_elements(response, key)
+        streamed = []
+        for elements in stream(response, key, chunking):
+            streamed.extend(elements)
+            assert streamed == full[:len(streamed)], key
+        assert streamed == full, key
+
+
+@pytest.mark.parametrize("truncation", TRUNCATIONS)
+@pytest.mark.parametrize("chunking", CHUNKINGS)
+@pytest.mark.parametrize("response, keys", RESPONSES)
+def test_truncated_stream_matches_salvage(response, keys, chunking, truncation):
+    truncated = response[:int(len(response) * truncation)]
+    for key in keys:
+        salvaged = salvage_json(truncated, [key])
+        streamed = [element for elements in stream(truncated, key, chunking) for element in elements]
+        assert streamed == complete_elements(response, key)[:len(streamed)], key
+        if not salvaged.complete:
+            assert streamed == (salvaged.data or {}).get(key, []), key
@@ -0,0 +1,76 @@
+"""KeywordMatcher must report what searching each keyword on its own would, overlaps included."""
+import re
+
+import pytest
+
+from utils import keyword_matcher
+from utils.keyword_matcher import _WORD_END, _WORD_START, KeywordMatcher, compile_keyword_pattern, is_keyword_pattern
+from utils.token_index import TokenIndex
+
+TEXT = ("Equity and equitable access: the equity gap, anti-racism and anti racism work, "
+        "All-Inclusive resorts versus an inclusive classroom. Inclusivity, inclusion and "
+        "equity-minded advising; the Equity Gap report. Racism, antiracism, anti--racism.")
+
+KEYWORDS = [
+    "equity", "quit", '"equity"', "equit*", '"equity gap"', "equity*",
+    '"anti racism"', '"racism"', "anti*", "*racism",
+    "inclusi*", '"inclusive"', "inclusive", '"inclusion"',
+]
+
+
+def per_keyword_loop(text, keywords):
+    """The matching /keywordsearch did before the single-pass matcher: one search per keyword"""
+    matches = []
+    for keyword in keywords:
+        spans = []
+        if is_keyword_pattern(keyword):
+            source = compile_keyword_pattern(keyword)
+            if source:
+                regex = re.compile(f"{_WORD_START}(?:{source}){_WORD_END}", re.IGNORECASE)
+                spans = [match.span() for match in regex.finditer(text)]
+        elif keyword:
+            start = text.lower().find(keyword.lower())
+            while start != -1:
+                spans.append((start, start + len(keyword)))
+                start = text.lower().find(keyword.lower(), start + len(keyword))
+        matches.append(spans)
+    return matches
+
+
+@pytest.mark.parametrize("use_index", [False, True], ids=["scan", "token-index"])
+def test_overlapping_keywords_match_the_per_keyword_loop(use_index):
+    matcher = KeywordMatcher(KEYWORDS)
+    index = TokenIndex(TEXT) if use_index else None
+
+    assert matcher.find_all(TEXT, index) == per_keyword_loop(TEXT, KEYWORDS)
+
+
+def test_overlapping_patterns_are_all_reported():
+    matcher = KeywordMatcher(['"equity"', "equit*", '"equity gap"'])
+    text = "The equity gap"
+
+    assert matcher.find_all(text) == [[(4, 10)], [(4, 10)], [(4, 14)]]
+
+
+@pytest.mark.parametrize("keywords", [['"racism"', "anti*"], ["nothing*", '"equity gap"'], ["absent"]])
+def test_search_agrees_with_find_all(keywords):
+    matcher = KeywordMatcher(keywords)
+    found = matcher.search(TEXT)
+    spans = matcher.find_all(TEXT)
+
+    if found is None:
+        assert not any(spans)
+    else:
+        assert spans[keywords.index(found)]
+
+
+@pytest.mark.parametrize("automaton_min_keywords", [1, 10_000], ids=["automaton", "find-loop"])
+def test_plain_keyword_paths_agree(monkeypatch, automaton_min_keywords):
+    monkeypatch.setattr(keyword_matcher, "AUTOMATON_MIN_KEYWORDS", automaton_min_keywords)
+    keywords = ["equity", "quit", "Equity Gap", "racism", "anti-racism", "inclusi", "in", ""]
+    matcher = KeywordMatcher(keywords)
+
+    assert matcher._use_automaton == (automaton_min_keywords == 1)
+    assert matcher.find_all(TEXT) == per_keyword_loop(TEXT, keywords)
+    assert matcher.search(TEXT) in keywords
+    assert matcher.search("Some other text") is None
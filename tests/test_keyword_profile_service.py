@@ -0,0 +1,93 @@
+"""Keyword profiles: loading KEYWORD_PROFILES_FILE, keyword resolution, and the compiled matcher cache."""
+import json
+
+import pytest
+
+from controllers.keyword_profile_service import (
+    DEFAULT_ANALYSIS_PROFILE,
+    KeywordProfileService,
+    UnknownProfileError,
+)
+
+
+def write_profiles(tmp_path, profiles):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps(profiles))
+    return str(path)
+
+
+@pytest.fixture
+def service(tmp_path):
+    return KeywordProfileService(profiles_file=write_profiles(tmp_path, [
+        {"profile_id": "nursing", "version": 2, "keywords": ["patient equity", "cultural competence"]},
+    ]))
+
+
+def test_invalid_entries_are_skipped(tmp_path, caplog):
+    path = write_profiles(tmp_path, [
+        {"profile_id": "missing-keywords"},
+        {"profile_id": "bad-version", "version": "latest", "keywords": ["equity"]},
+        "not-an-object",
+        {"profile_id": "valid", "keywords": ["equity"]},
+    ])
+    service = KeywordProfileService(profiles_file=path)
+
+    assert service.get_profile("valid").keywords == ["equity"]
+    for profile_id in ("missing-keywords", "bad-version"):
+        with pytest.raises(UnknownProfileError):
+            service.get_profile(profile_id)
+    # Built-in profiles are still there
+    assert service.get_profile(DEFAULT_ANALYSIS_PROFILE)
+    assert caplog.text.count("Skipping invalid keyword profile") == 3
+
+
+def test_unreadable_file_keeps_the_built_in_profiles(tmp_path):
+    path = tmp_path / "profiles.json"
+    path.write_text("{not json")
+    service = KeywordProfileService(profiles_file=str(path))
+    assert [profile.profile_id for profile in service.list_profiles()] == \
+        [profile.profile_id for profile in KeywordProfileService().list_profiles()]
+
+
+def test_unknown_profile_raises(service):
+    with pytest.raises(UnknownProfileError) as error:
+        service.resolve_keywords("no-such-profile", [], DEFAULT_ANALYSIS_PROFILE)
+    assert error.value.profile_id == "no-such-profile"
+    assert str(error.value) == "Unknown keyword profile: no-such-profile"
+
+    with pytest.raises(UnknownProfileError):
+        service.get_matcher("no-such-profile", [], DEFAULT_ANALYSIS_PROFILE)
+
+
+def test_explicit_keywords_override_the_default_profile(service):
+    assert service.resolve_keywords(None, ["belonging"], DEFAULT_ANALYSIS_PROFILE) == ["belonging"]
+    assert service.resolve_keywords(None, [], DEFAULT_ANALYSIS_PROFILE) == \
+        service.get_profile(DEFAULT_ANALYSIS_PROFILE).keywords
+
+
+def test_named_profile_is_used_instead_of_keywords(service):
+    assert service.resolve_keywords("nursing", ["belonging"], DEFAULT_ANALYSIS_PROFILE) == \
+        ["patient equity", "cultural competence"]
+
+
+def test_matcher_is_cached_per_profile_version(service):
+    matcher = service.get_matcher("nursing", [], DEFAULT_ANALYSIS_PROFILE)
+    assert service.get_matcher("nursing", ["ignored"], DEFAULT_ANALYSIS_PROFILE) is matcher
+    assert matcher.keywords == ["patient equity", "cultural competence"]
+
+    # A new version of the profile gets a new matcher
+    service.profiles["nursing"] = service.profiles["nursing"].model_copy(
+        update={"version": 3, "keywords": ["health equity"]})
+    updated = service.get_matcher("nursing", [], DEFAULT_ANALYSIS_PROFILE)
+    assert updated is not matcher
+    assert updated.keywords == ["health equity"]
+
+
+def test_ad_hoc_keyword_matchers_are_cached_and_bounded():
+    service = KeywordProfileService(cache_size=2)
+    first = service.get_matcher(None, ["a", "b"], DEFAULT_ANALYSIS_PROFILE)
+    assert service.get_matcher(None, ["a", "b"], DEFAULT_ANALYSIS_PROFILE) is first
+
+    service.get_matcher(None, ["c"], DEFAULT_ANALYSIS_PROFILE)
+    service.get_matcher(None, ["d"], DEFAULT_ANALYSIS_PROFILE)
+    assert service.get_matcher(None, ["a", "b"], DEFAULT_ANALYSIS_PROFILE) is not first
@@ -0,0 +1,86 @@
+"""Relevance prefilter scoping: /conceptsearch on multi-chunk documents only, with skipped parts reported."""
+import httpx
+import pytest
+
+import main
+from controllers.ai_service_for_text_analysis import TextAnalyzer
+from models import TextPayload
+
+pytestmark = pytest.mark.anyio
+
+RELEVANT = "The program builds an inclusive community and supports diversity and equity for all students."
+UNRELATED = "Students calculate the load on a cantilever beam and compare steel with aluminium alloys."
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    monkeypatch.delenv("RELEVANCE_PREFILTER_THRESHOLD", raising=False)
+    analyzer = TextAnalyzer()
+    # Small chunks so each paragraph is its own chunk
+    analyzer.chunk_max_tokens = 30
+    analyzed = []
+
+    async def fake_result_data(text, keywords, bypass_cache=False):
+        analyzed.append(text)
+        return {"highlighted_sections": [], "keywords_matched": []}
+
+    monkeypatch.setattr(analyzer, "_get_result_data", fake_result_data)
+    analyzer.analyzed = analyzed
+    return analyzer
+
+
+def payload(text, **fields):
+    return TextPayload(source_id="source-1", content_type="course", text=text,
+                       keywords=["diversity", "equity", "inclusion"], **fields)
+
+
+async def test_prefilter_is_off_by_default(analyzer):
+    result = await analyzer.analyze_text_semantic(payload(f"{RELEVANT}\n\n{UNRELATED}"), "request-1")
+
+    assert len(analyzer.analyzed) == 2
+    assert result.skipped_ranges is None
+
+
+async def test_skipped_chunks_are_reported(analyzer):
+    text = f"{RELEVANT}\n\n{UNRELATED}"
+    result = await analyzer.analyze_text_semantic(payload(text, prefilter_threshold=0.5), "request-1")
+
+    assert [chunk.strip() for chunk in analyzer.analyzed] == [RELEVANT]
+    assert len(result.skipped_ranges) == 1
+    skipped = result.skipped_ranges[0]
+    assert text[skipped.start_index:skipped.end_index].strip() == UNRELATED
+    assert skipped.score < 0.5
+
+
+async def test_single_chunk_document_is_always_analyzed(analyzer):
+    result = await analyzer.analyze_text_semantic(payload(UNRELATED, prefilter_threshold=0.9), "request-1")
+
+    assert analyzer.analyzed == [UNRELATED]
+    assert result.skipped_ranges is None
+
+
+async def test_hybrid_analysis_ignores_the_prefilter(analyzer):
+    analyzer.prefilter_threshold = 0.9
+    result = await analyzer.analyze_text(payload(f"{RELEVANT}\n\n{UNRELATED}", prefilter_threshold=0.9), "request-1")
+
+    assert len(analyzer.analyzed) == 2
+    assert result.skipped_ranges is None
+
+
+async def test_prefilter_counts_are_on_cache_stats(analyzer, monkeypatch):
+    await analyzer.analyze_text_semantic(payload(f"{RELEVANT}\n\n{UNRELATED}", prefilter_threshold=0.5), "request-1")
+    await analyzer.analyze_text_semantic(payload(f"{RELEVANT}\n\n{RELEVANT}"), "request-2")
+
+    monkeypatch.setattr(main, "text_analyzer", analyzer)
+    main.compile_route_policy()
+    main.services_ready.set()
+    monkeypatch.setattr(main, "authenticate_request", lambda request, fetch=True: None)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            response = await client.get("/cache-stats")
+    finally:
+        main.services_ready.clear()
+
+    assert response.status_code == 200
+    # Only the request that ran the prefilter is counted
+    assert response.json()["prefilter"] == {"default_threshold": 0.0, "chunks_scored": 2, "chunks_skipped": 1}
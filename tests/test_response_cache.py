@@ -0,0 +1,199 @@
+"""Proxy response cache: TTL and stale-while-revalidate, conditional revalidation, byte budget, client ETags."""
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from utils.response_cache import ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+URL = "https://courses.invalid/templates"
+
+
+class Upstream:
+    """fetch(conditional_headers) callback that records the headers it was called with"""
+
+    def __init__(self, body=b'{"templates": [1]}', etag='"v1"', last_modified="Wed, 01 May 2024 12:00:00 GMT"):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.requests = []
+        self.release = None
+
+    async def __call__(self, headers):
+        self.requests.append(headers)
+        if self.release is not None:
+            await self.release.wait()
+        if headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        return httpx.Response(200, content=self.body,
+                              headers={"ETag": self.etag, "Last-Modified": self.last_modified})
+
+
+def age(cache, key, seconds):
+    cache._entries[key].fetched_at -= seconds
+
+
+async def settle(cache):
+    await asyncio.gather(*list(cache._refreshing.values()))
+
+
+async def test_fresh_entry_is_served_without_upstream_request():
+    cache, upstream = ResponseCache(), Upstream()
+    first = await cache.get_or_fetch("templates", URL, upstream)
+    second = await cache.get_or_fetch("templates", URL, upstream)
+
+    assert second is first
+    assert len(upstream.requests) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+async def test_stale_entry_is_served_while_one_refresh_runs(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_TTL_TEMPLATES", "10")
+    monkeypatch.setenv("RESPONSE_CACHE_STALE_TEMPLATES", "100")
+    cache, upstream = ResponseCache(), Upstream()
+    stale = await cache.get_or_fetch("templates", URL, upstream)
+    age(cache, URL, 50)
+
+    upstream.body, upstream.etag = b'{"templates": [2]}', '"v2"'
+    upstream.release = asyncio.Event()
+    served = await asyncio.gather(*[cache.get_or_fetch("templates", URL, upstream) for _ in range(5)])
+    assert all(entry is stale for entry in served)
+    await asyncio.sleep(0)
+    assert len(cache._refreshing) == 1
+
+    upstream.release.set()
+    await settle(cache)
+    refreshed = await cache.get_or_fetch("templates", URL, upstream)
+    assert refreshed.content == b'{"templates": [2]}'
+    assert refreshed.etag != stale.etag
+    assert len(upstream.requests) == 2
+    assert cache.stats()["stale_hits"] == 5
+
+
+async def test_entry_past_stale_window_is_fetched_inline(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_TTL_TEMPLATES", "10")
+    monkeypatch.setenv("RESPONSE_CACHE_STALE_TEMPLATES", "100")
+    cache, upstream = ResponseCache(), Upstream()
+    await cache.get_or_fetch("templates", URL, upstream)
+    age(cache, URL, 500)
+
+    upstream.body, upstream.etag = b'{"templates": [2]}', '"v2"'
+    assert (await cache.get_or_fetch("templates", URL, upstream)).content == b'{"templates": [2]}'
+    assert cache.stats()["misses"] == 2
+
+
+async def test_refresh_failure_keeps_serving_the_stale_entry(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_TTL_TEMPLATES", "10")
+    cache, upstream = ResponseCache(), Upstream()
+    stale = await cache.get_or_fetch("templates", URL, upstream)
+    age(cache, URL, 50)
+
+    async def failing(headers):
+        raise RuntimeError("upstream down")
+
+    assert await cache.get_or_fetch("templates", URL, failing) is stale
+    await settle(cache)
+    assert cache.stats()["refresh_errors"] == 1
+    assert await cache.get_or_fetch("templates", URL, upstream) is stale
+
+
+async def test_revalidation_is_conditional_and_304_keeps_the_entry(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_TTL_TEMPLATES", "10")
+    cache, upstream = ResponseCache(), Upstream()
+    entry = await cache.get_or_fetch("templates", URL, upstream)
+    age(cache, URL, 50)
+    stale_fetched_at = entry.fetched_at
+
+    await cache.get_or_fetch("templates", URL, upstream)
+    await settle(cache)
+
+    assert upstream.requests[1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Wed, 01 May 2024 12:00:00 GMT"}
+    assert cache.stats()["not_modified"] == 1
+    assert entry.fetched_at > stale_fetched_at
+    # Fresh again: served without another request
+    assert await cache.get_or_fetch("templates", URL, upstream) is entry
+    assert len(upstream.requests) == 2
+
+
+async def test_304_for_entry_evicted_during_refresh_stores_it_again(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_TTL_TEMPLATES", "10")
+    cache, upstream = ResponseCache(), Upstream()
+    entry = await cache.get_or_fetch("templates", URL, upstream)
+    age(cache, URL, 50)
+
+    upstream.release = asyncio.Event()
+    await cache.get_or_fetch("templates", URL, upstream)
+    await asyncio.sleep(0)
+    cache._entries.pop(URL)
+    cache._size -= len(entry.content)
+    upstream.release.set()
+    await settle(cache)
+
+    assert cache._entries[URL] is entry
+    assert cache.stats()["size_bytes"] == len(entry.content)
+    assert await cache.get_or_fetch("templates", URL, upstream) is entry
+    assert len(upstream.requests) == 2
+
+
+async def test_byte_budget_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=250)
+    upstreams = {name: Upstream(body=b"x" * 100, etag=f'"{name}"') for name in "abc"}
+
+    await cache.get_or_fetch("templates", "a", upstreams["a"])
+    await cache.get_or_fetch("templates", "b", upstreams["b"])
+    # Touch "a" so "b" is the least recently used
+    await cache.get_or_fetch("templates", "a", upstreams["a"])
+    await cache.get_or_fetch("templates", "c", upstreams["c"])
+
+    assert list(cache._entries) == ["a", "c"]
+    assert cache.stats()["size_bytes"] == 200
+    assert cache.stats()["evictions"] == 1
+
+
+async def test_body_larger_than_budget_is_served_but_not_cached():
+    cache, upstream = ResponseCache(max_bytes=50), Upstream(body=b"x" * 100)
+    assert (await cache.get_or_fetch("templates", URL, upstream)).content == b"x" * 100
+    assert cache.stats()["entries"] == 0 and cache.stats()["size_bytes"] == 0
+
+
+async def test_concurrent_misses_share_one_upstream_request():
+    cache, upstream = ResponseCache(), Upstream()
+    upstream.release = asyncio.Event()
+    waiters = [asyncio.create_task(cache.get_or_fetch("templates", URL, upstream)) for _ in range(5)]
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    entries = await asyncio.gather(*waiters)
+    assert all(entry is entries[0] for entry in entries)
+    assert len(upstream.requests) == 1
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    upstream = Upstream()
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    monkeypatch.setattr(main, "_fetch_upstream", lambda name, url, api_label, fetch_label, headers: upstream(headers))
+    main.compile_route_policy()
+    main.services_ready.set()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+    main.services_ready.clear()
+
+
+async def test_client_if_none_match_gets_304(client):
+    first = await client.get("/templates")
+    assert first.status_code == 200
+    assert first.json() == {"templates": [1]}
+    etag = first.headers["ETag"]
+
+    revalidated = await client.get("/templates", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.content == b""
+
+    changed = await client.get("/templates", headers={"If-None-Match": '"something-else"'})
+    assert changed.status_code == 200
+    assert changed.json() == {"templates": [1]}
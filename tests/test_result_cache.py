@@ -0,0 +1,145 @@
+"""LLM result cache: key derivation, TTL, LRU bound, DynamoDB tier, and bypass_cache in the analyzer."""
+import json
+import time
+
+import pytest
+from botocore.stub import Stubber
+from langchain_core.messages import AIMessage
+
+from controllers import ai_service_for_text_analysis
+from controllers.ai_service_for_text_analysis import TextAnalyzer
+from models import TextPayload
+from utils.result_cache import DynamoDBCacheTier, ResultCache, make_cache_key
+
+pytestmark = pytest.mark.anyio
+
+RESULT = {"highlighted_sections": [], "keywords_matched": []}
+
+
+def test_key_ignores_keyword_order():
+    assert make_cache_key("text", ["a", "b"], "v1", "model") == make_cache_key("text", ["b", "a"], "v1", "model")
+
+
+@pytest.mark.parametrize("changed", [
+    ("other text", ["a", "b"], "v1", "model"),
+    ("text", ["a", "c"], "v1", "model"),
+    ("text", ["a", "b"], "v2", "model"),
+    ("text", ["a", "b"], "v1", "other-model"),
+])
+def test_key_changes_with_text_keywords_prompt_version_and_model(changed):
+    assert make_cache_key(*changed) != make_cache_key("text", ["a", "b"], "v1", "model")
+
+
+async def test_entry_expires_after_ttl():
+    cache = ResultCache(ttl_seconds=60)
+    await cache.set("key", RESULT)
+    assert await cache.get("key") == RESULT
+
+    expires_at, value = cache._entries["key"]
+    cache._entries["key"] = (expires_at - 61, value)
+    assert await cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["misses"] == 1
+
+
+async def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    await cache.set("a", {"n": 1})
+    await cache.set("b", {"n": 2})
+    await cache.get("a")
+    await cache.set("c", {"n": 3})
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == {"n": 1}
+    assert await cache.get("c") == {"n": 3}
+
+
+@pytest.fixture
+def dynamodb_tier():
+    tier = DynamoDBCacheTier("result-cache")
+    with Stubber(tier.table.meta.client) as stubber:
+        yield tier, stubber
+        stubber.assert_no_pending_responses()
+
+
+async def test_persistent_hit_fills_the_memory_tier(dynamodb_tier):
+    tier, stubber = dynamodb_tier
+    stubber.add_response("get_item", {"Item": {
+        "cache_key": {"S": "key"}, "result_data": {"S": json.dumps(RESULT)},
+        "expires_at": {"N": str(int(time.time()) + 3600)}}},
+        {"TableName": "result-cache", "Key": {"cache_key": "key"}})
+    cache = ResultCache(persistent_tier=tier)
+
+    assert await cache.get("key") == RESULT
+    # Served from memory now; the stubber has no second get_item queued
+    assert await cache.get("key") == RESULT
+    assert cache.stats()["persistent_hits"] == 1 and cache.stats()["hits"] == 1
+
+
+async def test_expired_persistent_item_is_a_miss(dynamodb_tier):
+    tier, stubber = dynamodb_tier
+    stubber.add_response("get_item", {"Item": {
+        "cache_key": {"S": "key"}, "result_data": {"S": json.dumps(RESULT)},
+        "expires_at": {"N": str(int(time.time()) - 1)}}})
+
+    assert await ResultCache(persistent_tier=tier).get("key") is None
+
+
+async def test_persistent_tier_errors_are_misses(dynamodb_tier):
+    tier, stubber = dynamodb_tier
+    stubber.add_client_error("get_item", "ProvisionedThroughputExceededException")
+    stubber.add_client_error("put_item", "ProvisionedThroughputExceededException")
+    cache = ResultCache(persistent_tier=tier)
+
+    assert await cache.get("key") is None
+    await cache.set("key", RESULT)
+    assert await cache.get("key") == RESULT
+
+
+class CountingLLM:
+    model_id = "fake-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        self.calls += 1
+        return AIMessage(content=json.dumps(RESULT))
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    monkeypatch.setattr(ai_service_for_text_analysis, "result_cache", ResultCache())
+    analyzer = TextAnalyzer()
+    analyzer.llm = CountingLLM()
+    return analyzer
+
+
+def payload(**overrides):
+    return TextPayload(**{"source_id": "source", "content_type": "course", "keywords": ["equity", "access"],
+                          "text": "A short text on equity and access.", **overrides})
+
+
+async def test_resubmission_is_served_from_cache(analyzer):
+    await analyzer.analyze_text_semantic(payload(), "request-1")
+    await analyzer.analyze_text_semantic(payload(keywords=["access", "equity"]), "request-2")
+    assert analyzer.llm.calls == 1
+
+
+async def test_bypass_cache_reruns_the_analysis_and_refreshes_the_entry(analyzer):
+    await analyzer.analyze_text_semantic(payload(), "request-1")
+    await analyzer.analyze_text_semantic(payload(bypass_cache=True), "request-2")
+    assert analyzer.llm.calls == 2
+
+    # The bypassed run still stored its result for later requests
+    await analyzer.analyze_text_semantic(payload(), "request-3")
+    assert analyzer.llm.calls == 2
+
+
+async def test_prompt_version_or_model_change_misses_the_cache(analyzer, monkeypatch):
+    await analyzer.analyze_text_semantic(payload(), "request-1")
+    monkeypatch.setattr(analyzer, "PROMPT_VERSION", analyzer.PROMPT_VERSION + "-next")
+    await analyzer.analyze_text_semantic(payload(), "request-2")
+    analyzer.llm.model_id = "other-model"
+    await analyzer.analyze_text_semantic(payload(), "request-3")
+    assert analyzer.llm.calls == 3
@@ -0,0 +1,111 @@
+"""route_policy authentication must not block the event loop.
+
+Loading the Azure config (Secrets Manager) and fetching an unknown signing key (JWKS) are
+blocking network calls; while one is in flight for an authenticated request, /health has to
+keep answering. Tokens whose key is already cached are checked without a worker thread.
+"""
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt import PyJWKClient
+from jwt.algorithms import RSAAlgorithm
+
+import main
+from utils import azure_sso
+
+pytestmark = pytest.mark.anyio
+
+FETCH_SECONDS = 0.5
+HEALTH_LATENCY_BUDGET_SECONDS = float(os.getenv("HEALTH_LATENCY_BUDGET_SECONDS", "0.1"))
+TENANT = {"TENANT_ID": "test-tenant", "AZURE_CLIENT_ID": "test-client", "AZURE_CLIENT_SECRET": "unused"}
+
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+JWK = {**json.loads(RSAAlgorithm.to_jwk(PRIVATE_KEY.public_key())), "kid": "test-kid", "use": "sig", "alg": "RS256"}
+
+
+def make_token(name="Test User"):
+    return jwt.encode(
+        {"aud": TENANT["AZURE_CLIENT_ID"], "iss": f"https://login.microsoftonline.com/{TENANT['TENANT_ID']}/v2.0",
+         "exp": int(time.time()) + 3600, "oid": "user", "name": name},
+        PRIVATE_KEY, algorithm="RS256", headers={"kid": "test-kid"})
+
+
+@pytest.fixture
+def azure(monkeypatch):
+    """Azure config not loaded and no signing keys cached; both fetches block for FETCH_SECONDS"""
+    fetches = {"secret": 0, "jwks": 0}
+
+    def slow_get_secret(name):
+        fetches["secret"] += 1
+        time.sleep(FETCH_SECONDS)
+        return TENANT
+
+    def slow_fetch_data(self):
+        fetches["jwks"] += 1
+        time.sleep(FETCH_SECONDS)
+        return {"keys": [JWK]}
+
+    for name in ("TENANT_ID", "CLIENT_ID", "CLIENT_SECRET"):
+        monkeypatch.setattr(azure_sso, name, None)
+    monkeypatch.setattr(azure_sso, "_config_retry_at", 0.0)
+    monkeypatch.setattr(azure_sso, "get_secret", slow_get_secret)
+    monkeypatch.setattr(PyJWKClient, "fetch_data", slow_fetch_data)
+    monkeypatch.setattr(azure_sso, "jwks_cache", azure_sso.JWKSCache(azure_sso.JWKS_URL))
+    monkeypatch.setattr(azure_sso, "verified_tokens", azure_sso.VerifiedTokenCache())
+    main.compile_route_policy()
+    main.services_ready.set()
+    yield fetches
+    main.services_ready.clear()
+
+
+@pytest.fixture
+async def client(azure):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+
+
+async def test_health_stays_fast_while_auth_fetches_config_and_keys(azure, client):
+    headers = {"Authorization": f"Bearer {make_token()}"}
+    authenticated = asyncio.create_task(client.get("/api/me", headers=headers))
+    await asyncio.sleep(0.05)
+
+    latencies = []
+    while not authenticated.done():
+        start = time.perf_counter()
+        assert (await client.get("/health")).status_code == 200
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+    response = await authenticated
+    assert response.status_code == 200
+    assert response.json()["name"] == "Test User"
+    assert azure == {"secret": 1, "jwks": 1}
+    # Both fetches together take 2 * FETCH_SECONDS, so /health was polled during them
+    assert len(latencies) >= 5
+    assert max(latencies) < HEALTH_LATENCY_BUDGET_SECONDS
+
+
+async def test_cached_signing_key_is_checked_on_the_event_loop(azure, client, monkeypatch):
+    assert (await client.get("/api/me", headers={"Authorization": f"Bearer {make_token()}"})).status_code == 200
+
+    async def no_thread(func, *args, **kwargs):
+        raise AssertionError("authentication left the event loop")
+
+    monkeypatch.setattr(main.asyncio, "to_thread", no_thread)
+    # A new token, so the signature is verified again, with the cached key
+    response = await client.get("/api/me", headers={"Authorization": f"Bearer {make_token('Other User')}"})
+    assert response.status_code == 200
+    assert response.json()["name"] == "Other User"
+    assert azure == {"secret": 1, "jwks": 1}
+
+
+async def test_missing_token_is_rejected_without_fetching_keys(azure, client):
+    response = await client.get("/api/me")
+    assert response.status_code == 401
+    assert azure["jwks"] == 0
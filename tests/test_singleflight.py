@@ -0,0 +1,107 @@
+"""SingleFlight.do: one call per key in flight, shared result or error, cancellation-safe waiters."""
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+class Upstream:
+    """Counts calls; each call finishes when `release` is set"""
+
+    def __init__(self, result="value", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return f"{self.result}-{self.calls}"
+
+
+async def test_concurrent_callers_share_one_call():
+    flight, upstream = SingleFlight("test"), Upstream()
+    waiters = [asyncio.create_task(flight.do("key", upstream)) for _ in range(10)]
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await asyncio.gather(*waiters) == ["value-1"] * 10
+    assert upstream.calls == 1
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "coalesced": 9}
+
+
+async def test_different_keys_do_not_coalesce():
+    flight, upstream = SingleFlight("test"), Upstream()
+    upstream.release.set()
+    assert sorted(await asyncio.gather(flight.do("a", upstream), flight.do("b", upstream))) == ["value-1", "value-2"]
+    assert upstream.calls == 2
+
+
+async def test_error_reaches_every_waiter():
+    flight, upstream = SingleFlight("test"), Upstream(error=RuntimeError("upstream down"))
+    waiters = [asyncio.create_task(flight.do("key", upstream)) for _ in range(5)]
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream down" for result in results)
+    assert upstream.calls == 1
+
+
+async def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    flight, upstream = SingleFlight("test"), Upstream()
+    cancelled = asyncio.create_task(flight.do("key", upstream))
+    others = [asyncio.create_task(flight.do("key", upstream)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    assert flight.stats()["in_flight"] == 1
+
+    upstream.release.set()
+    assert await asyncio.gather(*others) == ["value-1"] * 3
+    assert upstream.calls == 1
+
+
+async def test_call_finishes_after_every_waiter_is_cancelled():
+    flight, upstream = SingleFlight("test"), Upstream(error=RuntimeError("nobody listening"))
+    waiter = asyncio.create_task(flight.do("key", upstream))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    upstream.release.set()
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_key_is_released_after_completion():
+    flight, upstream = SingleFlight("test"), Upstream()
+    upstream.release.set()
+
+    assert await flight.do("key", upstream) == "value-1"
+    assert flight.stats()["in_flight"] == 0
+    # Results are not cached: the next call for the key runs again
+    assert await flight.do("key", upstream) == "value-2"
+    assert upstream.calls == 2
+
+
+async def test_key_is_released_after_failure():
+    flight = SingleFlight("test")
+    failing = Upstream(error=RuntimeError("first attempt"))
+    failing.release.set()
+    with pytest.raises(RuntimeError):
+        await flight.do("key", failing)
+
+    succeeding = Upstream()
+    succeeding.release.set()
+    assert await flight.do("key", succeeding) == "value-1"
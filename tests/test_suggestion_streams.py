@@ -0,0 +1,173 @@
+"""?stream=true on the suggestion routes: SSE framing and event order, the final "done" event,
+and what is saved when the stream completes or the client disconnects first."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+from models import AlternateTextSuggestionResult, AlternativeSuggestion
+
+pytestmark = pytest.mark.anyio
+
+SUGGESTION = {"problematicPhrase": "guys", "alternatives": ["everyone"], "reason": "gendered",
+              "concept_matched": "inclusive language", "confidence": 0.9}
+
+
+class StubSuggester:
+    """Streams two items, then the result; with `hold` set, waits after the first item until released"""
+
+    def __init__(self, fail_after_first=False):
+        self.fail_after_first = fail_after_first
+        self.hold = None
+        self.first_sent = asyncio.Event()
+        self.closed = False
+
+    async def _stream(self, first, second, result):
+        try:
+            yield first
+            self.first_sent.set()
+            if self.hold is not None:
+                await self.hold.wait()
+            if self.fail_after_first:
+                raise RuntimeError("model stream broke")
+            yield second
+            yield result
+        finally:
+            self.closed = True
+
+    def stream_suggestions(self, payload, request_id):
+        suggestion = AlternativeSuggestion(**SUGGESTION)
+        result = AlternateTextSuggestionResult(
+            request_id=request_id, source_id=payload.source_id, content_type=payload.content_type,
+            original_sentence=payload.sentence, alternative_suggestions=[suggestion, suggestion], message="ok")
+        return self._stream(("suggestion", suggestion), ("suggestion", suggestion), ("result", result))
+
+    def stream_full_text_suggestion(self, body, request_id):
+        result = {"db_result": {"id": request_id, "source_id": body["source_id"]},
+                  "api_response": {"alternatives": ["First text.", "Second text."]}}
+        return self._stream(("alternative", "First text."), ("alternative", "Second text."), ("result", result))
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.results = []
+
+    async def enqueue(self, result):
+        self.results.append(result)
+
+
+@pytest.fixture
+def suggester(monkeypatch):
+    suggester = StubSuggester()
+    monkeypatch.setattr(main, "statement_suggester", suggester)
+    monkeypatch.setattr(main, "write_queue", RecordingQueue())
+    main.compile_route_policy()
+    main.services_ready.set()
+    yield suggester
+    main.services_ready.clear()
+
+
+@pytest.fixture
+async def client(suggester):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+
+
+ALT_TEXT_BODY = {"source_id": "source-1", "content_type": "course", "sentence": "Hey guys, welcome."}
+FULL_TEXT_BODY = {"source_id": "source-1", "original_text": "Hey guys, welcome.", "keywords": ["guys"]}
+
+
+def parse_sse(body: str):
+    """(event, data) pairs; every frame is exactly an event line and a data line, ended by a blank line"""
+    assert body.endswith("\n\n")
+    events = []
+    for frame in body[:-2].split("\n\n"):
+        event_line, data_line = frame.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+async def test_alternate_text_stream_events_and_done(client, suggester):
+    response = await client.post("/alternate-text-suggestion?stream=true", json=ALT_TEXT_BODY)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    assert [event for event, _ in events] == ["suggestion", "suggestion", "done"]
+    assert events[0][1] == SUGGESTION
+    done = events[-1][1]
+    assert done["source_id"] == "source-1" and len(done["alternative_suggestions"]) == 2
+    # The final result is saved once, and it is the one sent in "done"
+    assert [result.id for result in main.write_queue.results] == [done["id"]]
+
+
+async def test_stream_flag_in_body(client):
+    response = await client.post("/alternate-text-suggestion", json={**ALT_TEXT_BODY, "stream": True})
+    assert [event for event, _ in parse_sse(response.text)] == ["suggestion", "suggestion", "done"]
+
+
+async def test_full_sentence_stream_events_and_done(client):
+    response = await client.post("/full-sentence-suggestion?stream=true", json=FULL_TEXT_BODY)
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    assert parse_sse(response.text) == [
+        ("alternative", "First text."),
+        ("alternative", "Second text."),
+        ("done", {"alternatives": ["First text.", "Second text."]}),
+    ]
+    assert [result["source_id"] for result in main.write_queue.results] == ["source-1"]
+
+
+async def test_error_mid_stream_is_an_error_event_and_nothing_is_saved(client, suggester):
+    suggester.fail_after_first = True
+    response = await client.post("/alternate-text-suggestion?stream=true", json=ALT_TEXT_BODY)
+
+    events = parse_sse(response.text)
+    assert [event for event, _ in events] == ["suggestion", "error"]
+    assert "model stream broke" in events[-1][1]["detail"]
+    assert main.write_queue.results == []
+
+
+async def stream_until_disconnect(path: str, body: dict, suggester: StubSuggester) -> bytes:
+    """Drive the ASGI app directly: the client disconnects after the first event arrives"""
+    suggester.hold = asyncio.Event()
+    received = []
+    disconnected = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            received.append(message["body"])
+            disconnected.set()
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"stream=true",
+             "root_path": "", "headers": [(b"content-type", b"application/json"), (b"host", b"test")],
+             "client": ("127.0.0.1", 1234), "server": ("test", 80)}
+    await asyncio.wait_for(main.app(scope, receive, send), timeout=5)
+    return b"".join(received)
+
+
+@pytest.mark.parametrize("path,body", [
+    ("/alternate-text-suggestion", ALT_TEXT_BODY),
+    ("/full-sentence-suggestion", FULL_TEXT_BODY),
+])
+async def test_client_disconnect_stops_the_model_stream_without_saving(suggester, path, body):
+    received = await stream_until_disconnect(path, body, suggester)
+
+    assert received.startswith(b"event: ")
+    assert b"event: done" not in received
+    # The model stream was closed rather than left running for nobody
+    assert suggester.closed
+    assert main.write_queue.results == []
@@ -0,0 +1,59 @@
+"""TokenIndex memo bytes count towards the TokenIndexCache budget."""
+from utils.keyword_matcher import KeywordMatcher
+from utils.token_index import TokenIndex, TokenIndexCache
+
+TEXT = " ".join(f"word{number % 500} inclusion equity diverse{number % 7}" for number in range(4000))
+
+
+def query_many(index, count):
+    for number in range(count):
+        index.prefix_positions(f"word{number}")
+        index.substring_positions(f"ord{number}")
+
+
+def test_memo_is_bounded_by_bytes():
+    index = TokenIndex(TEXT)
+    query_many(index, 500)
+
+    assert 0 < index.memo_bytes <= index.max_memo_bytes
+    # Older entries were evicted to make room
+    assert len(index._memo) < 1000
+    assert index.size_bytes == index.index_bytes + index.memo_bytes
+
+
+def test_memo_growth_is_counted_in_the_cache():
+    cache = TokenIndexCache(max_bytes=64 * 1024 * 1024)
+    index = cache.get_or_build(TEXT)
+    built_bytes = cache.current_bytes
+
+    query_many(index, 50)
+
+    assert index.memo_bytes > 0
+    assert cache.current_bytes == built_bytes + index.memo_bytes
+    index.clear_memo()
+    assert cache.current_bytes == built_bytes
+
+
+def test_cache_stays_within_budget_as_memos_grow():
+    probe = TokenIndex(TEXT)
+    # Room for two bare indexes, not for two indexes with full memos
+    cache = TokenIndexCache(max_bytes=int(probe.index_bytes * 2.5))
+    first = cache.get_or_build(TEXT)
+    second = cache.get_or_build(TEXT + " second")
+
+    query_many(first, 500)
+    query_many(second, 500)
+
+    assert cache.current_bytes <= cache.max_bytes
+    assert cache.current_bytes == sum(index.size_bytes for index in cache._indexes.values())
+    # The least recently used index made room
+    assert list(cache._indexes.values()) == [second]
+
+
+def test_memoized_queries_match_a_scan():
+    index = TokenIndex(TEXT)
+    matcher = KeywordMatcher(["inclusion", "equity", "diverse*", "word42"])
+    scanned = matcher.find_all(TEXT)
+
+    assert matcher.find_all(TEXT, index) == scanned
+    assert matcher.find_all(TEXT, index) == scanned
@@ -0,0 +1,139 @@
+"""WriteBehindQueue against a stubbed DynamoDB client (botocore Stubber, no network)."""
+import asyncio
+
+import pytest
+from botocore.stub import ANY, Stubber
+
+from controllers.db_service import DynamoDBService
+from controllers.text_store import TextStore
+from controllers.write_behind_queue import WriteBehindQueue
+from models import AnalysisResult
+
+pytestmark = pytest.mark.anyio
+
+TABLE = "super-search-analysis_results"
+
+
+def make_result(number: int, text: str = "short text", **fields) -> AnalysisResult:
+    return AnalysisResult(id=f"result-{number}", request_id="request-1", source_id=f"source-{number}",
+                          content_type="text", original_text=text, **fields)
+
+
+def batch_request(db_service, results):
+    return {"RequestItems": {TABLE: [{"PutRequest": {"Item": db_service.to_item(result)}} for result in results]}}
+
+
+@pytest.fixture
+def db_service(monkeypatch):
+    monkeypatch.delenv("TEXT_STORE_TABLE", raising=False)
+    return DynamoDBService()
+
+
+@pytest.fixture
+def dynamodb(db_service):
+    with Stubber(db_service.client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def queue(db_service):
+    return WriteBehindQueue(db_service, max_size=100, flush_interval=0.01, max_retries=3, base_backoff=0.001)
+
+
+async def test_unprocessed_items_are_retried(db_service, dynamodb, queue):
+    results = [make_result(number) for number in range(3)]
+    unprocessed = db_service.to_item(results[2])
+    dynamodb.add_response("batch_write_item", {"UnprocessedItems": {TABLE: [{"PutRequest": {"Item": unprocessed}}]}},
+                          batch_request(db_service, results))
+    dynamodb.add_response("batch_write_item", {"UnprocessedItems": {}}, batch_request(db_service, results[2:]))
+
+    await queue._write_batch(results)
+
+    assert queue.stats()["written"] == 3
+    assert queue.stats()["retried"] == 1
+    assert queue.stats()["failed"] == 0
+
+
+async def test_drain_writes_everything_enqueued(db_service, dynamodb, queue):
+    results = [make_result(number) for number in range(30)]
+    # 25 per BatchWriteItem call
+    dynamodb.add_response("batch_write_item", {}, batch_request(db_service, results[:25]))
+    dynamodb.add_response("batch_write_item", {}, batch_request(db_service, results[25:]))
+
+    await queue.start()
+    for result in results:
+        await queue.enqueue(result)
+    await queue.drain()
+
+    assert queue.stats()["written"] == 30
+    assert queue.stats()["pending"] == 0
+
+
+async def test_throttled_batch_is_retried(db_service, dynamodb, queue):
+    results = [make_result(number) for number in range(2)]
+    dynamodb.add_client_error("batch_write_item", "ProvisionedThroughputExceededException", http_status_code=400)
+    dynamodb.add_response("batch_write_item", {}, batch_request(db_service, results))
+
+    await queue._write_batch(results)
+
+    assert queue.stats()["written"] == 2
+    assert queue.stats()["failed"] == 0
+
+
+async def test_rejected_batch_is_split_to_drop_only_the_bad_item(db_service, dynamodb, queue):
+    results = [make_result(number) for number in range(3)]
+    dynamodb.add_client_error("batch_write_item", "ValidationException", http_status_code=400,
+                              expected_params=batch_request(db_service, results))
+    # Halves [0] and [1, 2], then [1, 2] is split again
+    dynamodb.add_response("batch_write_item", {}, batch_request(db_service, results[:1]))
+    dynamodb.add_client_error("batch_write_item", "ValidationException", http_status_code=400,
+                              expected_params=batch_request(db_service, results[1:]))
+    dynamodb.add_response("batch_write_item", {}, batch_request(db_service, results[1:2]))
+    dynamodb.add_client_error("batch_write_item", "ValidationException", http_status_code=400,
+                              expected_params=batch_request(db_service, results[2:]))
+
+    await queue._write_batch(results)
+
+    assert queue.stats()["written"] == 2
+    assert queue.stats()["failed"] == 1
+
+
+async def test_unserializable_result_is_dropped_alone(db_service, dynamodb, queue):
+    good = [make_result(0), make_result(2)]
+    bad = make_result(1, metadata={"score": float("nan")})
+    dynamodb.add_response("batch_write_item", {}, batch_request(db_service, good))
+
+    await queue._write_batch([good[0], bad, good[1]])
+
+    assert queue.stats()["written"] == 2
+    assert queue.stats()["failed"] == 1
+
+
+async def test_text_store_error_is_retried(db_service, dynamodb, queue):
+    db_service.text_store = TextStore("super-search-texts", min_chars=20)
+    results = [make_result(0, text="a source text long enough for the text store"), make_result(1)]
+    with Stubber(db_service.text_store.dynamodb.meta.client) as texts:
+        texts.add_client_error("put_item", "ProvisionedThroughputExceededException", http_status_code=400)
+        texts.add_response("put_item", {}, {"TableName": "super-search-texts", "Item": ANY})
+        dynamodb.add_response("batch_write_item", {}, {"RequestItems": {TABLE: ANY}})
+
+        await queue._write_batch(results)
+
+        texts.assert_no_pending_responses()
+    assert queue.stats()["written"] == 2
+    assert queue.stats()["failed"] == 0
+
+
+async def test_text_store_that_keeps_failing_drops_only_that_result(db_service, dynamodb, queue):
+    db_service.text_store = TextStore("super-search-texts", min_chars=20)
+    results = [make_result(0, text="a source text long enough for the text store"), make_result(1)]
+    with Stubber(db_service.text_store.dynamodb.meta.client) as texts:
+        for _ in range(queue.max_retries + 1):
+            texts.add_client_error("put_item", "InternalServerError", http_status_code=500)
+        dynamodb.add_response("batch_write_item", {}, batch_request(db_service, results[1:]))
+
+        await queue._write_batch(results)
+
+    assert queue.stats()["written"] == 1
+    assert queue.stats()["failed"] == 1
@@ -3,10 +3,14 @@ from jwt import PyJWKClient
 import os
 import json
 import base64
+import hashlib
+import logging
+import threading
 import time
+from collections import OrderedDict
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse, RedirectResponse
-from typing import Callable, Optional
+from typing import Dict, Optional
 from dotenv import load_dotenv
 from utils.get_secrets import get_secret
 
@@ -17,20 +21,165 @@ from utils.get_secrets import get_secret
 load_dotenv()
 
 secret_name = "supersearch/prod/azureClientSecrets"
-result = get_secret(secret_name)
-if result is not None:
-    #print(f"Retrieved secret: {result}")
+# Azure app registration, loaded on first use by load_azure_config()
+TENANT_ID = None
+CLIENT_ID = None
+CLIENT_SECRET = None
+JWKS_URL = None
+
+REDIRECT_URI = os.getenv("REDIRECT_URI")
+FRONTEND_URL = os.getenv("FRONTEND_URL")
+
+# Backoff between lazy retries of a failed load_azure_config(), doubling up to the maximum
+AZURE_CONFIG_RETRY_SECONDS = float(os.getenv("AZURE_CONFIG_RETRY_SECONDS", "5"))
+AZURE_CONFIG_RETRY_MAX_SECONDS = float(os.getenv("AZURE_CONFIG_RETRY_MAX_SECONDS", "300"))
+_config_lock = threading.Lock()
+_config_retry_at = 0.0
+_config_retry_delay = AZURE_CONFIG_RETRY_SECONDS
+
+
+logger = logging.getLogger('azure_sso')
+
+
+class JWKSCache:
+    """Process-wide Azure AD signing keys indexed by kid.
+
+    The key set is refetched when it is older than `max_age` (key rotation) or when a
+    token names an unknown kid, but never more often than `min_refresh_interval`, so a
+    flood of tokens with bogus kids cannot turn into a flood of JWKS requests.
+    """
+
+    def __init__(self, jwks_url: str, max_age: float = None, min_refresh_interval: float = None):
+        self.jwks_url = jwks_url
+        self.max_age = max_age or float(os.getenv("JWKS_MAX_AGE_SECONDS", "86400"))
+        self.min_refresh_interval = min_refresh_interval if min_refresh_interval is not None else \
+            float(os.getenv("JWKS_MIN_REFRESH_SECONDS", "60"))
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._attempted_at = 0.0
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def _refresh(self):
+        now = time.time()
+        if now - self._attempted_at < self.min_refresh_interval:
+            return
+        self._attempted_at = now
+        try:
+            jwk_set = PyJWKClient(self.jwks_url, cache_jwk_set=False).get_jwk_set()
+        except Exception as e:
+            logger.error(f"Failed to fetch JWKS: {str(e)}")
+            return
+        self.fetches += 1
+        self._keys = {key.key_id: key for key in jwk_set.keys if key.key_id}
+        self._fetched_at = now
+        logger.info(f"Loaded {len(self._keys)} signing keys from JWKS")
+
+    def cached_signing_key(self, kid: str) -> Optional[jwt.PyJWK]:
+        """Key for kid if it is in a key set that is not stale yet, without fetching"""
+        key = self._keys.get(kid)
+        if key is not None and time.time() - self._fetched_at < self.max_age:
+            return key
+        return None
+
+    def get_signing_key(self, kid: str) -> Optional[jwt.PyJWK]:
+        key = self.cached_signing_key(kid)
+        if key is not None:
+            return key
+        with self._lock:
+            # Unknown kid (rotation) or stale key set
+            if kid not in self._keys or time.time() - self._fetched_at >= self.max_age:
+                self._refresh()
+            return self._keys.get(kid)
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of token hashes that passed signature verification, valid until their exp."""
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", "10000"))
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def is_verified(self, token: str) -> bool:
+        key = self._key(token)
+        with self._lock:
+            exp = self._entries.get(key)
+            if exp is not None:
+                if exp > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True
+                del self._entries[key]
+            self.misses += 1
+            return False
+
+    def add(self, token: str, exp: float):
+        with self._lock:
+            self._entries[self._key(token)] = exp
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+jwks_cache = JWKSCache(JWKS_URL)
+verified_tokens = VerifiedTokenCache()
+
+
+def azure_config_loaded() -> bool:
+    return TENANT_ID is not None and CLIENT_ID is not None
+
+
+def load_azure_config() -> bool:
+    """Read the Azure client secret once; called from app startup, not at import"""
+    global TENANT_ID, CLIENT_ID, CLIENT_SECRET, JWKS_URL
+    if azure_config_loaded():
+        return True
+    result = get_secret(secret_name)
+    if result is None:
+        logger.error("Failed to retrieve the Azure client secret from Secrets Manager")
+        return False
     TENANT_ID = result['TENANT_ID']
     CLIENT_ID = result['AZURE_CLIENT_ID']
     CLIENT_SECRET = result["AZURE_CLIENT_SECRET"]
-    print(f"Az CLIENT_ID loaded:  {CLIENT_ID[:5]}")
-    print(f"Az tenant id loaded:  {TENANT_ID[:5]}")
-else:
-    print("Failed to retrieve secret from secrets manager.")
+    logger.info("Loaded Azure app registration config")
+    JWKS_URL = f"https://login.microsoftonline.com/{TENANT_ID}/discovery/v2.0/keys"
+    jwks_cache.jwks_url = JWKS_URL
+    return True
 
-REDIRECT_URI = os.getenv("REDIRECT_URI")
-FRONTEND_URL = os.getenv("FRONTEND_URL")
-JWKS_URL = f"https://login.microsoftonline.com/{TENANT_ID}/discovery/v2.0/keys"
+
+def ensure_azure_config() -> bool:
+    """Whether the Azure config is loaded, retrying a failed load at most once per backoff interval"""
+    global _config_retry_at, _config_retry_delay
+    if azure_config_loaded():
+        return True
+    # A load already in progress on another thread counts as not loaded yet
+    if not _config_lock.acquire(blocking=False):
+        return False
+    try:
+        if azure_config_loaded():
+            return True
+        if time.time() < _config_retry_at:
+            return False
+        try:
+            loaded = load_azure_config()
+        except Exception as e:
+            logger.error(f"Failed to load Azure config: {str(e)}")
+            loaded = False
+        if loaded:
+            _config_retry_delay = AZURE_CONFIG_RETRY_SECONDS
+        else:
+            _config_retry_at = time.time() + _config_retry_delay
+            _config_retry_delay = min(_config_retry_delay * 2, AZURE_CONFIG_RETRY_MAX_SECONDS)
+        return loaded
+    finally:
+        _config_lock.release()
 
 
 def fix_padding(b64_string):
@@ -38,6 +187,9 @@ def fix_padding(b64_string):
 
 
 def azure_token_middleware(token):
+    # Without the tenant and audience nothing can be checked, so every token is rejected
+    if not azure_config_loaded():
+        return False
     try:
         token_parts = token.split(".")
         if len(token_parts) != 3:
@@ -66,13 +218,33 @@ def azure_token_middleware(token):
         return False
 
 
-def validate_token(token: str) -> bool:
+class AuthFetchRequired(Exception):
+    """A check called with fetch=False that needs Secrets Manager or the JWKS endpoint to answer"""
+
+
+def validate_token(token: str, fetch: bool = True) -> bool:
+    """Verify a token's signature and claims; with fetch=False, raise AuthFetchRequired
+    instead of fetching a signing key that is not cached"""
+    if not azure_config_loaded():
+        return False
+    if token.startswith("Bearer "):
+        token = token.split(" ")[1]
+
+    # Repeat requests of a session skip the signature check until the token expires
+    if verified_tokens.is_verified(token):
+        return True
+
     try:
-        if token.startswith("Bearer "):
-            token = token.split(" ")[1]
+        kid = jwt.get_unverified_header(token).get("kid")
+    except jwt.InvalidTokenError:
+        return False
+    if not fetch and jwks_cache.cached_signing_key(kid) is None:
+        raise AuthFetchRequired()
 
-        jwks_client = PyJWKClient(JWKS_URL)
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
+    try:
+        signing_key = jwks_cache.get_signing_key(kid)
+        if signing_key is None:
+            return False
 
         decoded_token = jwt.decode(
             token,
@@ -82,6 +254,8 @@ def validate_token(token: str) -> bool:
             issuer=f"https://login.microsoftonline.com/{TENANT_ID}/v2.0"
         )
 
+        if "exp" in decoded_token:
+            verified_tokens.add(token, decoded_token["exp"])
         return True
     except jwt.ExpiredSignatureError:
         return False
@@ -123,44 +297,47 @@ def decode_token(token: str) -> Optional[dict]:
         return None
 
 
-async def auth_middleware(request: Request, call_next, open_paths=None):
-    if open_paths is None:
-        open_paths = [
-            "/health",
-            "/docs",
-            "/openapi.json",
-            "/auth/login",
-            "/auth/init"
-        ]
+class AuthError(Exception):
+    """Request without a valid Azure token; the app turns it into a response with status_code"""
+
+    def __init__(self, message: str, status_code: int = 401):
+        super().__init__(message)
+        self.status_code = status_code
+
 
-    if request.method == "OPTIONS":
-        return await call_next(request)
+def authenticate_request(request: Request, fetch: bool = True) -> str:
+    """Token of an authenticated request, raising AuthError otherwise.
 
-    if request.url.path in open_paths:
-        return await call_next(request)
+    Loading the Azure config and fetching an unknown signing key block on the network;
+    with fetch=False they raise AuthFetchRequired instead, so async callers can answer
+    from memory on the event loop and move only those cases to a worker thread.
+    """
+    if not fetch and not azure_config_loaded():
+        raise AuthFetchRequired()
+    if not ensure_azure_config():
+        raise AuthError("Authentication is unavailable - Azure configuration not loaded", status_code=503)
 
     token = get_token_from_request(request)
     if not token:
-        return JSONResponse(
-            content={"message": "Unauthorized - Authentication token required"},
-            status_code=401
-        )
+        raise AuthError("Unauthorized - Authentication token required")
 
     is_valid = (
         azure_token_middleware(token) if request.headers.get("X-Azure-Token")
-        else validate_token(token)
+        else validate_token(token, fetch)
     )
 
     if not is_valid:
-        return JSONResponse(
-            content={"message": "Unauthorized - Invalid authentication token"},
-            status_code=401
-        )
-
-    return await call_next(request)
+        raise AuthError("Unauthorized - Invalid authentication token")
+    return token
 
 
 async def init_auth():
+    if not ensure_azure_config():
+        return JSONResponse(
+            content={"message": "Authentication is unavailable - Azure configuration not loaded"},
+            status_code=503
+        )
+
     auth_url = (
         f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/authorize"
         f"?client_id={CLIENT_ID}"
@@ -211,6 +388,12 @@ async def login(request: Request):
                 status_code=401
             )
 
+        if not ensure_azure_config():
+            return JSONResponse(
+                content={"message": "Authentication is unavailable - Azure configuration not loaded"},
+                status_code=503
+            )
+
         if not azure_token_middleware(id_token):
             return JSONResponse(
                 content={"message": "Authentication failed - Invalid token"},
@@ -0,0 +1,158 @@
+"""Process-wide registry of Bedrock chat models.
+
+Every ChatBedrock is built from one shared bedrock-runtime boto3 client, whose
+botocore pool size, keep-alive, timeouts and retry mode come from the BEDROCK_*
+settings below. Models are reused per (model_id, inference params), so
+TextAnalyzer, StatementSuggester and the full-text route share connections
+instead of each holding a default 10-connection pool (or building a new client
+per request). A callback on each model keeps per-model in-flight gauges and
+latency for /bedrock-stats, and feeds call latency and token counts to /metrics.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+from uuid import UUID
+
+import boto3
+from botocore.config import Config
+from langchain_aws import ChatBedrock
+from langchain_core.callbacks import BaseCallbackHandler
+
+from utils.metrics import BEDROCK_IN_FLIGHT, BEDROCK_REQUEST_DURATION, BEDROCK_TOKENS
+from utils.upstream_client import UpstreamStats
+
+logger = logging.getLogger('bedrock_clients')
+
+DEFAULT_MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+
+
+def _token_usage(response) -> Tuple[int, int]:
+    """(input, output) tokens of an LLMResult, from the message usage or Bedrock's llm_output"""
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+    if not (input_tokens or output_tokens):
+        usage = (response.llm_output or {}).get("usage") or {}
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
+    return input_tokens, output_tokens
+
+
+class InFlightGauge(BaseCallbackHandler):
+    """Counts a model's calls that are currently running, plus their peak and latency"""
+
+    # Called on the event loop thread rather than through the executor
+    run_inline = True
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+        self._started: Dict[UUID, float] = {}
+        self._lock = threading.Lock()
+        self.peak = 0
+        self.latency = UpstreamStats()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+            self.peak = max(self.peak, len(self._started))
+        BEDROCK_IN_FLIGHT.inc(self.model_id)
+
+    def _finish(self, run_id: UUID, error: bool):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is None:
+                return
+            seconds = time.perf_counter() - started
+            self.latency.record(seconds, error)
+        BEDROCK_IN_FLIGHT.dec(self.model_id)
+        BEDROCK_REQUEST_DURATION.observe(seconds, self.model_id, "error" if error else "ok")
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, error=False)
+        input_tokens, output_tokens = _token_usage(response)
+        if input_tokens:
+            BEDROCK_TOKENS.inc(self.model_id, "input", amount=input_tokens)
+        if output_tokens:
+            BEDROCK_TOKENS.inc(self.model_id, "output", amount=output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, error=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._started), "peak_in_flight": self.peak, **self.latency.summary()}
+
+
+class BedrockClientRegistry:
+    def __init__(self):
+        self.region_name = os.getenv("BEDROCK_REGION") or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION")
+        self.config = Config(
+            # Matches LLM_THREAD_POOL_SIZE so every executor thread can hold a connection
+            max_pool_connections=int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "64")),
+            tcp_keepalive=os.getenv("BEDROCK_TCP_KEEPALIVE", "true").lower() == "true",
+            connect_timeout=float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "10")),
+            read_timeout=float(os.getenv("BEDROCK_READ_TIMEOUT", "120")),
+            retries={
+                "mode": os.getenv("BEDROCK_RETRY_MODE", "standard"),
+                # Counts the first call too, unlike botocore's max_attempts
+                "total_max_attempts": int(os.getenv("BEDROCK_MAX_ATTEMPTS", "3")),
+            },
+        )
+        self._runtime_client = None
+        self._control_client = None
+        self._models: Dict[Tuple[str, str], ChatBedrock] = {}
+        self._gauges: Dict[str, InFlightGauge] = {}
+        self._lock = threading.Lock()
+
+    def _client(self, service_name: str):
+        return boto3.client(
+            service_name,
+            region_name=self.region_name,
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            config=self.config,
+        )
+
+    def get_llm(self, model_id: str = DEFAULT_MODEL_ID, **model_kwargs) -> ChatBedrock:
+        """Shared ChatBedrock for model_id with these inference params (max_tokens, temperature, ...)"""
+        key = (model_id, json.dumps(model_kwargs, sort_keys=True))
+        llm = self._models.get(key)
+        if llm is not None:
+            return llm
+        with self._lock:
+            if key not in self._models:
+                if self._runtime_client is None:
+                    self._runtime_client = self._client("bedrock-runtime")
+                    # ChatBedrock otherwise builds a control-plane client per instance
+                    self._control_client = self._client("bedrock")
+                    logger.info(f"Bedrock client created (max_pool_connections={self.config.max_pool_connections}, "
+                                f"retry_mode={self.config.retries['mode']})")
+                gauge = self._gauges.setdefault(model_id, InFlightGauge(model_id))
+                self._models[key] = ChatBedrock(
+                    model_id=model_id,
+                    # ChatBedrock pops max_tokens/temperature out of the dict it is given
+                    model_kwargs=dict(model_kwargs),
+                    client=self._runtime_client,
+                    bedrock_client=self._control_client,
+                    callbacks=[gauge],
+                )
+                logger.info(f"Registered Bedrock model {model_id} with {model_kwargs}")
+            return self._models[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_pool_connections": self.config.max_pool_connections,
+            "retry_mode": self.config.retries["mode"],
+            "registered_models": len(self._models),
+            "models": {model_id: gauge.stats() for model_id, gauge in self._gauges.items()},
+        }
+
+
+bedrock_clients = BedrockClientRegistry()
@@ -0,0 +1,99 @@
+"""Single-pass conversion between pydantic results and DynamoDB attribute maps.
+
+`serialize_item` walks a model (or dict) once and emits the low-level
+{"S": ...}/{"N": ...}/{"M": ...} form expected by the plain boto3 DynamoDB client,
+so there is no intermediate model_dump copy, no float -> Decimal rebuild and no
+second pass by boto3's TypeSerializer. `deserialize_item` is the inverse for read
+paths and returns plain ints and floats, which pydantic accepts without Decimal
+coercion.
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from pydantic import BaseModel
+
+
+def _float(value: float) -> dict:
+    if value != value or value in (float("inf"), float("-inf")):
+        raise ValueError(f"DynamoDB cannot store {value}")
+    text = repr(value)
+    if "e" in text:
+        # DynamoDB wants 1E-7 rather than Python's 1e-07
+        text = str(Decimal(text))
+    return {"N": text}
+
+
+def _map(value: dict) -> dict:
+    return {"M": {str(key): serialize(item) for key, item in value.items()}}
+
+
+def _list(value) -> dict:
+    return {"L": [serialize(item) for item in value]}
+
+
+_SERIALIZERS: Dict[type, Callable[[Any], dict]] = {
+    str: lambda value: {"S": value},
+    bool: lambda value: {"BOOL": value},
+    int: lambda value: {"N": str(value)},
+    float: _float,
+    type(None): lambda value: {"NULL": True},
+    dict: _map,
+    list: _list,
+    tuple: _list,
+    datetime: lambda value: {"S": value.isoformat()},
+    Decimal: lambda value: {"N": str(value)},
+    bytes: lambda value: {"B": value},
+}
+
+
+def serialize(value: Any) -> dict:
+    """Attribute value for any JSON-like value, datetime or pydantic model"""
+    serializer = _SERIALIZERS.get(type(value))
+    if serializer is not None:
+        return serializer(value)
+    if isinstance(value, BaseModel):
+        return {"M": serialize_item(value)}
+    for value_type, serializer in _SERIALIZERS.items():
+        if isinstance(value, value_type):
+            return serializer(value)
+    raise TypeError(f"Unsupported type for DynamoDB: {type(value).__name__}")
+
+
+def serialize_item(obj: Any, skip_none: Iterable[str] = ()) -> Dict[str, dict]:
+    """Attribute map of a pydantic model's fields (or a dict's keys); `skip_none` fields are left out when None"""
+    fields = obj.__dict__ if isinstance(obj, BaseModel) else obj
+    skip_none = set(skip_none)
+    return {name: serialize(value) for name, value in fields.items()
+            if value is not None or name not in skip_none}
+
+
+def _number(text: str):
+    if "." in text or "e" in text or "E" in text:
+        return float(text)
+    return int(text)
+
+
+_DESERIALIZERS: Dict[str, Callable[[Any], Any]] = {
+    "S": lambda value: value,
+    "N": _number,
+    "BOOL": lambda value: value,
+    "NULL": lambda value: None,
+    "M": lambda value: {key: deserialize(item) for key, item in value.items()},
+    "L": lambda value: [deserialize(item) for item in value],
+    "B": lambda value: value,
+    "SS": lambda value: set(value),
+    "NS": lambda value: {_number(item) for item in value},
+    "BS": lambda value: set(value),
+}
+
+
+def deserialize(attribute: dict) -> Any:
+    (type_code, value), = attribute.items()
+    return _DESERIALIZERS[type_code](value)
+
+
+def deserialize_item(item: Optional[Dict[str, dict]]) -> Optional[Dict[str, Any]]:
+    if item is None:
+        return None
+    return {name: deserialize(attribute) for name, attribute in item.items()}
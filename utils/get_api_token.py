@@ -1,102 +1,166 @@
 import os
 import base64
-import requests
+import asyncio
+import logging
+import httpx
 from dotenv import load_dotenv
 import time
+from typing import Optional
 from utils.get_secrets import get_secret
 
+logger = logging.getLogger('get_api_token')
+
 # Load environment variables from .env file
 load_dotenv()
 
-#read secret from secret manager
+# Client credentials and Cognito URL, loaded on first use by load_api_credentials()
 secret_name = "supersearch/prod/apiClientSecrets"
-result = get_secret(secret_name)
-if result is not None:
-    #print(f"Retrieved secret: {result}")
-    client_id = result['API_CLIENT_ID']
-    client_secret = result['API_CLIENT_SECRET']
-    print(f"API Key:  {client_id[:5]}")
-    print(f"API Secret:  {client_secret[:5]}")
-else:
-    print("Failed to retrieve secret from secrets manager.")
-
-# Retrieve Cognito URL, client ID, and client secret from environment variables
-cognito_url = os.getenv('COGNITO_URL')
-if not cognito_url:
-    raise ValueError("Environment variable cognito_url is not set.")
-
-# Cache to store the token and its expiration time
+client_id = None
+client_secret = None
+cognito_url = None
+
+def load_api_credentials():
+    """Read the API client secret and COGNITO_URL once; called from app startup, not at import"""
+    global client_id, client_secret, cognito_url
+    if client_id is None:
+        #read secret from secret manager
+        result = get_secret(secret_name)
+        if result is not None:
+            #print(f"Retrieved secret: {result}")
+            client_id = result['API_CLIENT_ID']
+            client_secret = result['API_CLIENT_SECRET']
+            logger.info("Loaded API client credentials")
+        else:
+            logger.error("Failed to retrieve the API client secret from Secrets Manager")
+
+    # Retrieve Cognito URL from environment variables
+    cognito_url = os.getenv('COGNITO_URL')
+    if not cognito_url:
+        raise ValueError("Environment variable cognito_url is not set.")
+    return client_id is not None
+
+# Cache to store the token, its expiration time and lifetime
 token_cache = {
     'token': None,
-    'expiration': 0
+    'expiration': 0,
+    'expires_in': 0
 }
 
-def get_cognito_token():
-    global token_cache
-    
-    # Check if the token is cached and not expired
-    if token_cache['token'] and token_cache['expiration'] > time.time():
-        return token_cache['token']
-    
-    # If the token is expired or not cached, fetch a new one
-    try:
-        # Encode client ID and client secret in base64 for Basic auth
-        auth_str = f"{client_id}:{client_secret}"
-        auth_bytes = auth_str.encode('utf-8')
-        auth_base64 = base64.b64encode(auth_bytes).decode('utf-8')
-        
-        # Set headers for the POST request
-        headers = {
-            'Authorization': f'Basic {auth_base64}',
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-        
-        # Set payload for the POST request
-        payload = {
-            'grant_type': 'client_credentials'
-        }
-        
-        # Make the POST request to fetch the token
-        response = requests.post(cognito_url, headers=headers, data=payload)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            response_data = response.json()
-            
-            # Extract the token and its expiration time from the response
-            id_token = response_data['access_token']
-            print(f"Cognito Token retrieved: {id_token[:5]}")
-            expires_in = response_data['expires_in']
-            print("expires_in: ",expires_in)
-            
-            # Cache the token and its expiration time
-            token_cache['token'] = id_token
-            token_cache['expiration'] = time.time() + expires_in
-            
-            return id_token
-        
-        else:
-            print(f"Failed to fetch token: {response.status_code} - {response.text}")
-            return None
-    
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
-
-def refresh_token():
-    global token_cache
-    
-    # Force refresh the token by setting expiration to 0
-    token_cache['expiration'] = 0
-    
-    return get_cognito_token()
-
-# # Example usage
-# token = get_cognito_token()
-# print(f"Cognito Token: {token}")
-
-# # Automatically refresh the token if needed
-# if not token or token_cache['expiration'] <= time.time():
-#     print("Refreshing token...")
-#     token = refresh_token()
-#     print(f"Refreshed Cognito Token: {token}")
\ No newline at end of file
+def _token_request():
+    load_api_credentials()
+    # Encode client ID and client secret in base64 for Basic auth
+    auth_str = f"{client_id}:{client_secret}"
+    auth_bytes = auth_str.encode('utf-8')
+    auth_base64 = base64.b64encode(auth_bytes).decode('utf-8')
+
+    # Set headers for the POST request
+    headers = {
+        'Authorization': f'Basic {auth_base64}',
+        'Content-Type': 'application/x-www-form-urlencoded'
+    }
+
+    # Set payload for the POST request
+    payload = {
+        'grant_type': 'client_credentials'
+    }
+    return headers, payload
+
+def _cache_token(response_data):
+    # Extract the token and its expiration time from the response
+    id_token = response_data['access_token']
+    expires_in = response_data['expires_in']
+    logger.info(f"Cognito token retrieved, expires in {expires_in}s")
+
+    # Cache the token and its expiration time
+    token_cache['token'] = id_token
+    token_cache['expiration'] = time.time() + expires_in
+    token_cache['expires_in'] = expires_in
+    return id_token
+
+class CognitoTokenManager:
+    """Async access to the Cognito client-credentials token.
+
+    A background task refreshes the token `refresh_margin` seconds before it
+    expires, and a lock keeps at most one token request in flight, so route
+    handlers awaiting get_token() return the cached token without waiting on
+    Cognito except on a cold start or after a failed refresh.
+
+    The margin is capped at `max_margin_fraction` of the token lifetime, so a
+    short-lived token is not considered due as soon as it arrives, and a failed
+    refresh is retried after `retry_interval` even while the cached token lasts.
+    """
+
+    def __init__(self, refresh_margin: float = None, retry_interval: float = 30, max_margin_fraction: float = 0.5):
+        self.refresh_margin = refresh_margin if refresh_margin is not None else \
+            float(os.getenv("COGNITO_REFRESH_MARGIN_SECONDS", "300"))
+        self.retry_interval = retry_interval
+        self.max_margin_fraction = max_margin_fraction
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh_failed = False
+
+    def _valid(self, margin: float = 0) -> bool:
+        return bool(token_cache['token']) and token_cache['expiration'] - margin > time.time()
+
+    def _margin(self) -> float:
+        """Seconds before expiry at which the token is refreshed"""
+        return min(self.refresh_margin, token_cache['expires_in'] * self.max_margin_fraction)
+
+    async def get_token(self) -> Optional[str]:
+        if self._valid():
+            return token_cache['token']
+        return await self.refresh()
+
+    async def refresh(self, force: bool = False) -> Optional[str]:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        seen_token = token_cache['token']
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if token_cache['token'] != seen_token and self._valid():
+                return token_cache['token']
+            if not force and self._valid(self._margin()):
+                return token_cache['token']
+            try:
+                headers, payload = await asyncio.to_thread(_token_request)
+                async with httpx.AsyncClient(timeout=10) as client:
+                    response = await client.post(cognito_url, headers=headers, data=payload)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{response.status_code} - {response.text}")
+                self.refreshes += 1
+                self.last_refresh_failed = False
+                return _cache_token(response.json())
+            except Exception as e:
+                self.failures += 1
+                self.last_refresh_failed = True
+                logger.error(f"Failed to fetch Cognito token: {e}")
+                # A token that has not expired yet is still usable
+                return token_cache['token'] if self._valid() else None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _next_refresh_delay(self) -> float:
+        if self.last_refresh_failed or not self._valid():
+            return self.retry_interval
+        return max(token_cache['expiration'] - self._margin() - time.time(), self.retry_interval / 10)
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self._next_refresh_delay())
+
+
+cognito_token_manager = CognitoTokenManager()
@@ -1,9 +1,30 @@
 import boto3
 import json
+import threading
 
 region_name = "us-east-1"
 
+# Secrets are fetched once per process; failed lookups are not cached so they are retried.
+# One lock per secret name, so different secrets can still be fetched in parallel.
+_secret_cache = {}
+_secret_locks = {}
+_locks_guard = threading.Lock()
+
 def get_secret(secret_name):
+    cached = _secret_cache.get(secret_name)
+    if cached is not None:
+        return cached
+    with _locks_guard:
+        lock = _secret_locks.setdefault(secret_name, threading.Lock())
+    with lock:
+        if secret_name not in _secret_cache:
+            secret = _fetch_secret(secret_name)
+            if secret is None:
+                return None
+            _secret_cache[secret_name] = secret
+        return _secret_cache[secret_name]
+
+def _fetch_secret(secret_name):
     # Create a Secrets Manager client
     client = boto3.client('secretsmanager', region_name=region_name)
 
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+logger = logging.getLogger('json_stream')
+
+# Follow-up calls allowed per response when the model stops at max_tokens partway through the JSON
+LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "1"))
+
+
+class JsonArrayStreamer:
+    """Incrementally extracts the complete elements of one JSON array from streamed LLM output.
+
+    With `key=None` the first array in the output is streamed (e.g. ``["alt 1", "alt 2"]``);
+    otherwise the array value of that object key (e.g. ``"alternative_suggestions": [...]``).
+    Text around the JSON, such as code fences, is ignored. Each element is returned by
+    `feed` as soon as its closing character arrives.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self.key = key
+        self.buffer = ""
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_string: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._element_start: Optional[int] = None
+        # Offset just past the last element returned by feed, -1 before the first one
+        self.last_element_end = -1
+
+    def feed(self, chunk: str) -> List[Any]:
+        self.buffer += chunk
+        elements = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            if self.done:
+                break
+            ch = buffer[i]
+            in_array = self._array_depth is not None and self._depth == self._array_depth
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = buffer[self._string_start + 1:i]
+                    if in_array and self._element_start == self._string_start:
+                        elements.extend(self._emit(i + 1))
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                self._pending_key = None
+                if in_array and self._element_start is None:
+                    self._element_start = i
+            elif ch in "[{":
+                starts_target = (self._array_depth is None and ch == "["
+                                 and (self.key is None or self._pending_key == self.key))
+                if in_array and self._element_start is None:
+                    self._element_start = i
+                self._depth += 1
+                self._pending_key = None
+                if starts_target:
+                    self._array_depth = self._depth
+            elif ch in "]}":
+                if in_array and self._element_start is not None and buffer[self._element_start] not in '[{"':
+                    elements.extend(self._emit(i))
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if self._depth == self._array_depth and self._element_start is not None:
+                        elements.extend(self._emit(i + 1))
+                    elif self._depth < self._array_depth:
+                        self.done = True
+            elif ch == ":":
+                self._pending_key = self._last_string
+            elif ch == ",":
+                self._pending_key = None
+                if in_array and self._element_start is not None:
+                    elements.extend(self._emit(i))
+            elif in_array and self._element_start is None and not ch.isspace():
+                # Start of a number, true/false/null element
+                self._element_start = i
+        self._pos = len(buffer)
+        return elements
+
+    def _emit(self, end: int) -> List[Any]:
+        raw = self.buffer[self._element_start:end]
+        self._element_start = None
+        try:
+            element = json.loads(raw)
+        except json.JSONDecodeError:
+            return []
+        self.last_element_end = end
+        return [element]
+
+
+class SalvagedJson(NamedTuple):
+    data: Optional[Dict[str, Any]]
+    # True when the whole response parsed, False when only complete array elements were recovered
+    complete: bool
+    # Offset in the response just past the last recovered element, -1 if none
+    resume_offset: int
+
+
+def _strip_code_fence(text: str) -> str:
+    if "```json" in text:
+        return text.split("```json")[1].split("```")[0].strip()
+    if "```" in text:
+        parts = text.split("```")
+        if len(parts) >= 3:
+            return parts[1].strip()
+    return text
+
+
+def salvage_json(response_text: str, array_keys: Sequence[Optional[str]]) -> SalvagedJson:
+    """Parse the JSON object of an LLM response, tolerating truncation.
+
+    Well-formed responses (optionally fenced or surrounded by text) are parsed whole.
+    Otherwise every complete element of the `array_keys` arrays is recovered; a key of
+    None stands for a bare top-level array. `data` is None when nothing could be
+    recovered.
+    """
+    json_str = _strip_code_fence(response_text.strip())
+    try:
+        result = json.loads(json_str)
+    except json.JSONDecodeError:
+        result = None
+        start_idx = json_str.find('{')
+        end_idx = json_str.rfind('}') + 1
+        if start_idx != -1 and end_idx > start_idx:
+            try:
+                result = json.loads(json_str[start_idx:end_idx])
+            except json.JSONDecodeError:
+                pass
+    if isinstance(result, dict) or (isinstance(result, list) and None in array_keys):
+        return SalvagedJson(result if isinstance(result, dict) else {None: result}, True, len(response_text))
+
+    data: Dict[Optional[str], Any] = {}
+    resume_offset = -1
+    for key in array_keys:
+        streamer = JsonArrayStreamer(key)
+        elements = streamer.feed(response_text)
+        if elements:
+            data[key] = elements
+            resume_offset = max(resume_offset, streamer.last_element_end)
+    return SalvagedJson(data or None, False, resume_offset)
+
+
+async def continue_truncated_json(llm, prompt: str, response, array_keys: Sequence[Optional[str]],
+                                  max_continuations: int = None) -> str:
+    """Return the text of `response`, completed if the model ran out of tokens mid-JSON.
+
+    The response is cut back to the end of its last complete array element and sent
+    back as the start of the assistant turn, so the model resumes from there instead
+    of regenerating the elements it already produced.
+    """
+    if max_continuations is None:
+        max_continuations = LLM_MAX_CONTINUATIONS
+    text = response.content
+    stop_reason = (getattr(response, "response_metadata", None) or {}).get("stop_reason")
+    for attempt in range(max_continuations):
+        if stop_reason != "max_tokens":
+            break
+        salvaged = salvage_json(text, array_keys)
+        if salvaged.complete or salvaged.resume_offset <= 0:
+            break
+        prefix = text[:salvaged.resume_offset]
+        logger.warning(f"LLM response truncated at max_tokens, continuing after offset {salvaged.resume_offset} "
+                       f"(attempt {attempt + 1}/{max_continuations})")
+        continuation = await llm.ainvoke([HumanMessage(content=prompt), AIMessage(content=prefix)])
+        text = prefix + continuation.content
+        stop_reason = (getattr(continuation, "response_metadata", None) or {}).get("stop_reason")
+    return text
@@ -0,0 +1,266 @@
+"""Single-pass keyword matching for lexical search.
+
+Keywords are either plain or patterns:
+
+- plain (``Equity``): case-insensitive substring match, as /keywordsearch has always done.
+- quoted (``"Inclusive"``): whole words only, so it does not match inside "All-Inclusive"
+  (a hyphenated compound counts as one word).
+- wildcard (``equit*``): ``*`` stands for any run of word characters, so ``equit*``
+  covers "Equity" and "Equitableness"; wildcard keywords also match whole words only.
+
+In patterns, spaces and hyphens between words match any run of spaces or
+hyphens (or none), so ``"anti racism"`` matches "Anti-Racism" and "anti  racism".
+"""
+import re
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from utils.token_index import TokenIndex
+
+# Plain keywords a matcher needs before the pure-Python automaton beats one str.find loop per
+# keyword over a single lowered copy of the text. benchmarks/bench_keyword_matcher.py puts the
+# crossover at ~150 on 0.1-1 MB texts (100 keywords: 0.76x, 150: 1.00x, 200: 1.33x).
+AUTOMATON_MIN_KEYWORDS = 150
+
+_SEPARATORS = re.compile(r"[\s\-]+")
+_WORD_RUN = re.compile(r"\w+")
+# Pattern keywords only match whole words; hyphenated compounds count as one word
+_WORD_START = r"(?<![\w\-])"
+_WORD_END = r"(?![\w\-])"
+
+
+def is_keyword_pattern(keyword: str) -> bool:
+    stripped = keyword.strip()
+    return "*" in stripped or (len(stripped) >= 2 and stripped[0] == stripped[-1] == '"')
+
+
+def _pattern_words(keyword: str) -> List[str]:
+    body = keyword.strip()
+    if len(body) >= 2 and body[0] == body[-1] == '"':
+        body = body[1:-1]
+    return [word for word in _SEPARATORS.split(body) if word.strip("*")]
+
+
+def compile_keyword_pattern(keyword: str) -> Optional[str]:
+    """Translate a pattern keyword to a regex source (without the word boundaries),
+    or None if it has no words."""
+    words = _pattern_words(keyword)
+    if not words:
+        return None
+    parts = [r"\w*".join(re.escape(piece) for piece in word.split("*")) for word in words]
+    return r"[\s\-]*".join(parts)
+
+
+class KeywordMatcher:
+    """Finds every keyword in the text.
+
+    Plain keywords are matched like the old per-keyword `str.find` loop: matches
+    are reported per keyword in keyword order, and the matches of one keyword never
+    overlap each other. Short lists run that loop over one lowered copy of the text;
+    from AUTOMATON_MIN_KEYWORDS plain keywords on, an Aho-Corasick automaton finds
+    them all in one pass with the same result.
+    Pattern keywords are compiled together into one regex that stops only where
+    some pattern matches and then captures every pattern matching there through
+    lookaheads, so overlapping patterns (``"equity"`` and ``equit*``) each report
+    the matches a search for that pattern alone would find.
+    """
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(keywords)
+        self.is_pattern = [is_keyword_pattern(keyword) for keyword in self.keywords]
+        self._lowered = [keyword.lower() for keyword in self.keywords]
+
+        # An empty keyword matches nowhere meaningful (the old loop never terminated on it)
+        self._plain = [(keyword_idx, lowered) for keyword_idx, lowered in enumerate(self._lowered)
+                       if lowered and not self.is_pattern[keyword_idx]]
+        self._has_plain = bool(self._plain)
+        self._use_automaton = len(self._plain) >= AUTOMATON_MIN_KEYWORDS
+
+        # Trie over the lowercased plain keywords; outputs hold keyword indexes
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for keyword_idx, lowered in (self._plain if self._use_automaton else []):
+            state = 0
+            for ch in lowered:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    goto.append({})
+                    outputs.append([])
+                    next_state = len(goto) - 1
+                    goto[state][ch] = next_state
+                state = next_state
+            outputs[state].append(keyword_idx)
+
+        # Breadth-first pass computes failure links and folds them into a full
+        # transition table, so the scan loop never has to follow a failure chain.
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict() for _ in goto]
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                fail[next_state] = delta[fail[state]].get(ch, 0)
+                outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+                queue.append(next_state)
+            transitions = dict(delta[fail[state]])
+            transitions.update(goto[state])
+            delta[state] = transitions
+
+        self._delta = delta
+        self._outputs = [tuple(sorted(output)) for output in outputs]
+
+        # All pattern keywords share one regex. The leading alternation rejects positions where no
+        # pattern matches; each pattern then has an optional lookahead capture group, numbered in
+        # keyword order, that records its own match at the position. The word start is checked once.
+        alternatives = []
+        captures = []
+        self._pattern_keywords: List[int] = []
+        for keyword_idx, keyword in enumerate(self.keywords):
+            if self.is_pattern[keyword_idx]:
+                source = compile_keyword_pattern(keyword)
+                if source:
+                    alternatives.append(source)
+                    captures.append(f"(?:(?=(?P<k{keyword_idx}>{source}){_WORD_END}))?")
+                    self._pattern_keywords.append(keyword_idx)
+        self._regex = None
+        if alternatives:
+            self._regex = re.compile(
+                f"{_WORD_START}(?=(?:{'|'.join(alternatives)}){_WORD_END}){''.join(captures)}", re.IGNORECASE)
+
+        # How each keyword can be answered from a TokenIndex; None means scan the text.
+        # A word-only plain keyword lies inside one token; a longer one starts with a token suffix.
+        self._index_plans: List[Optional[Tuple[str, str]]] = []
+        for keyword_idx, lowered in enumerate(self._lowered):
+            first_run = _WORD_RUN.match(lowered)
+            if self.is_pattern[keyword_idx] or not first_run:
+                self._index_plans.append(None)
+            elif first_run.end() == len(lowered):
+                self._index_plans.append(("in", lowered))
+            else:
+                self._index_plans.append(("suffix", first_run.group()))
+
+        # Every pattern match starts at a token that begins with the pattern's first literal piece
+        self._regex_prefixes: Optional[List[str]] = []
+        for keyword_idx, keyword in enumerate(self.keywords):
+            if not self.is_pattern[keyword_idx] or compile_keyword_pattern(keyword) is None:
+                continue
+            first_piece = _pattern_words(keyword)[0].split("*")[0].lower()
+            if not first_piece or not _WORD_RUN.fullmatch(first_piece):
+                self._regex_prefixes = None
+                break
+            self._regex_prefixes.append(first_piece)
+
+    def search(self, text: str) -> Optional[str]:
+        """Return a keyword found in `text`, or None."""
+        if self._use_automaton:
+            delta = self._delta
+            outputs = self._outputs
+            state = 0
+            for ch in text.lower():
+                state = delta[state].get(ch, 0)
+                if outputs[state]:
+                    return self.keywords[outputs[state][0]]
+        elif self._has_plain:
+            text_lower = text.lower()
+            for keyword_idx, lowered in self._plain:
+                if lowered in text_lower:
+                    return self.keywords[keyword_idx]
+        if self._regex is not None:
+            match = self._regex.search(text)
+            if match:
+                for group, keyword_idx in enumerate(self._pattern_keywords, 1):
+                    if match.start(group) != -1:
+                        return self.keywords[keyword_idx]
+        return None
+
+    def _add_pattern_matches(self, match: re.Match, matches: List[List[Tuple[int, int]]], next_start: List[int]):
+        """Record each pattern's match at this position unless it overlaps that pattern's previous match"""
+        # regs holds the span of every group, (-1, -1) for patterns that did not match here
+        for keyword_idx, (start, end) in zip(self._pattern_keywords, match.regs[1:]):
+            if start != -1 and start >= next_start[keyword_idx]:
+                matches[keyword_idx].append((start, end))
+                next_start[keyword_idx] = end
+
+    def find_all(self, text: str, index: Optional[TokenIndex] = None) -> List[List[Tuple[int, int]]]:
+        """Return (start, end) spans for each keyword, indexed like `self.keywords`.
+
+        With a TokenIndex built from the same text, the result is identical but the
+        cost follows the vocabulary size and the number of matches, not the text length.
+        """
+        if index is not None:
+            return self._find_all_indexed(text, index)
+        matches: List[List[Tuple[int, int]]] = [[] for _ in self.keywords]
+
+        if self._has_plain and not self._use_automaton:
+            text_lower = text.lower()
+            for keyword_idx, lowered in self._plain:
+                keyword_length = len(self.keywords[keyword_idx])
+                spans = matches[keyword_idx]
+                start = text_lower.find(lowered)
+                while start != -1:
+                    spans.append((start, start + keyword_length))
+                    start = text_lower.find(lowered, start + keyword_length)
+        elif self._has_plain:
+            # Next position at which each keyword may match again (no self-overlap)
+            next_start = [0] * len(self.keywords)
+            lowered_lengths = [len(lowered) for lowered in self._lowered]
+            keyword_lengths = [len(keyword) for keyword in self.keywords]
+
+            delta = self._delta
+            outputs = self._outputs
+            state = 0
+            for pos, ch in enumerate(text.lower()):
+                state = delta[state].get(ch, 0)
+                if outputs[state]:
+                    for keyword_idx in outputs[state]:
+                        start = pos - lowered_lengths[keyword_idx] + 1
+                        if start < next_start[keyword_idx]:
+                            continue
+                        end = start + keyword_lengths[keyword_idx]
+                        matches[keyword_idx].append((start, end))
+                        next_start[keyword_idx] = end
+
+        if self._regex is not None:
+            pattern_next_start = [0] * len(self.keywords)
+            for match in self._regex.finditer(text):
+                self._add_pattern_matches(match, matches, pattern_next_start)
+        return matches
+
+    def _find_all_indexed(self, text: str, index: TokenIndex) -> List[List[Tuple[int, int]]]:
+        matches: List[List[Tuple[int, int]]] = [[] for _ in self.keywords]
+        text_lower = index.text_lower
+
+        for keyword_idx, plan in enumerate(self._index_plans):
+            if self.is_pattern[keyword_idx] or not self._lowered[keyword_idx]:
+                continue
+            lowered = self._lowered[keyword_idx]
+            keyword_length = len(self.keywords[keyword_idx])
+            spans = matches[keyword_idx]
+            if plan is None:
+                start = text_lower.find(lowered)
+                while start != -1:
+                    spans.append((start, start + keyword_length))
+                    start = text_lower.find(lowered, start + keyword_length)
+            elif plan[0] == "in":
+                spans.extend((start, start + keyword_length) for start in index.substring_positions(plan[1]))
+            else:
+                next_start = 0
+                for start in index.suffix_positions(plan[1]):
+                    if start >= next_start and text_lower.startswith(lowered, start):
+                        spans.append((start, start + keyword_length))
+                        next_start = start + keyword_length
+
+        if self._regex is not None:
+            pattern_next_start = [0] * len(self.keywords)
+            if self._regex_prefixes is None:
+                for match in self._regex.finditer(text):
+                    self._add_pattern_matches(match, matches, pattern_next_start)
+            else:
+                candidates = sorted({start for prefix in set(self._regex_prefixes)
+                                     for start in index.prefix_positions(prefix)})
+                for start in candidates:
+                    match = self._regex.match(text, start)
+                    if match:
+                        self._add_pattern_matches(match, matches, pattern_next_start)
+        return matches
@@ -0,0 +1,217 @@
+"""Process-local metrics in the Prometheus text format, served by /metrics.
+
+Counters, gauges and histograms are plain dicts keyed by label values, guarded by
+a lock, so recording is a dict lookup and an increment. Histograms store one count
+per bucket and are made cumulative only when rendered. Gauges can also be read
+from a callback at scrape time for values other modules already track (queue
+depth, in-flight coalesced calls). Each uvicorn worker exposes its own numbers.
+
+MetricsMiddleware is a pure ASGI middleware timing every HTTP request by route
+template (e.g. /result/{request_id}), so unmatched paths cannot grow the series
+count.
+"""
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds; +Inf is implicit
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+DYNAMODB_BUCKETS = (0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Sequence[Any], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, self.labelnames, labels, value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, labelnames, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge set by inc/dec/set, or read from `collect` (returning {label values: value}) at scrape time"""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        if self.collect is None:
+            yield from super().samples()
+            return
+        for labels, value in self.collect().items():
+            yield self.name, self.labelnames, labels, value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = HTTP_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # [per-bucket counts (last one is +Inf), sum]
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, *labels):
+        """Decorator observing the duration of each call of a sync or async function"""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.observe(time.perf_counter() - start, *labels)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labels)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, (list(counts), total)) for labels, (counts, total) in self._values.items()]
+        bucket_labelnames = self.labelnames + ("le",)
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", bucket_labelnames, labels + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", self.labelnames, labels, total
+            yield f"{self.name}_count", self.labelnames, labels, cumulative
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is complete, by route template",
+    ("method", "route", "status"))
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+BEDROCK_REQUEST_DURATION = Histogram(
+    "bedrock_request_duration_seconds", "Bedrock model call latency (streamed calls until the last chunk)",
+    ("model", "outcome"), buckets=LLM_BUCKETS)
+BEDROCK_TOKENS = Counter("bedrock_tokens_total", "Tokens reported by Bedrock", ("model", "direction"))
+BEDROCK_IN_FLIGHT = Gauge("bedrock_requests_in_flight", "Bedrock model calls currently running", ("model",))
+LLM_PARSE_FAILURES = Counter(
+    "llm_parse_failures_total", "LLM responses with no usable JSON, by calling service", ("model", "service"))
+
+DYNAMODB_OPERATION_DURATION = Histogram(
+    "dynamodb_operation_duration_seconds", "Latency of DynamoDBService methods", ("method",),
+    buckets=DYNAMODB_BUCKETS)
+
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Courses API / Programs MS request latency by proxy route",
+    ("route", "status"))
+UPSTREAM_IN_FLIGHT = Gauge("upstream_requests_in_flight", "Upstream proxy requests currently running", ("route",))
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route (older Starlette: only its endpoint) in the shared scope
+            route = getattr(scope.get("route"), "path", None) or \
+                getattr(scope.get("endpoint"), "__name__", "unmatched")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, scope["method"], route, status)
+            HTTP_REQUESTS_IN_FLIGHT.dec()
@@ -0,0 +1,85 @@
+"""Cheap local relevance scoring used to skip LLM calls on unrelated text.
+
+Each concept is expanded into related terms, and every term is compared with
+the text through character n-grams of its words. A chunk's score is the best
+weighted share of any term's n-grams that also occur in the chunk: 1.0 when a
+term appears verbatim, lower for partial or morphological overlap, and close to
+zero for unrelated prose. N-grams shared by many terms (suffixes such as "ion")
+carry less weight.
+"""
+import math
+import re
+from typing import Dict, List, Set
+
+# Related terms for the concepts of the default keyword profiles
+CONCEPT_EXPANSIONS: Dict[str, List[str]] = {
+    "diversity": ["diverse", "multicultural", "cross-cultural", "cultural background", "different backgrounds",
+                  "varied perspectives", "ethnicity", "heritage", "cultural competence"],
+    "equity": ["equitable", "fairness", "fair access", "opportunity gap", "underserved", "disadvantaged",
+               "social justice", "access to education", "achievement gap"],
+    "inclusion": ["inclusive", "inclusivity", "belonging", "welcoming", "accessibility", "accommodations"],
+    "dei": ["diversity equity inclusion", "affirmative action", "chief diversity officer"],
+    "underrepresented": ["minority", "minorities", "first-generation", "low-income", "historically excluded"],
+    "marginalized": ["vulnerable populations", "oppressed", "disenfranchised", "excluded", "discrimination"],
+    "equality": ["equal rights", "equal opportunity", "civil rights", "gender", "racial"],
+    "race": ["racial", "ethnicity", "ethnic"],
+    "racism": ["racist", "anti-racist", "systemic racism", "discrimination"],
+    "bias": ["biases", "implicit bias", "unconscious bias", "stereotyping"],
+    "gender": ["gender identity", "women", "sex-based", "nonbinary"],
+    "privilege": ["privileged", "advantage"],
+    "allyship": ["ally", "allies", "advocacy"],
+    "intersectionality": ["intersectional", "overlapping identities"],
+}
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def expand_concepts(keywords: List[str]) -> List[str]:
+    terms = []
+    for keyword in keywords:
+        term = keyword.strip('"*').lower()
+        if term and term not in terms:
+            terms.append(term)
+        for related in CONCEPT_EXPANSIONS.get(term, []):
+            if related not in terms:
+                terms.append(related)
+    return terms
+
+
+def char_ngrams(text: str, sizes=(3, 4)) -> Set[str]:
+    """N-grams of each word padded with spaces, so word starts and ends are distinct grams."""
+    grams = set()
+    for word in _NON_WORD.split(text.lower()):
+        if not word:
+            continue
+        padded = f" {word} "
+        for size in sizes:
+            for i in range(len(padded) - size + 1):
+                grams.add(padded[i:i + size])
+    return grams
+
+
+class RelevanceFilter:
+    def __init__(self, keywords: List[str]):
+        self.terms = expand_concepts(keywords)
+        self._term_grams = [char_ngrams(term) for term in self.terms]
+
+        document_frequency: Dict[str, int] = {}
+        for grams in self._term_grams:
+            for gram in grams:
+                document_frequency[gram] = document_frequency.get(gram, 0) + 1
+        term_count = len(self._term_grams)
+        self._weights = {gram: math.log(1 + term_count / df) for gram, df in document_frequency.items()}
+        self._term_totals = [sum(self._weights[gram] for gram in grams) for grams in self._term_grams]
+
+    def score(self, text: str) -> float:
+        text_grams = char_ngrams(text)
+        best = 0.0
+        for grams, total in zip(self._term_grams, self._term_totals):
+            if not total:
+                continue
+            shared = sum(self._weights[gram] for gram in grams if gram in text_grams)
+            best = max(best, shared / total)
+            if best >= 1.0:
+                break
+        return best
@@ -0,0 +1,156 @@
+"""Response cache for the upstream proxy routes.
+
+Entries hold the raw upstream JSON body per URL, so /course-details and
+/program-details are cached per courseCode/programId. Within its route's TTL an
+entry is served as is. During the stale-while-revalidate window after that, it is
+still served while one background request revalidates it. Revalidation is
+conditional (If-None-Match / If-Modified-Since), so an unchanged catalog costs
+the upstream a 304 instead of the full payload. Memory is bounded by total body
+size, evicting least recently used entries.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from utils.singleflight import SingleFlight
+
+logger = logging.getLogger('response_cache')
+
+# (ttl, stale-while-revalidate) seconds per proxy route; override with
+# RESPONSE_CACHE_TTL_<ROUTE> / RESPONSE_CACHE_STALE_<ROUTE>, e.g. RESPONSE_CACHE_TTL_PROGRAMS=600
+DEFAULT_ROUTE_TTLS: Dict[str, Tuple[int, int]] = {
+    "programs": (900, 86400),
+    "templates": (900, 86400),
+    "course-details": (300, 3600),
+    "program-details": (300, 3600),
+}
+
+
+@dataclass
+class CachedResponse:
+    content: bytes
+    etag: str
+    upstream_etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes or int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024)
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        # Concurrent misses and refreshes of one URL share a single upstream request
+        self.inflight = SingleFlight("upstream")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    def route_ttls(self, route: str) -> Tuple[int, int]:
+        ttl, stale = DEFAULT_ROUTE_TTLS.get(route, (0, 0))
+        suffix = route.upper().replace("-", "_")
+        return (int(os.getenv(f"RESPONSE_CACHE_TTL_{suffix}", ttl)),
+                int(os.getenv(f"RESPONSE_CACHE_STALE_{suffix}", stale)))
+
+    async def get_or_fetch(self, route: str, key: str,
+                           fetch: Callable[[Dict[str, str]], Awaitable[httpx.Response]]) -> CachedResponse:
+        """Cached response for `key`, calling fetch(conditional_headers) when it is missing or too old.
+
+        fetch must return a 200 or 304 response and raise for anything else.
+        """
+        ttl, stale = self.route_ttls(route)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.time() - entry.fetched_at
+            self._entries.move_to_end(key)
+            if age < ttl:
+                self.hits += 1
+                return entry
+            if age < ttl + stale:
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, entry, fetch))
+                return entry
+        self.misses += 1
+        return await self.inflight.do(key, lambda: self._fetch(key, entry, fetch))
+
+    async def _refresh(self, key: str, entry: CachedResponse, fetch):
+        try:
+            await self.inflight.do(key, lambda: self._fetch(key, entry, fetch))
+        except Exception as e:
+            # Keep serving the stale entry; the next stale hit retries
+            self.refresh_errors += 1
+            logger.warning(f"Background refresh of {key} failed: {str(e)}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def _fetch(self, key: str, entry: Optional[CachedResponse], fetch) -> CachedResponse:
+        headers = {}
+        if entry is not None:
+            self.revalidations += 1
+            if entry.upstream_etag:
+                headers["If-None-Match"] = entry.upstream_etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        response = await fetch(headers)
+        if response.status_code == 304 and entry is not None:
+            self.not_modified += 1
+            entry.fetched_at = time.time()
+            # Re-store it: the entry may have been evicted while the request was in flight
+            self._store(key, entry)
+            return entry
+        content = response.content
+        new_entry = CachedResponse(
+            content=content,
+            etag=f'"{hashlib.sha256(content).hexdigest()[:32]}"',
+            upstream_etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            fetched_at=time.time(),
+        )
+        self._store(key, new_entry)
+        return new_entry
+
+    def _store(self, key: str, entry: CachedResponse):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old.content)
+        if len(entry.content) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._size += len(entry.content)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted.content)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "revalidations": self.revalidations,
+            "not_modified": self.not_modified,
+            "refresh_errors": self.refresh_errors,
+            "evictions": self.evictions,
+            "coalesced": self.inflight.coalesced,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,114 @@
+"""Content-addressed cache of parsed LLM analysis results.
+
+Entries live in an in-process LRU with a TTL. When RESULT_CACHE_TABLE is set,
+a DynamoDB table (partition key `cache_key`, TTL attribute `expires_at`) backs
+it as a persistent tier shared by all workers.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import boto3
+
+logger = logging.getLogger('result_cache')
+
+
+def make_cache_key(text: str, keywords: List[str], prompt_version: str, model_id: str) -> str:
+    payload = json.dumps([text, sorted(keywords), prompt_version, model_id], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DynamoDBCacheTier:
+    def __init__(self, table_name: str):
+        self.table = boto3.resource('dynamodb', region_name='us-east-1').Table(table_name)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self.table.get_item(Key={'cache_key': key}).get('Item')
+        # DynamoDB TTL deletion is lazy, so check expiry ourselves
+        if not item or int(item.get('expires_at', 0)) <= time.time():
+            return None
+        return json.loads(item['result_data'])
+
+    def put(self, key: str, value: Dict[str, Any], expires_at: float):
+        self.table.put_item(Item={
+            'cache_key': key,
+            'result_data': json.dumps(value),
+            'expires_at': int(expires_at),
+        })
+
+
+class ResultCache:
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[int] = None,
+                 persistent_tier: Optional[DynamoDBCacheTier] = None):
+        self.max_entries = max_entries or int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+        self.persistent_tier = persistent_tier
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.persistent_tier is not None:
+            try:
+                value = await asyncio.to_thread(self.persistent_tier.get, key)
+            except Exception as e:
+                logger.error(f"Persistent result cache read failed: {str(e)}")
+                value = None
+            if value is not None:
+                self._store(key, value, time.time() + self.ttl_seconds)
+                with self._lock:
+                    self.persistent_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        expires_at = time.time() + self.ttl_seconds
+        self._store(key, value, expires_at)
+        if self.persistent_tier is not None:
+            try:
+                await asyncio.to_thread(self.persistent_tier.put, key, value, expires_at)
+            except Exception as e:
+                logger.error(f"Persistent result cache write failed: {str(e)}")
+
+    def _store(self, key: str, value: Dict[str, Any], expires_at: float):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0,
+            }
+
+
+_table_name = os.getenv("RESULT_CACHE_TABLE")
+result_cache = ResultCache(persistent_tier=DynamoDBCacheTier(_table_name) if _table_name else None)
@@ -0,0 +1,43 @@
+"""Request coalescing: concurrent calls with the same key share one in-flight call.
+
+The first caller for a key starts the call as a task; callers arriving while it
+runs await the same task, and all of them get its result or its exception. Each
+waiter awaits through asyncio.shield, so a cancelled waiter (e.g. a client that
+disconnected) stops waiting without cancelling the call the others depend on.
+The key is released as soon as the call finishes; results are not cached here.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger('singleflight')
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"{self.name}: joining in-flight call for {key}")
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every waiter was cancelled before it arrived
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"{self.name}: shared call for {key} failed: {task.exception()!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._calls), "calls": self.calls, "coalesced": self.coalesced}
@@ -0,0 +1,44 @@
+import re
+from typing import List, Tuple
+
+# Rough size of a Claude token in characters of English prose
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _last_boundary(pattern: re.Pattern, text: str, start: int, end: int) -> int:
+    """End offset of the last `pattern` match inside text[start:end], or -1."""
+    boundary = -1
+    for match in pattern.finditer(text, start, end):
+        boundary = match.end()
+    return boundary if boundary > start else -1
+
+
+def split_text(text: str, max_tokens: int) -> List[Tuple[int, str]]:
+    """Split text into contiguous (offset, chunk) pieces of at most ~max_tokens each.
+
+    Chunks end at a paragraph break when one falls in the second half of the
+    window, otherwise at a sentence end, then at whitespace, and only as a last
+    resort in the middle of a word. Concatenating the chunks gives back the text.
+    """
+    max_chars = max(max_tokens * CHARS_PER_TOKEN, 1)
+    chunks = []
+    start = 0
+    while len(text) - start > max_chars:
+        window_end = start + max_chars
+        min_end = start + max_chars // 2
+        end = -1
+        for pattern in (_PARAGRAPH_BREAK, _SENTENCE_END, _WHITESPACE):
+            end = _last_boundary(pattern, text, min_end, window_end)
+            if end != -1:
+                break
+        if end == -1:
+            end = window_end
+        chunks.append((start, text[start:end]))
+        start = end
+    if start < len(text) or not chunks:
+        chunks.append((start, text[start:]))
+    return chunks
@@ -0,0 +1,191 @@
+"""Positional token index for repeated lexical queries over the same text.
+
+The index maps every lowercased word token to the character offsets where it
+starts. KeywordMatcher uses it to locate keyword candidates by scanning the
+vocabulary and the postings of matching tokens instead of the whole text.
+
+Query results are memoized per index, LRU and bounded by bytes. Memo bytes count
+towards the index's size, and a cached index reports growth to TokenIndexCache so
+TOKEN_INDEX_CACHE_MB bounds indexes and memos together.
+"""
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('token_index')
+
+_TOKEN = re.compile(r"\w+")
+# Per-index memo of query results, so re-running a keyword list only costs its matches.
+# Bounded relative to the index itself, so memoizing can at most double an index's footprint.
+_MEMO_BYTES_PER_INDEX_BYTE = 1.0
+_MIN_MEMO_BYTES = 64 * 1024
+
+
+def _positions_bytes(key: tuple, positions: List[int]) -> int:
+    # List object plus one int per position (as for the postings), and the key tuple and its string
+    return sys.getsizeof(positions) + len(positions) * 36 + sys.getsizeof(key) + sys.getsizeof(key[1])
+
+
+class TokenIndex:
+    def __init__(self, text: str):
+        self.text_lower = text.lower()
+        self.postings: Dict[str, List[int]] = {}
+        for match in _TOKEN.finditer(self.text_lower):
+            self.postings.setdefault(match.group(), []).append(match.start())
+
+        # Rough footprint: the lowercased text, vocabulary strings and one int per token
+        token_count = sum(len(starts) for starts in self.postings.values())
+        self.index_bytes = (sys.getsizeof(self.text_lower)
+                            + sum(sys.getsizeof(token) + 64 for token in self.postings)
+                            + token_count * 36)
+
+        self._memo: "OrderedDict[tuple, List[int]]" = OrderedDict()
+        self.memo_bytes = 0
+        self.max_memo_bytes = max(int(self.index_bytes * _MEMO_BYTES_PER_INDEX_BYTE), _MIN_MEMO_BYTES)
+        self._memo_lock = threading.Lock()
+        # Set by TokenIndexCache while the index is cached; called after the memo changes size
+        self.on_resize: Optional[Callable[["TokenIndex"], None]] = None
+
+    @property
+    def size_bytes(self) -> int:
+        return self.index_bytes + self.memo_bytes
+
+    def clear_memo(self):
+        with self._memo_lock:
+            self._memo.clear()
+            self.memo_bytes = 0
+        on_resize = self.on_resize
+        if on_resize is not None:
+            on_resize(self)
+
+    def _recall(self, key: tuple) -> Optional[List[int]]:
+        with self._memo_lock:
+            positions = self._memo.get(key)
+            if positions is not None:
+                self._memo.move_to_end(key)
+            return positions
+
+    def _remember(self, key: tuple, positions: List[int]) -> List[int]:
+        entry_bytes = _positions_bytes(key, positions)
+        if entry_bytes > self.max_memo_bytes:
+            return positions
+        with self._memo_lock:
+            if key in self._memo:
+                return positions
+            self._memo[key] = positions
+            self.memo_bytes += entry_bytes
+            while self.memo_bytes > self.max_memo_bytes:
+                evicted_key, evicted = self._memo.popitem(last=False)
+                self.memo_bytes -= _positions_bytes(evicted_key, evicted)
+        on_resize = self.on_resize
+        if on_resize is not None:
+            on_resize(self)
+        return positions
+
+    def substring_positions(self, needle: str) -> List[int]:
+        """Non-overlapping occurrences of a lowercased word-character-only needle."""
+        key = ("in", needle)
+        memoized = self._recall(key)
+        if memoized is not None:
+            return memoized
+        positions = []
+        for token, starts in self.postings.items():
+            if needle not in token:
+                continue
+            offsets = []
+            offset = token.find(needle)
+            while offset != -1:
+                offsets.append(offset)
+                offset = token.find(needle, offset + len(needle))
+            positions.extend(start + offset for start in starts for offset in offsets)
+        positions.sort()
+        return self._remember(key, positions)
+
+    def suffix_positions(self, piece: str) -> List[int]:
+        """Offsets where a token ends with `piece`, pointing at the start of `piece`."""
+        key = ("suffix", piece)
+        memoized = self._recall(key)
+        if memoized is not None:
+            return memoized
+        positions = []
+        for token, starts in self.postings.items():
+            if token.endswith(piece):
+                shift = len(token) - len(piece)
+                positions.extend(start + shift for start in starts)
+        positions.sort()
+        return self._remember(key, positions)
+
+    def prefix_positions(self, piece: str) -> List[int]:
+        """Start offsets of tokens beginning with `piece`."""
+        key = ("prefix", piece)
+        memoized = self._recall(key)
+        if memoized is not None:
+            return memoized
+        positions = []
+        for token, starts in self.postings.items():
+            if token.startswith(piece):
+                positions.extend(starts)
+        positions.sort()
+        return self._remember(key, positions)
+
+
+class TokenIndexCache:
+    """LRU of token indexes keyed by a hash of the text, bounded by approximate memory."""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes or int(os.getenv("TOKEN_INDEX_CACHE_MB", "64")) * 1024 * 1024
+        self.current_bytes = 0
+        self._indexes: "OrderedDict[str, TokenIndex]" = OrderedDict()
+        # Bytes counted in current_bytes for each cached index; its size changes as its memo fills
+        self._accounted: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get_or_build(self, text: str) -> Optional[TokenIndex]:
+        # Offsets are only comparable when lowercasing keeps the text length
+        if len(text.lower()) != len(text):
+            return None
+
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+
+        index = TokenIndex(text)
+        if index.size_bytes > self.max_bytes:
+            logger.info(f"Token index of {index.size_bytes} bytes exceeds the cache budget, not caching")
+            return index
+
+        with self._lock:
+            if key in self._indexes:
+                return self._indexes[key]
+            self._indexes[key] = index
+            self._accounted[key] = index.size_bytes
+            self.current_bytes += index.size_bytes
+            index.on_resize = lambda resized: self._resized(key, resized)
+            self._evict()
+        return index
+
+    def _resized(self, key: str, index: TokenIndex):
+        with self._lock:
+            if self._indexes.get(key) is not index:
+                return
+            size = index.size_bytes
+            self.current_bytes += size - self._accounted[key]
+            self._accounted[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._indexes:
+            key, evicted = self._indexes.popitem(last=False)
+            evicted.on_resize = None
+            self.current_bytes -= self._accounted.pop(key)
+
+
+token_index_cache = TokenIndexCache()
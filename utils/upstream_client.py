@@ -0,0 +1,116 @@
+"""Application-lifetime HTTP client for the upstream APIs behind the proxy routes.
+
+One pooled httpx.AsyncClient keeps connections to the Courses API and Programs MS
+alive across requests (HTTP/2 when the `h2` package is installed and the server
+negotiates it), with explicit pool limits and timeouts. Every call is timed per
+upstream route for /upstream-stats.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import httpx
+
+from utils.metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_REQUEST_DURATION
+
+logger = logging.getLogger('upstream_client')
+
+try:
+    import h2  # noqa: F401  (enables httpx's HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class UpstreamStats:
+    """Call counts and latency percentiles of one upstream route"""
+
+    def __init__(self, sample_size: int = 1024):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._recent = deque(maxlen=sample_size)
+
+    def record(self, seconds: float, error: bool):
+        self.calls += 1
+        self.errors += int(error)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self._recent.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        recent = sorted(self._recent)
+
+        def percentile(fraction):
+            return round(recent[min(len(recent) - 1, int(fraction * len(recent)))] * 1000, 2) if recent else None
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_seconds / self.calls * 1000, 2) if self.calls else None,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
+
+
+class UpstreamClient:
+    def __init__(self):
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("UPSTREAM_KEEPALIVE_SECONDS", "30")),
+        )
+        self.timeout = httpx.Timeout(
+            float(os.getenv("UPSTREAM_READ_TIMEOUT", "30")),
+            connect=float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5")),
+            pool=float(os.getenv("UPSTREAM_POOL_TIMEOUT", "5")),
+        )
+        self.http2 = HTTP2_AVAILABLE and os.getenv("UPSTREAM_HTTP2", "true").lower() == "true"
+        self._client: Optional[httpx.AsyncClient] = None
+        self._stats: Dict[str, UpstreamStats] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so requests outside the app lifespan still work
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+            logger.info(f"Upstream client pool created (http2={self.http2}, "
+                        f"max_connections={self.limits.max_connections})")
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, name: str, url: str, **kwargs) -> httpx.Response:
+        """GET through the shared pool, recording latency under `name`"""
+        UPSTREAM_IN_FLIGHT.inc(name)
+        start = time.perf_counter()
+        error = True
+        status = "error"
+        try:
+            response = await self.client.get(url, **kwargs)
+            error = response.status_code >= 400
+            status = response.status_code
+            return response
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                stats = self._stats.setdefault(name, UpstreamStats())
+                stats.record(seconds, error)
+            UPSTREAM_IN_FLIGHT.dec(name)
+            UPSTREAM_REQUEST_DURATION.observe(seconds, name, status)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: stats.summary() for name, stats in self._stats.items()}
+
+
+upstream_client = UpstreamClient()